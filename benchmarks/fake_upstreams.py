@@ -0,0 +1,276 @@
+"""
+Local stand-ins for the Gemini and Unsplash HTTP APIs with configurable latency and payload size.
+
+Point the app at them with GEMINI_API_BASE=<base>/v1beta and UNSPLASH_API_BASE=<base>.
+Run standalone with `python -m benchmarks.fake_upstreams --port 8765`.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlparse, parse_qs
+
+PALETTE = {"background": "#FFFFFF", "accent": "#4F46E5", "text": "#333333"}
+FONTS = {"heading": "Montserrat", "body": "Open Sans"}
+_NUM_SLIDES_RE = re.compile(r"with (\d+) content slides")
+
+
+class UpstreamConfig:
+    """
+    Latencies are in seconds. `jitter` is a +/- fraction applied to every delay;
+    `slow_fraction` of requests are delayed `slow_multiplier` times longer to
+    model tail latency.
+    """
+    def __init__(self, gemini_latency=0.8, search_latency=0.15, download_latency=0.2,
+                 jitter=0.2, slow_fraction=0.0, slow_multiplier=5.0,
+                 image_width=1080, image_height=720, results_per_search=10, seed=1):
+        self.gemini_latency = gemini_latency
+        self.search_latency = search_latency
+        self.download_latency = download_latency
+        self.jitter = jitter
+        self.slow_fraction = slow_fraction
+        self.slow_multiplier = slow_multiplier
+        self.image_width = image_width
+        self.image_height = image_height
+        self.results_per_search = results_per_search
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def fake_deck(topic, num_slides):
+    slides = []
+    for i in range(num_slides):
+        slides.append({
+            "title": f"{topic}: part {i + 1}",
+            "content_points": [f"Key point {j + 1} about {topic} for slide {i + 1}" for j in range(4)],
+            "speaker_notes": f"Notes for slide {i + 1} of {topic}.",
+            "unsplash_query": f"{topic} {i % 5}",
+            "layout_type": "image-left",
+        })
+    return {"colors": PALETTE, "fonts": FONTS, "slides": slides}
+
+
+class _ImageCache:
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._images = {}
+
+    def get(self, photo_id, width=None):
+        width = width or self.config.image_width
+        key = (photo_id, width)
+        with self._lock:
+            if key not in self._images:
+                self._images[key] = self._render(photo_id, width)
+            return self._images[key]
+
+    def _render(self, photo_id, width):
+        from PIL import Image, ImageDraw
+        height = max(1, round(width * self.config.image_height / self.config.image_width))
+        rng = random.Random(f"{self.config.seed}:{photo_id}")
+        base = tuple(rng.randrange(256) for _ in range(3))
+        img = Image.new("RGB", (width, height), base)
+        draw = ImageDraw.Draw(img)
+        # A few shapes and some noise so JPEG sizes resemble photos, not flat fills
+        for _ in range(40):
+            x0, y0 = rng.randrange(width), rng.randrange(height)
+            draw.ellipse([x0, y0, x0 + rng.randrange(20, width // 2 + 21), y0 + rng.randrange(20, height // 2 + 21)],
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        noise = Image.effect_noise((width, height), 40).convert("RGB")
+        img = Image.blend(img, noise, 0.25)
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=85)
+        return out.getvalue()
+
+
+def make_handler(config, images, stats):
+    rng = random.Random(config.seed)
+    rng_lock = threading.Lock()
+
+    def delay(base):
+        with rng_lock:
+            factor = 1 + rng.uniform(-config.jitter, config.jitter)
+            if config.slow_fraction and rng.random() < config.slow_fraction:
+                factor *= config.slow_multiplier
+        time.sleep(max(0.0, base * factor))
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _count(self, route, nbytes):
+            with stats["lock"]:
+                entry = stats["routes"].setdefault(route, {"requests": 0, "bytes": 0})
+                entry["requests"] += 1
+                entry["bytes"] += nbytes
+
+        @contextmanager
+        def _in_flight(self, route):
+            # Tracks the most requests of each route being served at once
+            with stats["lock"]:
+                active = stats["in_flight"][route] = stats["in_flight"].get(route, 0) + 1
+                stats["peak_in_flight"][route] = max(stats["peak_in_flight"].get(route, 0), active)
+            try:
+                yield
+            finally:
+                with stats["lock"]:
+                    stats["in_flight"][route] -= 1
+
+        def _send(self, status, body, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not url.path.endswith(":generateContent"):
+                return self._send(404, b'{"error": "not found"}')
+            prompt = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+            match = _NUM_SLIDES_RE.search(prompt)
+            num_slides = int(match.group(1)) if match else 5
+            topic_match = re.search(r'topic: "([^"]*)"', prompt)
+            deck = fake_deck(topic_match.group(1) if topic_match else "Benchmark", num_slides)
+            text = json.dumps(deck)
+            with self._in_flight("gemini"):
+                delay(config.gemini_latency)
+            payload = json.dumps({
+                "candidates": [{"content": {"parts": [{"text": text}]}}],
+                "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+            }).encode()
+            self._count("gemini", len(payload))
+            self._send(200, payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            base = f"http://{self.headers.get('Host')}"
+            if url.path == "/search/photos":
+                q = query.get("query", [""])[0]
+                per_page = min(int(query.get("per_page", ["1"])[0]), config.results_per_search)
+                results = []
+                for i in range(per_page):
+                    photo_id = f"{zlib.crc32(q.encode()) % 10000}-{i}"
+                    raw = f"{base}/photos/{photo_id}.jpg"
+                    results.append({
+                        "id": photo_id,
+                        "width": config.image_width, "height": config.image_height,
+                        "urls": {"raw": raw, "full": raw, "regular": raw, "small": f"{raw}?w=400", "thumb": f"{raw}?w=200"},
+                        "user": {"name": "Bench Photographer", "links": {"html": "https://unsplash.com/@bench"}},
+                    })
+                with self._in_flight("search"):
+                    delay(config.search_latency)
+                payload = json.dumps({"total": per_page, "total_pages": 1, "results": results}).encode()
+                self._count("search", len(payload))
+                return self._send(200, payload)
+            if url.path.startswith("/photos/"):
+                photo_id = url.path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+                width = int(query["w"][0]) if "w" in query else None
+                payload = images.get(photo_id, width)
+                with self._in_flight("download"):
+                    delay(config.download_latency)
+                self._count("download", len(payload))
+                return self._send(200, payload, "image/jpeg")
+            self._send(404, b'{"error": "not found"}')
+
+    return Handler
+
+
+class FakeUpstreams:
+    """
+    Serves both fake APIs from one threaded HTTP server on 127.0.0.1.
+
+        with FakeUpstreams(UpstreamConfig(gemini_latency=0.5)) as fake:
+            os.environ.update(fake.env())
+    """
+    def __init__(self, config=None, port=0):
+        self.config = config or UpstreamConfig()
+        self.stats = {"lock": threading.Lock(), "routes": {}, "in_flight": {}, "peak_in_flight": {}}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(self.config, _ImageCache(self.config), self.stats))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        return {
+            "GEMINI_API_BASE": f"{self.base_url}/v1beta",
+            "UNSPLASH_API_BASE": self.base_url,
+            "GOOGLE_API_KEY": "bench-key",
+            "UNSPLASH_ACCESS_KEY": "bench-key",
+        }
+
+    def route_stats(self):
+        with self.stats["lock"]:
+            return json.loads(json.dumps(self.stats["routes"]))
+
+    def peak_in_flight(self, reset=False):
+        """
+        Returns {route: most requests served at once} since start or the last reset.
+        """
+        with self.stats["lock"]:
+            peaks = dict(self.stats["peak_in_flight"])
+            if reset:
+                self.stats["peak_in_flight"].clear()
+        return peaks
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini/Unsplash upstreams for benchmarking")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--gemini-latency", type=float, default=0.8)
+    parser.add_argument("--search-latency", type=float, default=0.15)
+    parser.add_argument("--download-latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--image-width", type=int, default=1080)
+    args = parser.parse_args()
+    config = UpstreamConfig(
+        gemini_latency=args.gemini_latency, search_latency=args.search_latency,
+        download_latency=args.download_latency, jitter=args.jitter,
+        slow_fraction=args.slow_fraction, image_width=args.image_width,
+        image_height=round(args.image_width * 2 / 3),
+    )
+    fake = FakeUpstreams(config, port=args.port)
+    print(f"Fake upstreams listening on {fake.base_url}")
+    for key, value in fake.env().items():
+        print(f"  {key}={value}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
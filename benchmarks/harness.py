@@ -0,0 +1,527 @@
+"""
+End-to-end benchmark harness for Slide AI.
+
+Starts the fake Gemini/Unsplash upstreams, drives /api/generate and /api/generate_pptx
+on the Flask (server/app.py) and FastAPI (webapp/main.py) apps plus the CLI pipeline,
+and reports end-to-end and per-stage latency percentiles, throughput and peak memory.
+Each scenario runs in its own child process so peak RSS is not shared between them.
+
+    python -m benchmarks.harness
+    python -m benchmarks.harness --scenarios fastapi.generate --concurrency 1,8,32
+    python -m benchmarks.harness --output new.json --compare benchmarks/results/old.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fake_upstreams import FakeUpstreams, UpstreamConfig
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+COMPARE_METRICS = ("latency.p50", "latency.p95", "latency.p99", "throughput_rps", "peak_rss_mb", "wire_bytes_mean",
+                   "time_to_live.p50", "time_to_ready.p50")
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def percentiles(samples):
+    """
+    Returns count/mean/min/max and p50/p90/p95/p99 (nearest rank) in milliseconds.
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def pct(p):
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))] * 1000
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) * 1000,
+        "min": ordered[0] * 1000,
+        "p50": pct(50), "p90": pct(90), "p95": pct(95), "p99": pct(99),
+        "max": ordered[-1] * 1000,
+    }
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """
+    Times pipeline stages in-process by wrapping the HTTP clients (classified by
+    upstream URL) and the slide_ai preview/build functions.
+    """
+    def __init__(self, upstream_base):
+        self.upstream_base = upstream_base
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def _classify(self, url):
+        url = str(url)
+        if not url.startswith(self.upstream_base):
+            return None
+        if ":generateContent" in url:
+            return "gemini"
+        if "/search/photos" in url:
+            return "unsplash_search"
+        return "image_download"
+
+    def _timed(self, stage, func):
+        timer = self
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def install(self):
+        import requests
+        timer = self
+        original_send = requests.Session.send
+        def send(session, request, **kwargs):
+            stage = timer._classify(request.url)
+            start = time.perf_counter()
+            try:
+                response = original_send(session, request, **kwargs)
+                response.content  # include body transfer in the stage time
+                return response
+            finally:
+                if stage:
+                    timer.record(stage, time.perf_counter() - start)
+        requests.Session.send = send
+
+        try:
+            import httpx
+        except ImportError:
+            httpx = None
+        if httpx is not None:
+            original_asend = httpx.AsyncClient.send
+            async def asend(client, request, **kwargs):
+                stage = timer._classify(request.url)
+                start = time.perf_counter()
+                try:
+                    return await original_asend(client, request, **kwargs)
+                finally:
+                    if stage:
+                        timer.record(stage, time.perf_counter() - start)
+            httpx.AsyncClient.send = asend
+
+        from slide_ai import pipeline
+        from slide_ai.pptx_builder import DeckBuilder
+        pipeline.render_slide_preview = self._timed("preview_render", pipeline.render_slide_preview)
+        DeckBuilder.add_slide = self._timed("deck_add_slide", DeckBuilder.add_slide)
+        DeckBuilder.save = self._timed("deck_save", DeckBuilder.save)
+        return self
+
+    def summary(self):
+        with self._lock:
+            return {stage: percentiles(samples) for stage, samples in sorted(self.samples.items())}
+
+
+def run_load(call, total, concurrency):
+    """
+    Calls `call(i)` `total` times from `concurrency` threads. `call` returns the
+    number of response bytes, or (decoded bytes, bytes on the wire), or raises.
+    Returns latency percentiles, throughput and byte totals.
+    """
+    latencies, errors, nbytes, wire = [], [], [0], [0]
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            size = call(i)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+            return
+        elapsed = time.perf_counter() - start
+        size, on_wire = size if isinstance(size, tuple) else (size, size)
+        with lock:
+            latencies.append(elapsed)
+            nbytes[0] += size or 0
+            wire[0] += on_wire or 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "wall_seconds": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "response_bytes": nbytes[0],
+        "wire_bytes": wire[0],
+        "wire_bytes_mean": wire[0] / len(latencies) if latencies else 0.0,
+        "latency": percentiles(latencies),
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def start_flask(port=None):
+    import importlib.util
+    from werkzeug.serving import make_server
+    spec = importlib.util.spec_from_file_location("server_app", os.path.join(PROJECT_ROOT, "server", "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    server = make_server("127.0.0.1", port or _free_port(), module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def start_fastapi(port=None):
+    import uvicorn
+    from webapp.main import app
+    port = port or _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", workers=1))
+    threading.Thread(target=server.run, daemon=True).start()
+    _wait_for_port(port)
+    return f"http://127.0.0.1:{port}"
+
+
+APPS = {"flask": start_flask, "fastapi": start_fastapi}
+
+
+def _session(args):
+    import requests
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = args.accept_encoding
+    return session
+
+
+def _sizes(response):
+    """
+    (decoded body bytes, bytes read off the wire) for a fully read requests response.
+    """
+    body = response.content
+    return len(body), response.raw.tell() or len(body)
+
+
+def _generate_call(base_url, args):
+    session = _session(args)
+    def call(i):
+        response = session.post(f"{base_url}/api/generate", json={"topic": f"Benchmark topic {i}", "num_slides": args.slides}, timeout=600)
+        response.raise_for_status()
+        return _sizes(response)
+    return call
+
+
+def _generate_pptx_call(base_url, args):
+    session = _session(args)
+    seed = session.post(f"{base_url}/api/generate", json={"topic": "Benchmark export", "num_slides": args.slides}, timeout=600)
+    seed.raise_for_status()
+    deck = seed.json()
+    def call(i):
+        # Vary the topic so every request is a distinct payload unless dedupe is being measured
+        topic = "Benchmark export" if args.same_payload else f"Benchmark export {i}"
+        response = session.post(f"{base_url}/api/generate_pptx", json={
+            "slides": deck["slides"], "topic": topic, "colors": deck["colors"], "fonts": deck["fonts"],
+        }, timeout=600)
+        response.raise_for_status()
+        return _sizes(response)
+    return call
+
+
+def _app_scenario(app_name, make_call):
+    def run(ctx):
+        base_url = APPS[app_name]()
+        ctx["rss_after_start_mb"] = current_rss_mb()
+        return run_load(make_call(base_url, ctx["args"]), ctx["args"].requests, ctx["concurrency"])
+    return run
+
+
+for _app in APPS:
+    scenario(f"{_app}.generate")(_app_scenario(_app, _generate_call))
+    scenario(f"{_app}.generate_pptx")(_app_scenario(_app, _generate_pptx_call))
+
+
+def _startup_scenario(app_name):
+    def run(ctx):
+        """
+        Cold-starts the app in a fresh interpreter per request and measures time
+        until /healthz answers (live) and until /readyz reports warm (ready).
+        """
+        import requests
+        live_times, ready_times = [], []
+
+        def wait_for(url, proc, start, timeout=120):
+            while time.perf_counter() - start < timeout:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"{app_name} exited with {proc.returncode}")
+                try:
+                    if requests.get(url, timeout=1).status_code == 200:
+                        return time.perf_counter() - start
+                except requests.RequestException:
+                    pass
+                time.sleep(0.02)
+            raise RuntimeError(f"Timed out waiting for {url}")
+
+        def call(i):
+            port = _free_port()
+            start = time.perf_counter()
+            proc = subprocess.Popen([sys.executable, "-m", "benchmarks.harness", "--serve", f"{app_name}@{port}"],
+                                    cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                live_times.append(wait_for(f"{base_url}/healthz", proc, start))
+                ready_times.append(wait_for(f"{base_url}/readyz", proc, start))
+                return 0
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+        # Cold starts compete for CPU, so they run one at a time regardless of concurrency
+        result = run_load(call, ctx["args"].requests, 1)
+        result["time_to_live"] = percentiles(live_times)
+        result["time_to_ready"] = percentiles(ready_times)
+        return result
+    return run
+
+
+def serve(target):
+    """
+    Runs one app on the given port until killed (used by the startup scenarios).
+    """
+    app_name, _, port = target.partition("@")
+    APPS[app_name](int(port))
+    threading.Event().wait()
+
+
+for _app in APPS:
+    scenario(f"{_app}.startup")(_startup_scenario(_app))
+
+
+@scenario("cli")
+def cli_scenario(ctx):
+    from slide_ai.main import generate_deck
+    args = ctx["args"]
+    out_dir = tempfile.mkdtemp(prefix="slide-ai-bench-")
+    def call(i):
+        path = generate_deck(f"Benchmark topic {i}", args.slides, "bench-key", "bench-key",
+                             filename=os.path.join(out_dir, f"deck_{i}.pptx"))
+        return os.path.getsize(path)
+    result = run_load(call, args.requests, ctx["concurrency"])
+    result["package_bytes_mean"] = result["response_bytes"] / max(1, result["latency"].get("count", 0))
+    return result
+
+
+@scenario("deck_build")
+def deck_build_scenario(ctx):
+    """
+    Builds decks locally from pre-downloaded images: isolates builder time and package size.
+    """
+    from io import BytesIO
+    import requests
+    from benchmarks.fake_upstreams import fake_deck
+    from slide_ai.pptx_builder import create_pptx_with_unsplash
+    args = ctx["args"]
+    deck = fake_deck("Build benchmark", args.slides)
+    image_bytes = requests.get(f"{ctx['upstream_base']}/photos/build.jpg", timeout=60).content
+    out_dir = tempfile.mkdtemp(prefix="slide-ai-bench-")
+    def call(i):
+        slides = [dict(slide, actual_image_stream=BytesIO(image_bytes), unsplash_photographer_name="Bench")
+                  for slide in deck["slides"]]
+        path = create_pptx_with_unsplash(slides, f"Build benchmark {i}", filename=os.path.join(out_dir, f"deck_{i}.pptx"),
+                                         colors=deck["colors"], fonts=deck["fonts"])
+        return os.path.getsize(path)
+    result = run_load(call, args.requests, ctx["concurrency"])
+    result["package_bytes_mean"] = result["response_bytes"] / max(1, result["latency"].get("count", 0))
+    return result
+
+
+def run_child(args):
+    """
+    Runs one scenario at one concurrency level in this process and prints its result JSON.
+    """
+    name, _, concurrency = args.child.partition("@")
+    os.environ["SLIDE_AI_ARTIFACT_DIR"] = tempfile.mkdtemp(prefix="slide-ai-artifacts-")
+    os.environ["SLIDE_AI_JOB_DB"] = os.path.join(os.environ["SLIDE_AI_ARTIFACT_DIR"], "jobs.sqlite3")
+    timer = StageTimer(args.upstream).install()
+    ctx = {"args": args, "concurrency": int(concurrency), "upstream_base": args.upstream}
+    result = SCENARIOS[name](ctx)
+    result["stages"] = timer.summary()
+    result["rss_after_start_mb"] = ctx.get("rss_after_start_mb")
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _lookup(result, dotted):
+    value = result
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(old, new):
+    """
+    Prints a metric-by-metric comparison of two results files.
+    """
+    print(f"{'scenario':36} {'metric':16} {'old':>12} {'new':>12} {'change':>9}")
+    for key in sorted(set(old["results"]) | set(new["results"])):
+        for metric in COMPARE_METRICS:
+            a, b = _lookup(old["results"].get(key, {}), metric), _lookup(new["results"].get(key, {}), metric)
+            if a is None and b is None:
+                continue
+            change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else "n/a"
+            fmt = lambda v: "-" if v is None else f"{v:.2f}"
+            print(f"{key:36} {metric:16} {fmt(a):>12} {fmt(b):>12} {change:>9}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Slide AI end-to-end benchmarks")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=16, help="requests per scenario and concurrency level")
+    parser.add_argument("--slides", type=int, default=8)
+    parser.add_argument("--same-payload", action="store_true", help="send identical export payloads")
+    # requests can only decode br when the brotli package is installed
+    default_encoding = "gzip, br" if importlib.util.find_spec("brotli") else "gzip"
+    parser.add_argument("--accept-encoding", default=default_encoding,
+                        help='Accept-Encoding sent by the load clients ("identity" measures uncompressed bytes)')
+    parser.add_argument("--gemini-latency", type=float, default=0.8)
+    parser.add_argument("--search-latency", type=float, default=0.15)
+    parser.add_argument("--download-latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--image-width", type=int, default=1080)
+    parser.add_argument("--output", help="results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--upstream", help=argparse.SUPPRESS)
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.serve:
+        return serve(args.serve)
+    if args.child:
+        return run_child(args)
+
+    config = UpstreamConfig(
+        gemini_latency=args.gemini_latency, search_latency=args.search_latency,
+        download_latency=args.download_latency, jitter=args.jitter,
+        slow_fraction=args.slow_fraction, image_width=args.image_width,
+        image_height=round(args.image_width * 2 / 3),
+    )
+    results = {}
+    with FakeUpstreams(config) as fake:
+        env = dict(os.environ, **fake.env())
+        passthrough = [arg for arg in (argv if argv is not None else sys.argv[1:])]
+        for name in args.scenarios.split(","):
+            if name not in SCENARIOS:
+                parser.error(f"unknown scenario {name!r}")
+            for level in args.concurrency.split(","):
+                key = f"{name}@c{level}"
+                print(f"Running {key} ...", flush=True)
+                before = fake.route_stats()
+                proc = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.harness", *passthrough,
+                     "--child", f"{name}@{level}", "--upstream", fake.base_url],
+                    cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    print(proc.stderr, file=sys.stderr)
+                    results[key] = {"failed": True, "stderr": proc.stderr[-2000:]}
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                after = fake.route_stats()
+                result["upstream_calls"] = {
+                    route: {k: v - before.get(route, {}).get(k, 0) for k, v in counts.items()}
+                    for route, counts in after.items()
+                }
+                results[key] = result
+                lat = result["latency"]
+                print(f"  p50 {lat.get('p50', 0):.0f} ms  p95 {lat.get('p95', 0):.0f} ms  "
+                      f"{result['throughput_rps']:.2f} req/s  peak RSS {result['peak_rss_mb']:.0f} MB  "
+                      f"wire {result['wire_bytes_mean'] / 1024:.1f} KiB/req  errors {result['errors']}")
+
+    report = {
+        "meta": {
+            "git_revision": _git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("child", "upstream", "output", "compare")},
+        },
+        "upstream": config.to_dict(),
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Microbenchmark for slide_ai.prompt_enhancer over a synthetic prompt corpus.
+
+Compares the previous per-category substring scan (reimplemented here as the
+baseline) with the shared engine, uncached, through the LRU cache and in batches.
+
+    python -m benchmarks.prompt_bench --prompts 200000 --unique 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from slide_ai import prompt_enhancer
+from slide_ai.prompt_enhancer import CATEGORIES, GENERAL_STYLES, classify_prompt, stable_hash
+
+FILLER = ("a", "the", "quiet", "bright", "old", "small", "red", "glowing", "under", "beside", "with",
+          "morning", "city", "street", "window", "light", "shadow", "cloud", "road", "table", "crowd")
+
+
+def make_corpus(total, unique, words=12, seed=1):
+    """
+    Returns `total` prompts drawn (with repeats) from `unique` distinct ones;
+    most mention a category keyword somewhere, some mention none.
+    """
+    rng = random.Random(seed)
+    keywords = [k for _, ks, _ in CATEGORIES for k in ks]
+    distinct = []
+    for _ in range(unique):
+        tokens = [rng.choice(FILLER) for _ in range(words)]
+        if rng.random() < 0.8:
+            tokens[rng.randrange(words)] = rng.choice(keywords)
+        distinct.append(" ".join(tokens))
+    return [rng.choice(distinct) for _ in range(total)]
+
+
+def legacy_enhance(prompt):
+    # The original handler: one substring scan per category, process-salted hash()
+    prompt_lower = prompt.lower()
+    for _, keywords, styles in CATEGORIES:
+        if any(keyword in prompt_lower for keyword in keywords):
+            return f"{prompt}, {styles[hash(prompt) % len(styles)]}"
+    return f"{prompt}, {GENERAL_STYLES[hash(prompt) % len(GENERAL_STYLES)]}"
+
+
+def uncached_enhance(prompt):
+    styles = prompt_enhancer._STYLES.get(classify_prompt(prompt), GENERAL_STYLES)
+    return f"{prompt}, {styles[stable_hash(prompt) % len(styles)]}"
+
+
+def timed(func, corpus):
+    start = time.perf_counter()
+    for prompt in corpus:
+        func(prompt)
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "prompts_per_second": len(corpus) / elapsed if elapsed else 0.0,
+            "us_per_prompt": elapsed / len(corpus) * 1e6}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prompt enhancement microbenchmark")
+    parser.add_argument("--prompts", type=int, default=200000)
+    parser.add_argument("--unique", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=12)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    corpus = make_corpus(args.prompts, args.unique, args.words)
+    results = {
+        "legacy_substring_scan": timed(legacy_enhance, corpus),
+        "engine_uncached": timed(uncached_enhance, corpus),
+    }
+    prompt_enhancer.enhance_prompt.cache_clear()
+    results["engine_lru"] = timed(prompt_enhancer.enhance_prompt, corpus)
+    info = prompt_enhancer.enhance_prompt.cache_info()
+    results["engine_lru"]["cache_hit_rate"] = info.hits / max(1, info.hits + info.misses)
+    batch = prompt_enhancer.MAX_BATCH_PROMPTS
+    results["batch"] = timed(prompt_enhancer.enhance_prompts, [corpus[i:i + batch] for i in range(0, len(corpus), batch)])
+    results["batch"]["prompts_per_second"] = len(corpus) / results["batch"]["seconds"]
+    del results["batch"]["us_per_prompt"]
+
+    if args.json:
+        print(json.dumps({"args": vars(args), "results": results}, indent=2))
+        return
+    print(f"{len(corpus)} prompts, {args.unique} distinct")
+    for name, result in results.items():
+        extra = f"  hit rate {result['cache_hit_rate']:.1%}" if "cache_hit_rate" in result else ""
+        print(f"  {name:24} {result['prompts_per_second']:>12,.0f} prompts/s{extra}")
+
+
+if __name__ == "__main__":
+    main()
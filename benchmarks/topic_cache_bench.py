@@ -0,0 +1,97 @@
+"""
+Benchmark for slide_ai.topic_cache at scale: insert N synthetic topics, then
+look up paraphrases of cached topics (should hit) and unrelated topics (should
+miss), reporting hit rates and lookup latency percentiles.
+
+    python -m benchmarks.topic_cache_bench --topics 100000 --queries 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from slide_ai.topic_cache import TopicCache
+
+FILLERS = ("and", "in", "the", "for", "of", "an introduction to", "overview of")
+
+
+def make_vocabulary(size, rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+
+def paraphrase(words, rng):
+    # Same content words, shuffled, with stopword filler and a plural thrown in
+    words = list(words)
+    rng.shuffle(words)
+    words[0] = words[0] + "s"
+    out = []
+    for word in words:
+        out.append(word)
+        if rng.random() < 0.5:
+            out.append(rng.choice(FILLERS))
+    return " ".join(out)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Near-duplicate topic cache benchmark")
+    parser.add_argument("--topics", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--path", help="SQLite file (default: a temporary file)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    path = args.path or os.path.join(tempfile.mkdtemp(), "topics.sqlite3")
+    cache = TopicCache(path, threshold=args.threshold, max_entries=args.topics * 2, adapt=True)
+    deck = {"colors": {}, "fonts": {}, "slides": [{"title": f"Slide {i}"} for i in range(10)]}
+
+    topics = [rng.sample(vocabulary, rng.randint(3, 6)) for _ in range(args.topics)]
+    start = time.perf_counter()
+    for words in topics:
+        cache.add(" ".join(words), 10, deck)
+    insert_seconds = time.perf_counter() - start
+
+    def run(queries):
+        hits, latencies = 0, []
+        for query in queries:
+            started = time.perf_counter()
+            hits += cache.lookup(query, 5) is not None
+            latencies.append(time.perf_counter() - started)
+        return {"hit_rate": hits / len(queries), "p50_us": percentile(latencies, 0.5) * 1e6,
+                "p99_us": percentile(latencies, 0.99) * 1e6}
+
+    paraphrases = [paraphrase(rng.choice(topics), rng) for _ in range(args.queries)]
+    unrelated = [" ".join(rng.sample(vocabulary, rng.randint(3, 6))) for _ in range(args.queries)]
+    results = {
+        "insert_per_second": args.topics / insert_seconds,
+        "paraphrase": run(paraphrases),
+        "unrelated": run(unrelated),
+        "stats": cache.stats(),
+    }
+    if args.json:
+        print(json.dumps({"args": vars(args), "results": results}, indent=2))
+        return
+    print(f"{results['stats']['entries']} topics cached ({results['insert_per_second']:,.0f} inserts/s)")
+    for name in ("paraphrase", "unrelated"):
+        result = results[name]
+        print(f"  {name:12} hit rate {result['hit_rate']:6.1%}  p50 {result['p50_us']:7.0f}us  p99 {result['p99_us']:7.0f}us")
+
+
+if __name__ == "__main__":
+    main()
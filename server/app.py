@@ -2,18 +2,14 @@ import os
 import base64
 import io
 import sys
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, Response, send_file
 from flask_cors import CORS
-from rembg import remove
-from PIL import Image
-import numpy as np
 import requests
 import json
 from dotenv import load_dotenv
-from collections import deque
-from datetime import datetime, timedelta
+import hashlib
 import logging
-import google.generativeai as genai
+import time
 
 # Add the project root directory to the Python path to import slide_ai modules
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -21,59 +17,112 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 # Import slide_ai modules
-from slide_ai.config import get_gemini_api_key, get_unsplash_access_key
+# Heavy modules (rembg/onnxruntime, google.generativeai, PIL, python-pptx) are
+# imported inside the endpoints that need them, so the app starts serving
+# health checks immediately; see the LazyResource definitions below.
+from slide_ai.config import (
+    get_gemini_api_key, get_unsplash_access_key, get_payload_log_sample_rate,
+    get_warmup_resources, get_warmup_delay, get_snapshot_max_upload_bytes,
+)
 from slide_ai.gemini_api import generate_slide_content
-from slide_ai.unsplash_api import fetch_unsplash_image, download_image_to_stream
-from slide_ai.image_editor import add_rounded_corners, pil_image_to_stream
+from slide_ai.unsplash_api import get_unsplash_alternatives, ALTERNATIVES_PAGE_SIZE, CANDIDATES_PER_SEARCH
+from slide_ai.artifacts import get_artifact_store, PPTX_MIME_TYPE
+from slide_ai.deck_snapshot import save_snapshot, import_snapshot, open_snapshot, SNAPSHOT_MIME_TYPE
+from slide_ai.prompt_enhancer import enhance_prompt as enhance_prompt_text, enhance_prompts
+from slide_ai.logs import log_event, preview
+from slide_ai.metrics import render_prometheus, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from slide_ai.warmup import LazyResource, start_warmup, readiness
+from slide_ai.admission import get_admission, Overloaded
+from slide_ai.cache import get_cache
+from slide_ai.image_decode import decode_image, ImageTooLarge
+from slide_ai.layout import MIN_THUMBNAIL_WIDTH, MAX_THUMBNAIL_WIDTH
+from slide_ai.http_cache import negotiate_encoding, is_compressible, should_compress, compress, encoded_etag, strong_etag, etag_matches
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path='../.env')
 
-# Rate limiter for Gemini API
+# Rate limiter for Gemini API. Counts live in the shared cache, so the limits
+# hold across all worker processes rather than per worker.
 class RateLimiter:
-    def __init__(self, max_rpm=10, max_rpd=100):
+    def __init__(self, max_rpm=10, max_rpd=100, name='gemini'):
         self.max_rpm = max_rpm  # Max requests per minute
         self.max_rpd = max_rpd  # Max requests per day
-        self.minute_requests = deque()
-        self.day_requests = deque()
-    
+        self.name = name
+        self.cache = get_cache('ratelimit')
+
     def can_make_request(self):
-        current_time = datetime.now()
-        
-        # Clean up old entries
-        self._clean_old_entries(current_time)
-        
-        # Check if we've exceeded limits
-        if len(self.minute_requests) >= self.max_rpm:
+        # Fixed one-minute and one-day windows
+        now = int(time.time())
+        minute_key = f"{self.name}:minute:{now // 60}"
+        if self.cache.incr(minute_key, ttl=60) > self.max_rpm:
+            self.cache.incr(minute_key, -1, ttl=60)
             return False, f"Rate limit exceeded: {self.max_rpm} requests per minute"
-        
-        if len(self.day_requests) >= self.max_rpd:
+
+        day_key = f"{self.name}:day:{now // 86400}"
+        if self.cache.incr(day_key, ttl=86400) > self.max_rpd:
+            self.cache.incr(day_key, -1, ttl=86400)
+            self.cache.incr(minute_key, -1, ttl=60)
             return False, f"Rate limit exceeded: {self.max_rpd} requests per day"
-        
-        # Add this request to our tracking
-        self.minute_requests.append(current_time)
-        self.day_requests.append(current_time)
-        
+
         return True, None
-    
-    def _clean_old_entries(self, current_time):
-        # Remove entries older than 1 minute
-        minute_ago = current_time - timedelta(minutes=1)
-        while self.minute_requests and self.minute_requests[0] < minute_ago:
-            self.minute_requests.popleft()
-        
-        # Remove entries older than 1 day
-        day_ago = current_time - timedelta(days=1)
-        while self.day_requests and self.day_requests[0] < day_ago:
-            self.day_requests.popleft()
 
 # Initialize rate limiter
 gemini_rate_limiter = RateLimiter()
+rembg_cache = get_cache('rembg')
+# Longest side uploads are decoded at: rembg's model works at 320px and Gemini
+# tiles images at 768px, so full-resolution phone photos only cost memory and CPU
+REMBG_MAX_SIDE = 2048
+EQUATION_MAX_SIDE = 1536
+
+def _load_pipeline():
+    # PIL, python-pptx and the image pipeline behind /api/generate, jobs, thumbnails and exports
+    from slide_ai import pipeline, thumbnail, pptx_builder, jobs
+    return pipeline
+
+def _load_genai():
+    import google.generativeai as genai
+    return genai
+
+def _load_rembg():
+    from rembg import remove, new_session
+    # One ONNX session shared by all requests instead of a model load per call
+    return remove, new_session()
+
+pipeline_deps = LazyResource("pipeline", _load_pipeline)
+genai_module = LazyResource("genai", _load_genai)
+rembg_session = LazyResource("rembg", _load_rembg)
 
 app = Flask(__name__)
 # Enable CORS for all routes and origins
 CORS(app)
 
+def overloaded_response(e):
+    # Admission control rejected the work: tell the client when to come back
+    response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    response.status_code = e.status_code
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+app.register_error_handler(Overloaded, overloaded_response)
+
+@app.after_request
+def compress_response(response):
+    # Negotiated brotli/gzip for complete JSON and text bodies above the size
+    # threshold; streamed responses (SSE, send_file) are left alone
+    if response.direct_passthrough or response.is_streamed or not is_compressible(response.mimetype):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    body = response.get_data()
+    if (encoding is None or response.status_code != 200
+            or not should_compress(response.mimetype, len(body), response.headers.get('Content-Encoding'))):
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = encoded_etag(response.headers['ETag'], encoding)
+    return response
+
 # CORS decorator for handling preflight requests
 def cors_response(f):
     def wrapper(*args, **kwargs):
@@ -105,16 +154,25 @@ def remove_background():
         # Decode base64 to binary
         image_bytes = base64.b64decode(image_data)
         
-        # Open the image with Pillow
-        input_image = Image.open(io.BytesIO(image_bytes))
-        
-        # Process the image with rembg
-        output_image = remove(input_image)
+        # The same upload always gives the same cutout; reuse it from the shared cache
+        cache_key = hashlib.sha256(image_bytes).hexdigest()
+        output_bytes = rembg_cache.get(cache_key)
+        if output_bytes is None:
+            # Decode at no more than the size the cutout is returned at
+            input_image = decode_image(image_bytes, max_size=(REMBG_MAX_SIDE, REMBG_MAX_SIDE), purpose="rembg")
+            
+            # Process the image with rembg
+            remove, session = rembg_session.get()
+            with get_admission("rembg").acquire():
+                output_image = remove(input_image, session=session)
+            
+            buffered = io.BytesIO()
+            output_image.save(buffered, format="PNG")
+            output_bytes = buffered.getvalue()
+            rembg_cache.set(cache_key, output_bytes)
         
         # Convert the output image to base64
-        buffered = io.BytesIO()
-        output_image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        img_str = base64.b64encode(output_bytes).decode('utf-8')
         
         # Return the processed image
         return jsonify({
@@ -122,6 +180,10 @@ def remove_background():
             'image': f'data:image/png;base64,{img_str}'
         })
     
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         print(f"Error processing image: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -165,10 +227,9 @@ def generate_image():
             return jsonify({'error': 'API key not configured'}), 500
         
         # Call the Gemini API
-        print(f"Using API Key: {api_key[:10]}...")
-        print(f"Generating image with prompt: {prompt[:100]}...")
+        log_event("gemini_image_request", prompt_chars=len(prompt))
         
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp-image-generation:generateContent?key={api_key}"
+        url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp-image-generation:generateContent"
         payload = {
             "contents": [{
                 "parts": [
@@ -178,8 +239,10 @@ def generate_image():
             "generationConfig": {"responseModalities": ["Text", "Image"]}
         }
         
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        # The key goes in a header so it never ends up in a URL or an error message
+        headers = {'Content-Type': 'application/json', 'x-goog-api-key': api_key}
+        with get_admission("gemini").acquire():
+            response = requests.post(url, headers=headers, data=json.dumps(payload))
         
         # Check if the request was successful
         if response.status_code != 200:
@@ -215,8 +278,8 @@ def generate_image():
                 text_response = part['text']
         
         if not image_part:
-            print("No image found in response")
-            print(f"Full response: {json.dumps(response_data, indent=2)}")
+            log_event("gemini_image_missing", level=logging.WARNING, sample_rate=get_payload_log_sample_rate(),
+                      payload=preview(json.dumps(response_data)))
             return jsonify({'error': 'No image found in the response'}), 500
         
         # Extract the base64 image data
@@ -230,15 +293,12 @@ def generate_image():
             'text': text_response
         })
     
-    except Exception as e:
-        import traceback
-        error_traceback = traceback.format_exc()
-        print(f"Error generating image: {str(e)}")
-        print(error_traceback)
-        return jsonify({
-            'error': str(e),
-            'traceback': error_traceback
-        }), 500
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception:
+        # Upstream errors stay in the server log; the client gets a generic message
+        logging.exception("Error generating image")
+        return jsonify({'error': 'Image generation failed'}), 500
 
 @app.route('/api/enhance-prompt', methods=['GET', 'POST', 'OPTIONS'])
 @cors_response
@@ -257,101 +317,7 @@ def enhance_prompt():
             logging.error("API key not configured for Gemini")
             return jsonify({'error': 'API key not configured'}), 500
         
-        # Create a more creative and detailed enhanced version of the prompt
-        logging.info(f"Received prompt for enhancement: {original_prompt}")
-        
-        # Define different enhancement styles based on the prompt content
-        prompt_lower = original_prompt.lower()
-        art_keywords = ['art', 'painting', 'drawing', 'artist', 'portrait', 'illustration', 'sketch', 'canvas']
-        nature_keywords = ['nature', 'landscape', 'mountain', 'ocean', 'forest', 'sky', 'sunset', 'beach', 'river', 'waterfall', 'garden']
-        tech_keywords = ['tech', 'technology', 'futuristic', 'robot', 'digital', 'cyber', 'computer', 'AI', 'machine', 'device']
-        fantasy_keywords = ['fantasy', 'magical', 'dragon', 'fairy', 'wizard', 'elf', 'mythical', 'enchanted', 'medieval']
-        food_keywords = ['food', 'cuisine', 'dish', 'meal', 'restaurant', 'cooking', 'dessert', 'chef', 'gourmet']
-        architecture_keywords = ['building', 'architecture', 'structure', 'skyscraper', 'house', 'interior', 'design', 'construction']
-        space_keywords = ['space', 'galaxy', 'cosmic', 'universe', 'planet', 'star', 'nebula', 'astronomy', 'astronaut']
-        animal_keywords = ['animal', 'wildlife', 'pet', 'dog', 'cat', 'bird', 'fish', 'lion', 'tiger', 'bear', 'elephant']
-        
-        # Select enhancement style based on keywords
-        if any(keyword in prompt_lower for keyword in art_keywords):
-            # Art-focused enhancement
-            styles = [
-                f"{original_prompt}, masterpiece, trending on artstation, award-winning, professional, detailed, vibrant colors, perfect composition",
-                f"{original_prompt}, fine art, museum quality, detailed brushwork, professional, trending on artstation, masterpiece",
-                f"{original_prompt}, artistic masterpiece, vivid colors, detailed, perfect lighting, trending on artstation, award-winning"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in nature_keywords):
-            # Nature-focused enhancement
-            styles = [
-                f"{original_prompt}, breathtaking nature photography, golden hour lighting, 8K resolution, perfect composition, National Geographic, ultra-detailed",
-                f"{original_prompt}, stunning landscape, professional photography, perfect lighting, ultra HD, photorealistic, detailed textures",
-                f"{original_prompt}, beautiful scenery, professional nature photography, perfect lighting, detailed, ultra HD resolution"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in tech_keywords):
-            # Tech-focused enhancement
-            styles = [
-                f"{original_prompt}, futuristic technology, detailed, high-tech, professional product photography, perfect lighting, ultra HD resolution",
-                f"{original_prompt}, cutting-edge technology, detailed, sleek design, professional photography, perfect lighting, ultra-realistic",
-                f"{original_prompt}, advanced technology, detailed, modern design, professional product photography, studio lighting, ultra HD"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in fantasy_keywords):
-            # Fantasy-focused enhancement
-            styles = [
-                f"{original_prompt}, fantasy art, magical atmosphere, detailed, vibrant colors, professional illustration, perfect composition",
-                f"{original_prompt}, epic fantasy scene, detailed, magical, professional digital art, perfect lighting, cinematic",
-                f"{original_prompt}, mythical scene, detailed, magical atmosphere, professional fantasy art, perfect composition"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in food_keywords):
-            # Food-focused enhancement
-            styles = [
-                f"{original_prompt}, gourmet food photography, professional, perfect lighting, detailed textures, mouth-watering, ultra HD resolution",
-                f"{original_prompt}, culinary masterpiece, professional food photography, perfect composition, detailed, studio lighting",
-                f"{original_prompt}, delicious food, professional culinary photography, perfect lighting, detailed textures, ultra-realistic"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in architecture_keywords):
-            # Architecture-focused enhancement
-            styles = [
-                f"{original_prompt}, architectural visualization, photorealistic rendering, perfect lighting, detailed textures, professional quality, ultra HD resolution",
-                f"{original_prompt}, architectural design, detailed structure, professional photography, dramatic lighting, perfect composition, ultra-realistic"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in space_keywords):
-            # Space-focused enhancement
-            styles = [
-                f"{original_prompt}, cosmic scene, astronomy photography, nebula colors, star details, space exploration, ultra HD, breathtaking view, scientifically accurate",
-                f"{original_prompt}, space art, cosmic scenery, stellar details, astronomical phenomenon, scientifically accurate, ultra HD, professional rendering",
-                f"{original_prompt}, astrophotography, telescope imagery, detailed cosmic structures, space exploration, NASA quality, ultra HD resolution"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in animal_keywords):
-            # Animal-focused enhancement
-            styles = [
-                f"{original_prompt}, wildlife photography, National Geographic, perfect timing, natural habitat, detailed fur/feathers, professional photography, ultra HD, telephoto lens",
-                f"{original_prompt}, animal portrait, studio lighting, detailed features, professional wildlife photography, perfect composition, ultra-realistic",
-                f"{original_prompt}, animal in motion, action shot, perfect timing, natural environment, detailed, professional wildlife photography"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        else:
-            # General enhancement for other types of prompts
-            styles = [
-                f"{original_prompt}, highly detailed, professional photography, cinematic, perfect lighting, 8K resolution, photorealistic, masterpiece quality, perfect composition",
-                f"{original_prompt}, ultra-realistic, detailed textures, professional lighting, cinematic composition, 8K resolution, photorealistic rendering",
-                f"{original_prompt}, studio photography, perfect lighting, detailed textures, professional quality, ultra HD resolution, photorealistic"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-        
+        enhanced_prompt = enhance_prompt_text(original_prompt)
         logging.info(f"Enhanced prompt: {enhanced_prompt}")
         
         return jsonify({"enhanced_prompt": enhanced_prompt})
@@ -359,6 +325,20 @@ def enhance_prompt():
         logging.error(f"Error enhancing prompt: {str(e)}")
         return jsonify({'error': f"Failed to enhance prompt: {str(e)}"}), 500
 
+@app.route('/api/enhance-prompt/batch', methods=['POST', 'OPTIONS'])
+@cors_response
+def enhance_prompt_batch():
+    data = request.json or {}
+    prompts = data.get('prompts')
+    if not isinstance(prompts, list) or not prompts:
+        return jsonify({'error': 'No prompts provided'}), 400
+    if not get_gemini_api_key():
+        return jsonify({'error': 'API key not configured'}), 500
+    try:
+        return jsonify({"enhanced_prompts": enhance_prompts(prompts)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/generate', methods=['GET', 'POST', 'OPTIONS'])
 @cors_response
 def generate_slides():
@@ -378,40 +358,154 @@ def generate_slides():
         if not gemini_key:
             return jsonify({'error': 'Gemini API key not configured'}), 500
             
+        pipeline_deps.get()
+        from slide_ai.pipeline import attach_slide_preview
+        
         # Generate slide content using the Gemini API
         data = generate_slide_content(topic, num_slides, gemini_key)
         slides = data["slides"]
         
         # Attach images as base64 for preview
+        image_streams = []
         for slide in slides:
             if not isinstance(slide, dict):
                 logging.error(f"Slide is not a dict: {slide}")
                 continue
                 
-            image_url, photographer, photographer_url, error_msg = fetch_unsplash_image(slide.get("unsplash_query"), unsplash_key)
-            slide["unsplash_image_url"] = image_url
-            slide["unsplash_photographer_name"] = photographer
-            slide["unsplash_photographer_url_with_utm"] = photographer_url
-            slide["image_fetch_error"] = error_msg
-            slide["img_b64"] = None
-            
-            if image_url:
-                image_stream = download_image_to_stream(image_url)
-                if image_stream:
-                    pil_img = Image.open(image_stream)
-                    rounded_img = add_rounded_corners(pil_img, radius=60)
-                    rounded_stream = pil_image_to_stream(rounded_img)
-                    img_bytes = rounded_stream.getvalue()
-                    slide["img_b64"] = f"data:image/png;base64,{base64.b64encode(img_bytes).decode()}"
-                    
-        return jsonify({"colors": data["colors"], "fonts": data["fonts"], "slides": slides})
+            image_streams.append(attach_slide_preview(slide, unsplash_key, colors=data["colors"]))
+        
+        # Keep what was generated and fetched, so the deck can be re-rendered without calling Gemini or Unsplash again
+        snapshot_id = save_snapshot([slide for slide in slides if isinstance(slide, dict)], topic,
+                                    data["colors"], data["fonts"], images=image_streams)
+        return jsonify({"colors": data["colors"], "fonts": data["fonts"], "slides": slides, "snapshot_id": snapshot_id})
     
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception:
+        # Upstream errors stay in the server log; the client gets a generic message
+        logging.exception("Error generating slides")
+        return jsonify({'error': 'Slide generation failed'}), 500
+
+def _job_runner():
+    pipeline_deps.get()
+    from slide_ai.jobs import get_job_runner
+    return get_job_runner()
+
+@app.route('/api/jobs', methods=['POST', 'OPTIONS'])
+@cors_response
+def create_job():
+    # Starts a background generation and returns immediately with the job ID
+    data = request.json or {}
+    topic = data.get('topic')
+    num_slides = data.get('num_slides', 5)
+    if not topic:
+        return jsonify({'error': 'No topic provided'}), 400
+    gemini_key = get_gemini_api_key()
+    if not gemini_key:
+        return jsonify({'error': 'Gemini API key not configured'}), 500
+    job_id = _job_runner().submit(topic, num_slides, gemini_key, get_unsplash_access_key())
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/jobs/{job_id}/events',
+        'result_url': f'/api/jobs/{job_id}/result',
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET', 'DELETE', 'OPTIONS'])
+@cors_response
+def job_status(job_id):
+    runner = _job_runner()
+    if request.method == 'DELETE':
+        if not runner.cancel(job_id):
+            return jsonify({'error': 'Job not found'}), 404
+    job = runner.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    store = _job_runner().store
+    if store.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    from slide_ai.jobs import iter_sse, parse_last_event_id
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('after'))
+    return Response(
+        iter_sse(store, job_id, last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    # Partial results: finished slides are returned while the rest are still null
+    result = _job_runner().store.result(job_id)
+    if result is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(result)
+
+@app.route('/api/thumbnails', methods=['POST', 'OPTIONS'])
+@cors_response
+def create_thumbnail():
+    try:
+        # Render (or reuse) a thumbnail for an edited slide; img_b64 is optional
+        data = request.json or {}
+        slide = data.get('slide')
+        if not isinstance(slide, dict):
+            return jsonify({'error': 'No slide provided'}), 400
+        # The canvas is allocated at this width, so it is bounded before anything is rendered
+        try:
+            width = int(data.get('width', 320))
+        except (TypeError, ValueError):
+            width = None
+        if width is None or not MIN_THUMBNAIL_WIDTH <= width <= MAX_THUMBNAIL_WIDTH:
+            return jsonify({'error': f'width must be an integer between {MIN_THUMBNAIL_WIDTH} and {MAX_THUMBNAIL_WIDTH}'}), 400
+        image_stream = None
+        if slide.get('img_b64'):
+            image_stream = io.BytesIO(base64.b64decode(slide['img_b64'].split(',')[-1]))
+        pipeline_deps.get()
+        from slide_ai.thumbnail import get_slide_thumbnail
+        thumb_key, _, _ = get_slide_thumbnail(
+            slide, image_stream,
+            width=width,
+            fmt=data.get('format', 'PNG'),
+            colors=data.get('colors'),
+        )
+        return jsonify({'thumbnail_key': thumb_key, 'thumbnail_url': f'/api/thumbnails/{thumb_key}'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        import traceback
-        tb = traceback.format_exc()
-        print(tb)
-        print(f"Error generating slides: {str(e)}")
-        return jsonify({'error': str(e), 'traceback': tb}), 500
+        logging.exception("Error in /api/thumbnails")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/thumbnails/<thumb_key>', methods=['GET'])
+def get_thumbnail(thumb_key):
+    pipeline_deps.get()
+    from slide_ai.thumbnail import thumbnail_cache
+    cached = thumbnail_cache.get(thumb_key)
+    if cached is None:
+        return jsonify({'error': 'Thumbnail not found'}), 404
+    data, mime_type = cached
+    # Keys are content hashes, so the bytes behind a key never change
+    headers = {'Cache-Control': 'public, max-age=31536000, immutable', 'ETag': strong_etag(thumb_key)}
+    if etag_matches(request.headers.get('If-None-Match'), headers['ETag']):
+        return Response(status=304, headers=headers)
+    return Response(data, mimetype=mime_type, headers=headers)
+
+@app.route('/api/unsplash/alternatives', methods=['GET', 'OPTIONS'])
+@cors_response
+def unsplash_alternatives():
+    # Pages through the cached candidates for a query; only the first request for a query uses API quota
+    query = request.args.get('query', '').strip()
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = min(max(1, int(request.args.get('limit', ALTERNATIVES_PAGE_SIZE))), CANDIDATES_PER_SEARCH)
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    page = get_unsplash_alternatives(query, get_unsplash_access_key(), offset, limit)
+    return jsonify(dict(page, query=query))
 
 @app.route('/api/generate_pptx', methods=['GET', 'POST', 'OPTIONS'])
 @cors_response
@@ -423,22 +517,22 @@ def generate_pptx():
         topic = data.get('topic', 'Untitled')
         colors = data.get('colors', {})
         fonts = data.get('fonts', {})
+        pipeline_deps.get()
+        from slide_ai.pptx_builder import create_pptx_with_unsplash
         
-        # Ensure the topic is valid for filename creation
-        safe_topic = topic.replace(' ', '_').lower()
-        if not safe_topic:
-            safe_topic = "slide_presentation"
-            
-        # Generate a unique filename with timestamp to avoid conflicts
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d-%H%M%S")
-        filename = f"{safe_topic}_{timestamp}.pptx"
-        
-        # Create the PowerPoint file
-        create_pptx_with_unsplash(slides, topic, filename=filename)  # Pass the filename explicitly
+        # Identical payloads resolve to the same stored artifact and are built once
+        artifact_id, _, created = get_artifact_store().get_or_create(
+            slides, topic, colors, fonts,
+            build=lambda path: create_pptx_with_unsplash(slides, topic, filename=path, colors=colors, fonts=fonts),
+        )
         
-        # Return the filename for download
-        return jsonify({"pptx_file": filename})
+        # Return the artifact ID for download
+        return jsonify({
+            "pptx_file": artifact_id,
+            "artifact_id": artifact_id,
+            "download_url": f"/api/artifacts/{artifact_id}",
+            "cached": not created,
+        })
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
@@ -446,6 +540,106 @@ def generate_pptx():
         logging.exception("Error in /api/generate_pptx")
         return jsonify({"error": str(e), "traceback": tb}), 500
 
+@app.route('/api/artifacts/<artifact_id>', methods=['GET'])
+def download_artifact(artifact_id):
+    artifact = get_artifact_store().get(artifact_id)
+    if artifact is None:
+        return jsonify({"error": f"Artifact {artifact_id} not found"}), 404
+    path, meta = artifact
+    # send_file streams from disk (through the server's wsgi.file_wrapper/sendfile
+    # when available) with Content-Length, answers Range/If-Range with 206/416 and
+    # If-None-Match against the file's sha256 with 304
+    return send_file(path, mimetype=PPTX_MIME_TYPE, as_attachment=True, download_name=meta["download_name"],
+                     etag=meta["sha256"], conditional=True)
+
+def _snapshot_urls(snapshot_id):
+    return {
+        'snapshot_id': snapshot_id,
+        'snapshot_url': f'/api/snapshots/{snapshot_id}',
+        'slides_url': f'/api/snapshots/{snapshot_id}/slides',
+        'pptx_url': f'/api/snapshots/{snapshot_id}/pptx',
+    }
+
+@app.route('/api/snapshots', methods=['POST', 'OPTIONS'])
+@cors_response
+def upload_snapshot():
+    # Accepts a snapshot previously downloaded from /api/snapshots/<id> (raw body)
+    max_bytes = get_snapshot_max_upload_bytes()
+    data = request.get_data() if (request.content_length or 0) <= max_bytes else None
+    if data is None or len(data) > max_bytes:
+        return jsonify({'error': f'Snapshot exceeds {max_bytes} bytes'}), 413
+    try:
+        snapshot_id = import_snapshot(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(_snapshot_urls(snapshot_id)), 201
+
+@app.route('/api/snapshots/<snapshot_id>', methods=['GET'])
+def download_snapshot(snapshot_id):
+    path = get_artifact_store().get_snapshot(snapshot_id)
+    if path is None:
+        return jsonify({'error': f'Snapshot {snapshot_id} not found'}), 404
+    # The ID is a hash of the content, so it doubles as a strong ETag
+    return send_file(path, mimetype=SNAPSHOT_MIME_TYPE, as_attachment=True, download_name=f'{snapshot_id}.slds',
+                     etag=snapshot_id, conditional=True)
+
+@app.route('/api/snapshots/<snapshot_id>/slides', methods=['GET'])
+def snapshot_slides(snapshot_id):
+    # Previews and thumbnails rendered from the stored images; ?index=N for one slide
+    snapshot = open_snapshot(snapshot_id)
+    if snapshot is None:
+        return jsonify({'error': f'Snapshot {snapshot_id} not found'}), 404
+    with snapshot:
+        try:
+            indexes = [int(request.args['index'])] if 'index' in request.args else None
+            pipeline_deps.get()
+            from slide_ai.pipeline import render_snapshot_previews
+            slides = render_snapshot_previews(snapshot, indexes)
+        except (IndexError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'topic': snapshot.topic, 'colors': snapshot.colors, 'fonts': snapshot.fonts,
+                        'slides': slides, **_snapshot_urls(snapshot_id)})
+
+@app.route('/api/snapshots/<snapshot_id>/pptx', methods=['POST', 'OPTIONS'])
+@cors_response
+def snapshot_pptx(snapshot_id):
+    snapshot = open_snapshot(snapshot_id)
+    if snapshot is None:
+        return jsonify({'error': f'Snapshot {snapshot_id} not found'}), 404
+    try:
+        with snapshot:
+            pipeline_deps.get()
+            from slide_ai.pptx_builder import create_pptx_with_unsplash
+            # Keyed by the snapshot's records, so the deck is stored under the snapshot ID and built once
+            artifact_id, _, created = get_artifact_store().get_or_create(
+                snapshot.records(), snapshot.topic, snapshot.colors, snapshot.fonts,
+                build=lambda path: create_pptx_with_unsplash(snapshot.slides(), snapshot.topic, filename=path,
+                                                             colors=snapshot.colors, fonts=snapshot.fonts),
+            )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        "pptx_file": artifact_id,
+        "artifact_id": artifact_id,
+        "download_url": f"/api/artifacts/{artifact_id}",
+        "cached": not created,
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_prometheus(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving; never waits on model loads
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: every resource selected for warm-up has finished loading
+    ready, details = readiness()
+    return jsonify(details), (200 if ready else 503)
+
 @app.route('/api/extract-equation', methods=['POST', 'OPTIONS'])
 @cors_response
 def extract_equation():
@@ -460,6 +654,7 @@ def extract_equation():
             return jsonify({"error": "GOOGLE_API_KEY environment variable not set"}), 500
             
         # Configure the Gemini API
+        genai = genai_module.get()
         genai.configure(api_key=api_key)
         model = genai.GenerativeModel('gemini-2.0-flash')
         
@@ -471,13 +666,9 @@ def extract_equation():
         if image_file.filename == '':
             return jsonify({"error": "Empty image file"}), 400
             
-        # Read the image file
+        # Read the image file, decoded as RGB at a size Gemini can still read
         img_bytes = image_file.read()
-        img = Image.open(io.BytesIO(img_bytes))
-        
-        # Convert to RGB if needed
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        img = decode_image(img_bytes, max_size=(EQUATION_MAX_SIDE, EQUATION_MAX_SIDE), mode='RGB', purpose="equation")
             
         # Save to a BytesIO object
         img_byte_arr = io.BytesIO()
@@ -491,7 +682,8 @@ def extract_equation():
         ]
         
         # Generate content using Gemini
-        response = model.generate_content(contents)
+        with get_admission("gemini").acquire():
+            response = model.generate_content(contents)
         equation = response.text.strip()
         
         # Clean up the equation - remove markdown code blocks if present
@@ -506,12 +698,17 @@ def extract_equation():
         else:
             return jsonify({"error": "Could not extract the equation"}), 400
             
-    except Exception as e:
-        import traceback
-        tb = traceback.format_exc()
-        print(tb)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception:
+        # Upstream errors stay in the server log; the client gets a generic message
         logging.exception("Error in /api/extract-equation")
-        return jsonify({"error": str(e), "traceback": tb}), 500
+        return jsonify({"error": "Equation extraction failed"}), 500
+
+# Load heavy dependencies in the background once the server is up (SLIDE_AI_WARMUP=none to disable)
+_warmup_names = get_warmup_resources()
+if _warmup_names is None or _warmup_names:
+    start_warmup(_warmup_names, delay=get_warmup_delay())
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
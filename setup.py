@@ -10,7 +10,9 @@ setup(
         "google-generativeai",
         "python-pptx",
         "pillow",
+        "numpy",
         "requests",
+        "httpx",
         "uvicorn",
     ],
 )
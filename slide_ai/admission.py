@@ -0,0 +1,204 @@
+"""
+Per-upstream admission control: concurrency limits with bounded, prioritized wait queues.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+from slide_ai.config import get_admission_limits
+from slide_ai.metrics import Counter, Gauge, Histogram
+
+INTERACTIVE, BATCH = 0, 1  # lower runs first
+
+ADMISSION_ACTIVE = Gauge("slide_ai_admission_active", "Operations holding an admission slot.", ["upstream"])
+ADMISSION_QUEUED = Gauge("slide_ai_admission_queued", "Operations waiting for an admission slot.", ["upstream"])
+ADMISSION_REJECTED = Counter(
+    "slide_ai_admission_rejected", "Operations rejected by admission control.", ["upstream", "reason"],
+)
+ADMISSION_WAIT = Histogram(
+    "slide_ai_admission_wait_seconds", "Time spent queued for an admission slot.", ["upstream"],
+)
+
+_priority = contextvars.ContextVar("slide_ai_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """
+    Sets the admission priority for upstream calls made in this context
+    (thread or task), e.g. BATCH for background jobs.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Overloaded(Exception):
+    """
+    Raised when an operation cannot be admitted: the wait queue is full or the
+    queue deadline passed. `retry_after` is a whole number of seconds.
+    """
+    status_code = 503
+
+    def __init__(self, upstream, reason, retry_after):
+        super().__init__(f"{upstream} is overloaded ({reason}); retry after {retry_after}s")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.event, self.loop, self.future = event, loop, future
+        self.granted = False
+
+    def grant(self):
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Admits at most `limit` concurrent operations. Up to `max_queue` more wait,
+    highest priority first (FIFO within a priority), for at most `queue_timeout`
+    seconds; anything beyond that is rejected immediately with Overloaded.
+    Usable from threads (acquire) and coroutines (aacquire) at the same time.
+
+        with get_admission("gemini").acquire():
+            response = requests.post(...)
+    """
+    def __init__(self, name, limit, max_queue, queue_timeout):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._avg_hold = 1.0  # seconds, moving average used for Retry-After
+
+    def retry_after(self, queued=None):
+        """
+        Seconds until a new arrival could expect a slot, from queue depth and average hold time.
+        """
+        queued = len(self._queue) if queued is None else queued
+        return max(1, math.ceil(self._avg_hold * (queued + 1) / self.limit))
+
+    def _reject(self, reason):
+        ADMISSION_REJECTED.inc(upstream=self.name, reason=reason)
+        return Overloaded(self.name, reason, self.retry_after())
+
+    def _enter(self, level, waiter):
+        """
+        Takes a slot and returns None, or queues `waiter` and returns its queue entry.
+        """
+        with self._lock:
+            if self._active < self.limit and not self._queue:
+                self._active += 1
+                ADMISSION_ACTIVE.set(self._active, upstream=self.name)
+                return None
+            if len(self._queue) >= self.max_queue:
+                raise self._reject("queue_full")
+            entry = (level, next(self._seq), waiter)
+            heapq.heappush(self._queue, entry)
+            ADMISSION_QUEUED.set(len(self._queue), upstream=self.name)
+            return entry
+
+    def _abandon(self, entry):
+        """
+        Removes a timed-out or cancelled waiter. Returns False if it was granted
+        a slot in the meantime (the caller then owns that slot).
+        """
+        with self._lock:
+            if entry[2].granted:
+                return False
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            ADMISSION_QUEUED.set(len(self._queue), upstream=self.name)
+            return True
+
+    def _release(self, held):
+        with self._lock:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+            if self._queue:
+                # Hand the slot straight to the next waiter; active count is unchanged
+                _, _, waiter = heapq.heappop(self._queue)
+                ADMISSION_QUEUED.set(len(self._queue), upstream=self.name)
+                waiter.grant()
+                return
+            self._active -= 1
+            ADMISSION_ACTIVE.set(self._active, upstream=self.name)
+
+    @contextmanager
+    def acquire(self, level=None, timeout=None):
+        level = _priority.get() if level is None else level
+        timeout = self.queue_timeout if timeout is None else timeout
+        entry = self._enter(level, _Waiter(event=threading.Event()))
+        if entry is not None:
+            waited = time.monotonic()
+            if not entry[2].event.wait(timeout) and self._abandon(entry):
+                raise self._reject("queue_timeout")
+            ADMISSION_WAIT.observe(time.monotonic() - waited, upstream=self.name)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start)
+
+    @asynccontextmanager
+    async def aacquire(self, level=None, timeout=None):
+        level = _priority.get() if level is None else level
+        timeout = self.queue_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        entry = self._enter(level, _Waiter(loop=loop, future=loop.create_future()))
+        if entry is not None:
+            waited = time.monotonic()
+            try:
+                await asyncio.wait_for(asyncio.shield(entry[2].future), timeout)
+            except asyncio.TimeoutError:
+                if self._abandon(entry):
+                    raise self._reject("queue_timeout")
+            except asyncio.CancelledError:
+                if not self._abandon(entry):
+                    self._release(0.0)  # granted as we were cancelled; pass the slot on
+                raise
+            ADMISSION_WAIT.observe(time.monotonic() - waited, upstream=self.name)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start)
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_admission(name):
+    """
+    Returns the process-wide controller for an upstream ("gemini", "unsplash",
+    "rembg"), configured from SLIDE_AI_<NAME>_CONCURRENCY / _QUEUE / _QUEUE_TIMEOUT.
+    """
+    with _controllers_lock:
+        controller = _controllers.get(name)
+        if controller is None:
+            controller = _controllers[name] = AdmissionController(name, *get_admission_limits(name))
+        return controller
@@ -0,0 +1,243 @@
+"""
+Handles storage of generated decks: content-addressed, deduplicated, with size and age eviction.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from slide_ai.config import get_artifact_dir, get_artifact_max_bytes, get_artifact_max_age
+from slide_ai.metrics import record_cache
+
+PPTX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+SNAPSHOT_EXT = ".slds"
+_ARTIFACT_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _json_default(value):
+    # Image streams and raw bytes are hashed so the key stays content-based
+    if hasattr(value, "getvalue"):
+        value = value.getvalue()
+    if isinstance(value, (bytes, bytearray)):
+        return "sha256:" + hashlib.sha256(value).hexdigest()
+    return str(value)
+
+
+def artifact_key(slides, topic, colors=None, fonts=None):
+    """
+    Returns the artifact ID for a deck payload: a hash of its canonical JSON form.
+    """
+    payload = {"slides": slides, "topic": topic, "colors": colors or {}, "fonts": fonts or {}}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def safe_download_name(topic):
+    safe_topic = re.sub(r"[^\w\-]+", "_", (topic or "").strip()).strip("_").lower()
+    return f"{safe_topic or 'slide_presentation'}.pptx"
+
+
+class ArtifactStore:
+    """
+    Keeps generated .pptx files under `root` as <artifact_id>.pptx with a small
+    JSON sidecar, and deck snapshots (slide_ai.deck_snapshot) as <artifact_id>.slds.
+    Identical payloads map to the same artifact and are built once. Artifacts
+    unused for `max_age` seconds are removed, and the least recently used ones go
+    first when the store grows past `max_bytes`; an artifact's deck and snapshot
+    count together.
+    """
+    def __init__(self, root=None, max_bytes=None, max_age=None):
+        self.root = root or get_artifact_dir()
+        self.max_bytes = get_artifact_max_bytes() if max_bytes is None else max_bytes
+        self.max_age = get_artifact_max_age() if max_age is None else max_age
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._building = {}
+
+    def path_for(self, artifact_id):
+        """
+        Returns the on-disk path for an artifact ID, or None if the ID is malformed.
+        Only IDs produced by artifact_key() are accepted, so paths stay inside root.
+        """
+        return self._path(artifact_id, ".pptx")
+
+    def snapshot_path(self, artifact_id):
+        return self._path(artifact_id, SNAPSHOT_EXT)
+
+    def _path(self, artifact_id, ext):
+        if not artifact_id or not _ARTIFACT_ID_RE.match(artifact_id):
+            return None
+        return os.path.join(self.root, f"{artifact_id}{ext}")
+
+    def _confined(self, path):
+        # Resolve symlinks too: a link planted in root must not expose files outside it
+        root = os.path.realpath(self.root)
+        return os.path.commonpath([os.path.realpath(path), root]) == root
+
+    def _meta_path(self, artifact_id):
+        return os.path.join(self.root, f"{artifact_id}.json")
+
+    def get(self, artifact_id):
+        """
+        Returns (path, metadata) for an existing, unexpired artifact or None.
+        Metadata has the download name and the file's sha256.
+        """
+        path = self.path_for(artifact_id)
+        if not path or not os.path.exists(path) or not self._confined(path):
+            return None
+        if time.time() - os.path.getmtime(path) > self.max_age:
+            self._remove(artifact_id, keep_snapshot=True)
+            return None
+        try:
+            with open(self._meta_path(artifact_id), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        meta.setdefault("download_name", f"{artifact_id}.pptx")
+        if "sha256" not in meta:
+            # Sidecars written before content hashes were recorded
+            meta["sha256"] = file_sha256(path)
+        os.utime(path)  # mark as recently used for eviction
+        return path, meta
+
+    def get_or_create(self, slides, topic, colors=None, fonts=None, build=None):
+        """
+        Returns (artifact_id, path, created). `build(path)` is only called when no
+        artifact exists for this payload; concurrent identical requests wait for
+        the first build instead of starting their own.
+        """
+        artifact_id = artifact_key(slides, topic, colors, fonts)
+        while True:
+            existing = self.get(artifact_id)
+            if existing:
+                record_cache("artifact", True)
+                return artifact_id, existing[0], False
+            with self._lock:
+                event = self._building.get(artifact_id)
+                if event is None:
+                    event = self._building[artifact_id] = threading.Event()
+                    break
+            event.wait()
+        record_cache("artifact", False)
+        try:
+            path = self.path_for(artifact_id)
+            fd, tmp_path = tempfile.mkstemp(suffix=".pptx", dir=self.root)
+            os.close(fd)
+            try:
+                build(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            with open(self._meta_path(artifact_id), "w", encoding="utf-8") as f:
+                json.dump({
+                    "download_name": safe_download_name(topic), "topic": topic, "created": time.time(),
+                    # Hash of the bytes on disk: the strong ETag for downloads
+                    "sha256": file_sha256(path),
+                }, f)
+        finally:
+            with self._lock:
+                self._building.pop(artifact_id).set()
+        self.evict(keep=artifact_id)
+        return artifact_id, path, True
+
+    def get_snapshot(self, artifact_id):
+        """
+        Returns the path of an existing, unexpired deck snapshot or None.
+        """
+        path = self.snapshot_path(artifact_id)
+        if not path or not os.path.exists(path) or not self._confined(path):
+            return None
+        if time.time() - os.path.getmtime(path) > self.max_age:
+            self._remove_files(path)
+            return None
+        os.utime(path)
+        return path
+
+    def put_snapshot(self, write):
+        """
+        Stores a snapshot written by `write(path)`, which returns its ID (see
+        deck_snapshot.write_snapshot). Returns the ID.
+        """
+        fd, tmp_path = tempfile.mkstemp(suffix=SNAPSHOT_EXT, dir=self.root)
+        os.close(fd)
+        try:
+            artifact_id = write(tmp_path)
+            path = self.snapshot_path(artifact_id)
+            if path is None:
+                raise ValueError(f"Invalid snapshot ID: {artifact_id!r}")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep=artifact_id)
+        return artifact_id
+
+    def _remove(self, artifact_id, keep_snapshot=False):
+        paths = [self.path_for(artifact_id), self._meta_path(artifact_id)]
+        if not keep_snapshot:
+            paths.append(self.snapshot_path(artifact_id))
+        self._remove_files(*paths)
+
+    @staticmethod
+    def _remove_files(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self, keep=None):
+        """
+        Removes expired artifacts, then least recently used ones until the store
+        fits in max_bytes. Returns the number of artifacts removed.
+        """
+        now = time.time()
+        usage = {}
+        for name in os.listdir(self.root):
+            artifact_id, ext = os.path.splitext(name)
+            if ext not in (".pptx", SNAPSHOT_EXT) or not _ARTIFACT_ID_RE.match(artifact_id):
+                continue
+            try:
+                st = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            mtime, size = usage.get(artifact_id, (0, 0))
+            usage[artifact_id] = (max(mtime, st.st_mtime), size + st.st_size)
+        entries = sorted((mtime, size, artifact_id) for artifact_id, (mtime, size) in usage.items())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, artifact_id in entries:
+            expired = now - mtime > self.max_age
+            if artifact_id == keep or not (expired or total > self.max_bytes):
+                continue
+            self._remove(artifact_id)
+            total -= size
+            removed += 1
+        return removed
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """
+    Returns the process-wide store rooted at the configured artifact directory.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ArtifactStore()
+        return _default_store
@@ -0,0 +1,45 @@
+"""
+Shared async HTTP client for the asyncio code paths (FastAPI app).
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+_clients = {}
+
+# PIL decoding/encoding runs here so it never blocks the event loop
+cpu_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="slide-ai-cpu")
+
+
+def get_async_client():
+    """
+    Returns an httpx.AsyncClient bound to the running event loop, creating it on
+    first use so connections are pooled across requests handled by that loop.
+    """
+    import httpx  # only the async code paths need httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            follow_redirects=True,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """
+    Closes the client for the running loop (call from the app's shutdown hook).
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def run_cpu(func, *args):
+    """
+    Runs a CPU-bound function on the shared executor and awaits its result.
+    """
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, func, *args)
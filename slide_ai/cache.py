@@ -0,0 +1,358 @@
+"""
+Shared cache with interchangeable backends: in-process LRU, SQLite (WAL) on local disk, or Redis.
+
+Every backend follows the same model: an entry lives until its TTL expires or
+until the store exceeds its byte budget, at which point the least recently used
+entries go first (Redis delegates the latter to its maxmemory policy). With
+the SQLite or Redis backend, gunicorn/uvicorn workers share entries and
+counters instead of each keeping their own.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # optional; only needed for SLIDE_AI_CACHE_BACKEND=redis
+    redis = None
+
+from slide_ai.config import get_cache_backend, get_cache_path, get_cache_url, get_cache_max_bytes, get_cache_ttl
+from slide_ai.logs import log_event
+from slide_ai.metrics import record_cache
+
+# Fraction of the byte budget kept after an eviction pass, so we do not evict on every write
+EVICT_TO = 0.9
+# SQLite: run the expiry/eviction pass every this many writes
+SQLITE_EVICT_EVERY = 64
+# SQLite: refresh an entry's last-access time at most this often (seconds), to keep reads cheap
+SQLITE_TOUCH_INTERVAL = 60
+
+
+class MemoryBackend:
+    """
+    Thread-safe LRU of byte values bounded by total size. Per process only.
+    """
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or get_cache_max_bytes()
+        self._items = OrderedDict()  # key -> (value, expires)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        value, _ = self._items.pop(key)
+        self._size -= len(value)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[1] is not None and item[1] <= time.time():
+                self._drop(key)
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, ttl):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = (value, expires)
+            self._size += len(value)
+            if self._size > self.max_bytes:
+                target = self.max_bytes * EVICT_TO
+                while self._items and self._size > target:
+                    self._drop(next(iter(self._items)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+
+    def incr(self, key, amount, ttl):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[1] is not None and item[1] <= time.time():
+                self._drop(key)
+                item = None
+            value = (int(item[0]) if item else 0) + amount
+            expires = item[1] if item else (time.time() + ttl if ttl else None)
+            if item:
+                self._drop(key)
+            encoded = str(value).encode()
+            self._items[key] = (encoded, expires)
+            self._size += len(encoded)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+class SQLiteBackend:
+    """
+    Cache table in a local SQLite file in WAL mode, shared by every process on the host.
+    """
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or get_cache_path()
+        self.max_bytes = max_bytes or get_cache_max_bytes()
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,
+                expires REAL, accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cache_by_accessed ON cache (accessed);
+            CREATE INDEX IF NOT EXISTS cache_by_expires ON cache (expires);
+        """)
+
+    def _conn(self):
+        # One connection per thread; autocommit, with explicit transactions where needed
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        row = self._conn().execute("SELECT value, expires, accessed FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            self._conn().execute("DELETE FROM cache WHERE key = ? AND expires <= ?", (key, now))
+            return None
+        if now - accessed > SQLITE_TOUCH_INTERVAL:
+            self._conn().execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return bytes(value)
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), now + ttl if ttl else None, now),
+        )
+        self._writes += 1
+        if self._writes % SQLITE_EVICT_EVERY == 0:
+            self.evict()
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key, amount, ttl):
+        now = time.time()
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front so concurrent processes serialize here
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires <= ?", (key, now))
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            value = (int(row[0]) if row else 0) + amount
+            encoded = str(value).encode()
+            if row:
+                conn.execute("UPDATE cache SET value = ?, size = ?, accessed = ? WHERE key = ?",
+                             (encoded, len(encoded), now, key))
+            else:
+                conn.execute("INSERT INTO cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                             (key, encoded, len(encoded), now + ttl if ttl else None, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def evict(self):
+        """
+        Drops expired entries, then least recently used ones until under the byte budget.
+        """
+        conn = self._conn()
+        conn.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes * EVICT_TO
+        cutoff, dropped = None, 0
+        for size, accessed in conn.execute("SELECT size, accessed FROM cache ORDER BY accessed"):
+            dropped += size
+            cutoff = accessed
+            if dropped >= excess:
+                break
+        if cutoff is not None:
+            conn.execute("DELETE FROM cache WHERE accessed <= ?", (cutoff,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+
+class RedisBackend:
+    """
+    Any Redis-protocol server (Redis, Valkey, KeyDB, or a stand-in in tests).
+    Size-based eviction is the server's job: configure maxmemory with an
+    allkeys-lru policy.
+    """
+    def __init__(self, url=None, prefix="slide_ai:"):
+        if redis is None:
+            raise RuntimeError("SLIDE_AI_CACHE_BACKEND=redis requires the 'redis' package")
+        self.url = url or get_cache_url()
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(self.url)
+
+    def get(self, key):
+        return self._client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def incr(self, key, amount, ttl):
+        key = self.prefix + key
+        value = self._client.incrby(key, amount)
+        if ttl and value == amount:
+            # First increment of a fresh counter starts its window
+            self._client.pexpire(key, int(ttl * 1000))
+        return value
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(key)
+
+
+BACKENDS = {"memory": MemoryBackend, "sqlite": SQLiteBackend, "redis": RedisBackend}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the process-wide backend chosen by SLIDE_AI_CACHE_BACKEND (memory,
+    sqlite or redis). Falls back to the in-process LRU if it cannot be opened.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = get_cache_backend()
+            try:
+                _backend = BACKENDS[name]()
+            except Exception as e:
+                log_event("cache_backend_unavailable", level=logging.WARNING, backend=name, error=str(e))
+                _backend = MemoryBackend()
+        return _backend
+
+
+def set_backend(backend):
+    """
+    Replaces the process-wide backend (e.g. a RedisBackend pointed at a test server).
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray)):
+        return b"b" + bytes(value)
+    return b"j" + json.dumps(value, separators=(",", ":")).encode()
+
+
+def _decode(data):
+    if data[:1] == b"b":
+        return data[1:]
+    return json.loads(data[1:])
+
+
+class Cache:
+    """
+    A namespace in the shared backend. Values are bytes or JSON-serializable
+    objects; get() always returns a fresh copy. Keys may be strings or tuples of
+    JSON-serializable parts. The default TTL comes from SLIDE_AI_CACHE_TTL_<NAMESPACE>;
+    a TTL of 0 disables storing for the namespace.
+
+        gemini_cache = get_cache("gemini")
+        data = gemini_cache.get((model, topic, num_slides))
+    """
+    def __init__(self, namespace, ttl=None, backend=None):
+        self.namespace = namespace
+        self.ttl = get_cache_ttl(namespace) if ttl is None else ttl
+        self._backend = backend
+
+    @property
+    def backend(self):
+        return self._backend or get_backend()
+
+    def _key(self, key):
+        if not isinstance(key, str):
+            key = hashlib.sha256(json.dumps(key, separators=(",", ":")).encode()).hexdigest()
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        try:
+            data = self.backend.get(self._key(key))
+        except Exception as e:
+            log_event("cache_error", level=logging.WARNING, cache=self.namespace, op="get", error=str(e))
+            data = None
+        record_cache(self.namespace, data is not None)
+        return _decode(data) if data is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl == 0:
+            return
+        try:
+            self.backend.set(self._key(key), _encode(value), ttl)
+        except Exception as e:
+            log_event("cache_error", level=logging.WARNING, cache=self.namespace, op="set", error=str(e))
+
+    def delete(self, key):
+        try:
+            self.backend.delete(self._key(key))
+        except Exception as e:
+            log_event("cache_error", level=logging.WARNING, cache=self.namespace, op="delete", error=str(e))
+
+    def incr(self, key, amount=1, ttl=None):
+        """
+        Atomically adds to a counter across every process sharing the backend and
+        returns the new value. The TTL starts when the counter is created. When
+        the backend fails, returns 0 so limits built on counters fail open.
+        """
+        try:
+            return self.backend.incr(self._key(key), amount, self.ttl if ttl is None else ttl)
+        except Exception as e:
+            log_event("cache_error", level=logging.WARNING, cache=self.namespace, op="incr", error=str(e))
+            return 0
+
+    # Async versions for coroutines: the backends block (SQLite, Redis), so they run on a thread
+
+    async def aget(self, key):
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key, value, ttl=None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    async def adelete(self, key):
+        await asyncio.to_thread(self.delete, key)
+
+
+_caches = {}
+
+
+def get_cache(namespace):
+    cache = _caches.get(namespace)
+    if cache is None:
+        cache = _caches.setdefault(namespace, Cache(namespace))
+    return cache
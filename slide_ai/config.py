@@ -1,6 +1,7 @@
 """
 Handles configuration and API key management for Slide AI.
 """
+import hashlib
 import os
 from dotenv import load_dotenv
 
@@ -13,3 +14,201 @@ def get_gemini_api_key():
 
 def get_unsplash_access_key():
     return os.getenv('UNSPLASH_ACCESS_KEY')
+
+def get_artifact_dir():
+    return os.getenv('SLIDE_AI_ARTIFACT_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'artifacts')
+
+def get_artifact_max_bytes():
+    return int(os.getenv('SLIDE_AI_ARTIFACT_MAX_BYTES', 1024 * 1024 * 1024))
+
+def get_artifact_max_age():
+    """Seconds an artifact may live after its last use."""
+    return int(os.getenv('SLIDE_AI_ARTIFACT_MAX_AGE', 24 * 60 * 60))
+
+def get_gemini_api_base():
+    return os.getenv('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com/v1beta').rstrip('/')
+
+def get_unsplash_api_base():
+    return os.getenv('UNSPLASH_API_BASE', 'https://api.unsplash.com').rstrip('/')
+
+def get_job_db_path():
+    return os.getenv('SLIDE_AI_JOB_DB') or os.path.join(get_artifact_dir(), 'jobs.sqlite3')
+
+def get_job_workers():
+    return int(os.getenv('SLIDE_AI_JOB_WORKERS', 4))
+
+def get_job_retention():
+    """Seconds a job's status, events and slides are kept after its last update."""
+    return int(os.getenv('SLIDE_AI_JOB_RETENTION', 7 * 24 * 3600))
+
+def get_payload_log_sample_rate():
+    """Fraction of calls whose (truncated) upstream payloads are logged."""
+    return float(os.getenv('SLIDE_AI_PAYLOAD_LOG_SAMPLE_RATE', 0.01))
+
+def get_warmup_resources():
+    """
+    Resources to load in the background at startup: "all" (default), "none",
+    or a comma-separated list of names (e.g. "pipeline,genai").
+    """
+    value = os.getenv('SLIDE_AI_WARMUP', 'all').strip().lower()
+    if value == 'all':
+        return None
+    if value in ('', 'none', '0', 'false'):
+        return []
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+def get_warmup_delay():
+    """Seconds to wait after startup before warming up, so the port opens first."""
+    return float(os.getenv('SLIDE_AI_WARMUP_DELAY', 1.0))
+
+def get_compression_min_bytes():
+    """Responses smaller than this are sent uncompressed."""
+    return int(os.getenv('SLIDE_AI_COMPRESS_MIN_BYTES', 1024))
+
+# (concurrency, max queued, queue timeout seconds) per upstream
+ADMISSION_DEFAULTS = {
+    'gemini': (4, 32, 30.0),
+    'unsplash': (16, 128, 10.0),
+    'rembg': (max(1, (os.cpu_count() or 2) // 2), 8, 20.0),
+}
+
+def get_admission_limits(name):
+    """
+    Returns (concurrency, max_queue, queue_timeout) for an upstream, overridable
+    with SLIDE_AI_<NAME>_CONCURRENCY, SLIDE_AI_<NAME>_QUEUE and SLIDE_AI_<NAME>_QUEUE_TIMEOUT.
+    """
+    concurrency, max_queue, queue_timeout = ADMISSION_DEFAULTS.get(name, (8, 64, 30.0))
+    prefix = f'SLIDE_AI_{name.upper()}_'
+    return (
+        max(1, int(os.getenv(prefix + 'CONCURRENCY', concurrency))),
+        max(0, int(os.getenv(prefix + 'QUEUE', max_queue))),
+        float(os.getenv(prefix + 'QUEUE_TIMEOUT', queue_timeout)),
+    )
+
+def get_cache_backend():
+    """Shared cache backend: "sqlite" (default, shared by workers on one host), "memory" or "redis"."""
+    return os.getenv('SLIDE_AI_CACHE_BACKEND', 'sqlite').strip().lower()
+
+def get_cache_path():
+    return os.getenv('SLIDE_AI_CACHE_PATH') or os.path.join(get_artifact_dir(), 'cache.sqlite3')
+
+def get_cache_url():
+    return os.getenv('SLIDE_AI_CACHE_URL', 'redis://localhost:6379/0')
+
+def get_cache_max_bytes():
+    return int(os.getenv('SLIDE_AI_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Default entry lifetime in seconds per cache namespace
+CACHE_TTL_DEFAULTS = {
+    'gemini': 6 * 60 * 60,
+    'unsplash_search': 24 * 60 * 60,
+    'image': 7 * 24 * 60 * 60,
+    'thumbnail': 7 * 24 * 60 * 60,
+    'rembg': 7 * 24 * 60 * 60,
+    'palette': 7 * 24 * 60 * 60,
+    'ratelimit': 24 * 60 * 60,
+}
+
+def get_cache_ttl(namespace):
+    """Seconds entries in a namespace live, overridable with SLIDE_AI_CACHE_TTL_<NAMESPACE>; 0 disables it."""
+    return float(os.getenv(f'SLIDE_AI_CACHE_TTL_{namespace.upper()}', CACHE_TTL_DEFAULTS.get(namespace, 60 * 60)))
+
+def get_image_library_dir():
+    """Folder of licensed images used as a local image provider (unset: no library)."""
+    return os.getenv('SLIDE_AI_IMAGE_LIBRARY') or None
+
+def get_image_library_index(root=None):
+    """
+    Index file of the image library. By default it lives in the artifact dir,
+    named after the library's path, so the library itself can be read-only.
+    """
+    path = os.getenv('SLIDE_AI_IMAGE_LIBRARY_INDEX')
+    if path:
+        return path
+    root = os.path.realpath(root or get_image_library_dir() or '.')
+    return os.path.join(get_artifact_dir(), f'image_library_{hashlib.sha256(root.encode()).hexdigest()[:16]}.index')
+
+def get_image_library_mode():
+    """
+    How the local library is used next to Unsplash: "primary" (library first),
+    "fallback" (default; only when Unsplash fails), "hedge" (library answer if
+    Unsplash is slower than SLIDE_AI_IMAGE_HEDGE_DELAY) or "off".
+    """
+    if not get_image_library_dir():
+        return 'off'
+    return os.getenv('SLIDE_AI_IMAGE_LIBRARY_MODE', 'fallback').strip().lower()
+
+def get_image_hedge_delay():
+    """Seconds to wait for Unsplash before using the library image in hedge mode."""
+    return float(os.getenv('SLIDE_AI_IMAGE_HEDGE_DELAY', 1.5))
+
+def get_unsplash_hedge_enabled():
+    """Hedge slow Unsplash searches and image downloads with a duplicate request (SLIDE_AI_UNSPLASH_HEDGE=0 turns it off)."""
+    return os.getenv('SLIDE_AI_UNSPLASH_HEDGE', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+def get_unsplash_hedge_percentile():
+    """Latency percentile of recent calls (0-1) after which a call is hedged."""
+    return min(1.0, max(0.5, float(os.getenv('SLIDE_AI_UNSPLASH_HEDGE_PERCENTILE', 0.95))))
+
+def get_unsplash_hedge_budget():
+    """Hedges allowed per call, e.g. 0.1 caps the extra requests at about 10%."""
+    return max(0.0, float(os.getenv('SLIDE_AI_UNSPLASH_HEDGE_BUDGET', 0.1)))
+
+def get_unsplash_hedge_max_delay():
+    """Longest wait before hedging, and the wait until enough latencies are known."""
+    return float(os.getenv('SLIDE_AI_UNSPLASH_HEDGE_MAX_DELAY', 2.0))
+
+def get_gemini_models():
+    """(primary, fast) models for deck generation; the fast one also serves as the fallback."""
+    return (
+        os.getenv('SLIDE_AI_GEMINI_MODEL', 'gemini-1.5-flash-latest'),
+        os.getenv('SLIDE_AI_GEMINI_FAST_MODEL', 'gemini-1.5-flash-8b-latest'),
+    )
+
+def get_gemini_slow_seconds():
+    """A primary-model call slower than this is abandoned for the fast model."""
+    return float(os.getenv('SLIDE_AI_GEMINI_SLOW_SECONDS', 45))
+
+def get_gemini_fast_max_slides():
+    """Decks with at most this many slides go straight to the fast model (0, the default: none do)."""
+    return int(os.getenv('SLIDE_AI_GEMINI_FAST_MAX_SLIDES', 0))
+
+def get_gemini_call_db():
+    return os.getenv('SLIDE_AI_GEMINI_CALL_DB') or os.path.join(get_artifact_dir(), 'gemini_calls.sqlite3')
+
+def get_topic_cache_enabled():
+    """Reuse decks generated for near-duplicate topics (SLIDE_AI_TOPIC_CACHE=0 turns it off)."""
+    return os.getenv('SLIDE_AI_TOPIC_CACHE', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+def get_topic_cache_path():
+    return os.getenv('SLIDE_AI_TOPIC_CACHE_PATH') or os.path.join(get_artifact_dir(), 'topics.sqlite3')
+
+def get_topic_cache_threshold():
+    """Minimum Jaccard similarity of normalized topic words for a cached deck to be reused."""
+    return float(os.getenv('SLIDE_AI_TOPIC_CACHE_THRESHOLD', 0.8))
+
+def get_topic_cache_max_entries():
+    return int(os.getenv('SLIDE_AI_TOPIC_CACHE_MAX_ENTRIES', 200000))
+
+def get_topic_cache_adapt():
+    """Serve a smaller deck request from a larger cached deck by keeping its first slides."""
+    return os.getenv('SLIDE_AI_TOPIC_CACHE_ADAPT', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+def get_pptx_optimize():
+    """
+    Post-processing of built decks: "on" (default; prune unused layouts, dedupe
+    media, rewrite the zip), "lossless"/"lossy" (also re-encode images) or "off".
+    """
+    return os.getenv('SLIDE_AI_PPTX_OPTIMIZE', 'on').strip().lower()
+
+def get_deck_snapshots_enabled():
+    """Write a re-renderable snapshot of every generated deck (SLIDE_AI_DECK_SNAPSHOTS=0 turns it off)."""
+    return os.getenv('SLIDE_AI_DECK_SNAPSHOTS', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+def get_snapshot_max_upload_bytes():
+    """Largest deck snapshot accepted by POST /api/snapshots."""
+    return int(os.getenv('SLIDE_AI_SNAPSHOT_MAX_UPLOAD_BYTES', 64 * 1024 * 1024))
+
+def get_image_max_pixels():
+    """Pixel budget for decoding one image; larger images are rejected (decompression bomb guard)."""
+    return int(os.getenv('SLIDE_AI_IMAGE_MAX_PIXELS', 50_000_000))
@@ -0,0 +1,334 @@
+"""
+Deck snapshots: a compact, versioned binary file holding everything needed to
+re-render a generated deck locally (slide content, the Gemini color palette and
+fonts, image references and the image bytes themselves), so previews and .pptx
+exports of a snapshot never call Gemini or Unsplash again.
+
+Layout (little-endian):
+
+    header   magic "SLDS", version, flags, slide count, image count,
+             offsets of the metadata, slide table and image table
+    images   raw encoded image bytes, each stored once however many slides use it
+    records  one zlib-compressed JSON record per slide
+    metadata zlib-compressed JSON: topic, colors, fonts, snapshot ID
+    slides   fixed-width table: record offset, record length, image index
+    images   fixed-width table sorted by sha256: digest, blob offset, blob length
+
+The reader maps the file and decodes only what is asked for: opening a snapshot
+reads the header and metadata, a slide record is decompressed on access and an
+image is copied out of the map only when its slide is rendered.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from io import BytesIO
+
+from slide_ai.artifacts import artifact_key, get_artifact_store
+from slide_ai.config import get_deck_snapshots_enabled
+from slide_ai.logs import log_event
+
+SNAPSHOT_MAGIC = b"SLDS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MIME_TYPE = "application/vnd.slide-ai.snapshot"
+
+_HEADER = struct.Struct("<4sHHIIQIQQ")  # magic, version, flags, slides, images, meta offset/length, slide table, image table
+_SLIDE = struct.Struct("<QII")          # record offset, record length, image index
+_IMAGE = struct.Struct("<32sQQ")        # sha256 digest, blob offset, blob length
+NO_IMAGE = 0xFFFFFFFF
+
+# Rendered from the rest of the slide (and the image) on every load, so not stored
+DERIVED_FIELDS = ("actual_image_stream", "img_b64", "thumbnail_url")
+# Largest decompressed slide record or metadata block; a real one is a few KB,
+# so anything bigger is a corrupt or hostile file (zlib bomb)
+MAX_RECORD_BYTES = 1024 * 1024
+
+
+def _encode(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+
+def _image_bytes(image):
+    if image is None:
+        return None
+    if hasattr(image, "getvalue"):
+        return image.getvalue()
+    if hasattr(image, "read"):
+        image.seek(0)
+        return image.read()
+    return bytes(image)
+
+
+def slide_record(slide, image_sha256=None):
+    """
+    The stored form of a slide: its JSON fields without the derived ones, plus
+    the sha256 of its image (None without one).
+    """
+    record = {key: value for key, value in slide.items() if key not in DERIVED_FIELDS}
+    record["image_sha256"] = image_sha256
+    return record
+
+
+def write_snapshot(path, slides, topic, colors=None, fonts=None, images=None):
+    """
+    Writes a snapshot of a deck atomically and returns its snapshot ID.
+
+    `images` gives each slide's image (a stream or bytes, None for no image) and
+    defaults to slide["actual_image_stream"]. `slides` may be any iterable;
+    images are written as they come, so only one is held at a time. The ID is
+    the artifact key of the stored records, which name their images by hash, so
+    the same deck always gets the same ID and a .pptx built from the snapshot is
+    stored under it too.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"\0" * _HEADER.size)
+            offset = _HEADER.size
+            blobs, records, slide_table = {}, [], []
+            images = iter(images) if images is not None else None
+            for slide in slides:
+                data = _image_bytes(next(images, None) if images is not None else slide.get("actual_image_stream"))
+                digest = None
+                if data:
+                    digest = hashlib.sha256(data).digest()
+                    if digest not in blobs:
+                        blobs[digest] = (offset, len(data))
+                        f.write(data)
+                        offset += len(data)
+                records.append(slide_record(slide, digest.hex() if digest else None))
+                slide_table.append(digest)
+
+            # Image table sorted by digest, so the reader finds an image by binary search
+            digests = sorted(blobs)
+            index = {digest: i for i, digest in enumerate(digests)}
+            colors, fonts = colors or {}, fonts or {}
+            snapshot_id = artifact_key(records, topic, colors, fonts)
+            table = bytearray()
+            for record, digest in zip(records, slide_table):
+                encoded = _encode(record)
+                table += _SLIDE.pack(offset, len(encoded), NO_IMAGE if digest is None else index[digest])
+                f.write(encoded)
+                offset += len(encoded)
+            meta = _encode({"id": snapshot_id, "topic": topic, "colors": colors, "fonts": fonts})
+            meta_off = offset
+            f.write(meta)
+            slides_off = meta_off + len(meta)
+            f.write(table)
+            images_off = slides_off + len(table)
+            f.write(b"".join(_IMAGE.pack(digest, *blobs[digest]) for digest in digests))
+            f.seek(0)
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(records), len(digests),
+                                 meta_off, len(meta), slides_off, images_off))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return snapshot_id
+
+
+class DeckSnapshot:
+    """
+    Lazy reader over a snapshot file (mapped) or its bytes.
+
+        with DeckSnapshot(path) as snapshot:
+            create_pptx_with_unsplash(snapshot.slides(), snapshot.topic,
+                                      colors=snapshot.colors, fonts=snapshot.fonts)
+    """
+    def __init__(self, source):
+        self._mm = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._buf = bytes(source)
+        else:
+            with open(source, "rb") as f:
+                self._mm = self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._buf) < _HEADER.size:
+                raise ValueError("Not a deck snapshot")
+            (magic, version, _, self.n_slides, self.n_images,
+             meta_off, meta_len, self._slides_off, self._images_off) = _HEADER.unpack_from(self._buf, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("Not a deck snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported deck snapshot version {version} (expected {SNAPSHOT_VERSION})")
+            if (self._images_off + self.n_images * _IMAGE.size > len(self._buf)
+                    or self._slides_off + self.n_slides * _SLIDE.size > self._images_off):
+                raise ValueError("Truncated deck snapshot")
+            meta = self._json(meta_off, meta_len)
+            self.id, self.topic, self.colors, self.fonts = (meta[key] for key in ("id", "topic", "colors", "fonts"))
+        except ValueError:
+            self.close()
+            raise
+        except (KeyError, TypeError):
+            self.close()
+            raise ValueError("Corrupt deck snapshot") from None
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n_slides
+
+    def _json(self, offset, length):
+        if offset + length > len(self._buf):
+            raise ValueError("Truncated deck snapshot")
+        decompressor = zlib.decompressobj()
+        try:
+            data = decompressor.decompress(self._buf[offset:offset + length], MAX_RECORD_BYTES)
+        except zlib.error:
+            raise ValueError("Corrupt deck snapshot") from None
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"Deck snapshot record exceeds {MAX_RECORD_BYTES} bytes")
+        if not decompressor.eof:
+            raise ValueError("Corrupt deck snapshot")
+        return json.loads(data)
+
+    def _slide_entry(self, index):
+        if not 0 <= index < self.n_slides:
+            raise IndexError(f"Slide {index} is out of range (0-{self.n_slides - 1})")
+        return _SLIDE.unpack_from(self._buf, self._slides_off + index * _SLIDE.size)
+
+    def slide(self, index):
+        """
+        Returns the stored record of slide `index` (no image stream attached).
+        """
+        offset, length, _ = self._slide_entry(index)
+        return self._json(offset, length)
+
+    def __iter__(self):
+        for index in range(self.n_slides):
+            yield self.slide(index)
+
+    def _image_entry(self, i):
+        if not 0 <= i < self.n_images:
+            raise ValueError("Corrupt deck snapshot")
+        return _IMAGE.unpack_from(self._buf, self._images_off + i * _IMAGE.size)
+
+    def image(self, sha256):
+        """
+        Returns the image with this sha256 (hex) as a new BytesIO, or None.
+        """
+        try:
+            key = bytes.fromhex(sha256 or "")
+        except ValueError:
+            return None
+        lo, hi = 0, self.n_images
+        while lo < hi:
+            mid = (lo + hi) // 2
+            digest, offset, length = self._image_entry(mid)
+            if digest < key:
+                lo = mid + 1
+            elif digest > key:
+                hi = mid
+            else:
+                return BytesIO(self._buf[offset:offset + length])
+        return None
+
+    def slide_image(self, index):
+        """
+        Returns slide `index`'s image as a BytesIO, or None if it has none.
+        """
+        _, _, image_index = self._slide_entry(index)
+        if image_index == NO_IMAGE:
+            return None
+        _, offset, length = self._image_entry(image_index)
+        if offset + length > len(self._buf):
+            raise ValueError("Truncated deck snapshot")
+        return BytesIO(self._buf[offset:offset + length])
+
+    def slides(self):
+        """
+        Yields slide dicts ready for the deck builder and previews, each with its
+        image as "actual_image_stream". A slide's stream is closed once the next
+        slide is requested, so only one image is in memory at a time.
+        """
+        for index in range(self.n_slides):
+            slide = self.slide(index)
+            stream = slide["actual_image_stream"] = self.slide_image(index)
+            yield slide
+            if stream is not None:
+                stream.close()
+
+    def records(self):
+        """
+        Returns all stored slide records (what the snapshot ID is computed from).
+        """
+        return list(self)
+
+    def verify(self):
+        """
+        Checks every image against its hash, every slide table entry against the
+        file and the image its record names, and the ID against the content;
+        raises ValueError on a mismatch.
+        """
+        for i in range(self.n_images):
+            digest, offset, length = self._image_entry(i)
+            if offset + length > len(self._buf) or hashlib.sha256(self._buf[offset:offset + length]).digest() != digest:
+                raise ValueError(f"Deck snapshot image {digest.hex()} is corrupt")
+        records = []
+        for index in range(self.n_slides):
+            offset, length, image_index = self._slide_entry(index)
+            record = self._json(offset, length)  # raises if the record lies outside the file
+            if image_index != NO_IMAGE and image_index >= self.n_images:
+                raise ValueError(f"Deck snapshot slide {index} points at a missing image")
+            digest = None if image_index == NO_IMAGE else self._image_entry(image_index)[0].hex()
+            if not isinstance(record, dict) or record.get("image_sha256") != digest:
+                raise ValueError(f"Deck snapshot slide {index} does not match its image")
+            records.append(record)
+        if artifact_key(records, self.topic, self.colors, self.fonts) != self.id:
+            raise ValueError("Deck snapshot content does not match its ID")
+
+
+def save_snapshot(slides, topic, colors=None, fonts=None, images=None, store=None):
+    """
+    Snapshots a freshly generated deck into the artifact store. Returns the
+    snapshot ID, or None when snapshots are off or could not be written (the
+    generation itself has succeeded and is returned either way).
+    """
+    if not get_deck_snapshots_enabled():
+        return None
+    store = store or get_artifact_store()
+    try:
+        return store.put_snapshot(lambda path: write_snapshot(path, slides, topic, colors, fonts, images))
+    except (OSError, TypeError, ValueError) as e:
+        log_event("snapshot_failed", level=logging.WARNING, topic=topic, error=str(e))
+        return None
+
+
+def import_snapshot(data, store=None):
+    """
+    Stores an uploaded snapshot after checking its images and ID. Returns the
+    ID; ValueError if the bytes are not a valid snapshot.
+    """
+    with DeckSnapshot(data) as snapshot:
+        snapshot.verify()
+        snapshot_id = snapshot.id
+
+    def write(path):
+        with open(path, "wb") as f:
+            f.write(data)
+        return snapshot_id
+
+    return (store or get_artifact_store()).put_snapshot(write)
+
+
+def open_snapshot(snapshot_id, store=None):
+    """
+    Returns a DeckSnapshot for a stored snapshot ID, or None if there is none.
+    """
+    path = (store or get_artifact_store()).get_snapshot(snapshot_id)
+    return DeckSnapshot(path) if path else None
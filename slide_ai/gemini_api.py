@@ -1,19 +1,34 @@
 """
 Handles Gemini (Google Generative AI) text generation for slides.
 """
-import google.generativeai as genai
+import asyncio
+import copy
 import json
+import logging
+import time
 
-def generate_slide_content(topic, num_slides, api_key, model_name="gemini-1.5-flash-latest"):
-    """
-    Generate slide content and design (colors, fonts, layouts) for a topic.
-    Returns a dict with keys: colors, fonts, slides.
-    """
-    genai.configure(api_key=api_key)
-    text_model = genai.GenerativeModel(model_name)
-    prompt = f"""
+import requests
+
+from slide_ai.async_http import get_async_client
+from slide_ai.config import get_gemini_api_base, get_payload_log_sample_rate
+from slide_ai.logs import log_event, preview
+from slide_ai.metrics import stage, record_upstream_error
+from slide_ai.singleflight import SingleFlight
+from slide_ai.admission import get_admission
+from slide_ai.cache import get_cache
+from slide_ai.gemini_routing import get_router, GEMINI_FALLBACKS, MAX_OUTPUT_TOKENS
+from slide_ai.topic_cache import get_topic_cache
+
+GEMINI_TIMEOUT = 120
+
+# Identical concurrent generations (same topic, size, model and key) share one call
+gemini_flight = SingleFlight("gemini")
+# Parsed generations shared by all workers; the response does not depend on the API key
+gemini_cache = get_cache("gemini")
+
+PROMPT_TEMPLATE = """
     You are an expert presentation designer and content strategist.
-    For a presentation on the topic: \"{topic}\", generate:
+    For a presentation on the topic: \"{topic}\" with {num_slides} content slides, generate:
     1. A color palette (background, accent, text colors as hex codes)
     2. Font families for headings and body (Google Fonts or web-safe)
     3. For each slide: title, 3-5 content_points, speaker_notes, unsplash_query, and a layout_type (e.g. 'image-left', 'image-bg', 'quote', etc.)
@@ -25,15 +40,205 @@ def generate_slide_content(topic, num_slides, api_key, model_name="gemini-1.5-fl
     }}
     Only return valid JSON, no explanation.
     """
-    response = text_model.generate_content(prompt)
-    cleaned = response.text.strip()
-    if cleaned.startswith("```json"): cleaned = cleaned[7:]
-    if cleaned.endswith("```"): cleaned = cleaned[:-3]
-    cleaned = cleaned.strip()
-    print("[Gemini API] Cleaned response for JSON parsing:", repr(cleaned))
+
+
+def _build_request(topic, num_slides, api_key, model_name, max_output_tokens=None):
+    """
+    Returns (url, headers, payload) for a generateContent REST call.
+    The key travels in the x-goog-api-key header so it never appears in a URL or an HTTP error message.
+    """
+    url = f"{get_gemini_api_base()}/models/{model_name}:generateContent"
+    payload = {"contents": [{"parts": [{"text": PROMPT_TEMPLATE.format(topic=topic, num_slides=num_slides)}]}]}
+    if max_output_tokens:
+        payload["generationConfig"] = {"maxOutputTokens": max_output_tokens}
+    return url, {"x-goog-api-key": api_key}, payload
+
+
+def _parse_response(response_data):
+    """
+    Extracts the model text from a generateContent response and parses it as slide JSON.
+    """
+    with stage("gemini_parse"):
+        try:
+            parts = response_data["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError, TypeError):
+            raise ValueError(f"Gemini API returned no content: {preview(repr(response_data))}")
+        cleaned = "".join(part.get("text", "") for part in parts).strip()
+        if cleaned.startswith("```json"): cleaned = cleaned[7:]
+        if cleaned.endswith("```"): cleaned = cleaned[:-3]
+        cleaned = cleaned.strip()
+        log_event("gemini_response", sample_rate=get_payload_log_sample_rate(),
+                  chars=len(cleaned), payload=preview(cleaned))
+        try:
+            slide_data = json.loads(cleaned)
+        except json.JSONDecodeError as e:
+            log_event("gemini_invalid_json", level=logging.WARNING, error=str(e), chars=len(cleaned), payload=preview(cleaned))
+            raise ValueError(f"Gemini API returned invalid JSON: {e}\nRaw response: {preview(cleaned)}")
+        return slide_data
+
+
+def _flight_key(topic, num_slides, api_key, model_name):
+    return (model_name, topic, int(num_slides), api_key)
+
+
+def _cache_key(topic, num_slides, model_name):
+    return (model_name or "auto", topic, int(num_slides))
+
+
+def _near_duplicate(topic, num_slides):
+    """
+    A deck generated earlier for a paraphrase of `topic`, or None.
+    """
+    topic_cache = get_topic_cache()
+    if topic_cache is None:
+        return None
+    try:
+        match = topic_cache.lookup(topic, num_slides)
+    except Exception as e:
+        log_event("topic_cache_error", level=logging.WARNING, error=str(e))
+        return None
+    if match is None:
+        return None
+    data, info = match
+    log_event("topic_cache_hit", topic=preview(topic, 200), matched=preview(info["topic"], 200),
+              similarity=round(info["similarity"], 3), cached_slides=info["num_slides"], num_slides=int(num_slides))
+    return data
+
+
+def _remember(topic, num_slides, model_name, data):
+    gemini_cache.set(_cache_key(topic, num_slides, model_name), data)
+    topic_cache = get_topic_cache()
+    if topic_cache is not None:
+        try:
+            topic_cache.add(topic, num_slides, data)
+        except Exception as e:
+            log_event("topic_cache_error", level=logging.WARNING, error=str(e))
+
+
+def _retriable(error):
+    # Timeouts, connection failures, 429 and 5xx are worth another attempt; bad requests are not
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.Timeout, requests.ConnectionError)) or type(error).__module__.startswith("httpx")
+
+
+def _truncated(response_data):
+    try:
+        return response_data["candidates"][0].get("finishReason") == "MAX_TOKENS"
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return False
+
+
+def _call_failed(attempts, retry, num_slides, started, error):
+    """
+    Records a failed call; returns True if the next attempt should be made.
+    """
+    attempt = attempts[retry]
+    get_router().record(attempt.model, num_slides, time.monotonic() - started, retry, error=error)
+    record_upstream_error("gemini", error)
+    if retry + 1 < len(attempts) and _retriable(error):
+        if attempts[retry + 1].model != attempt.model:
+            GEMINI_FALLBACKS.inc(model=attempt.model)
+        return True
+    return False
+
+
+def _call_succeeded(attempts, retry, num_slides, started, response_data):
+    """
+    Parses and records a completed call. Returns the slide data, or None if
+    the output hit the token budget and the next attempt (with the full
+    budget) should be made.
+    """
+    attempt = attempts[retry]
+    latency = time.monotonic() - started
+    usage = response_data.get("usageMetadata") if isinstance(response_data, dict) else None
     try:
-        slide_data = json.loads(cleaned)
-    except json.JSONDecodeError as e:
-        print("[Gemini API] JSONDecodeError:", str(e))
-        raise ValueError(f"Gemini API returned invalid JSON: {e}\nRaw response: {repr(cleaned)}")
-    return slide_data
+        data = _parse_response(response_data)
+    except ValueError as e:
+        outcome = "truncated" if _truncated(response_data) else "invalid"
+        get_router().record(attempt.model, num_slides, latency, retry, usage, error=e, outcome=outcome)
+        if outcome == "truncated" and retry + 1 < len(attempts):
+            attempts[retry + 1] = attempts[retry + 1]._replace(max_output_tokens=MAX_OUTPUT_TOKENS)
+            return None
+        raise
+    get_router().record(attempt.model, num_slides, latency, retry, usage)
+    return data
+
+
+def generate_slide_content(topic, num_slides, api_key, model_name=None):
+    """
+    Generate slide content and design (colors, fonts, layouts) for a topic.
+    Returns a dict with keys: colors, fonts, slides. With no model_name the
+    model, token budget and fallback are chosen by gemini_routing.
+    """
+    cached = gemini_cache.get(_cache_key(topic, num_slides, model_name)) or _near_duplicate(topic, num_slides)
+    if cached is not None:
+        return cached
+    data = gemini_flight.do(_flight_key(topic, num_slides, api_key, model_name),
+                            _generate, topic, num_slides, api_key, model_name)
+    # Callers fill slides in place, so each gets its own copy of the shared result
+    return copy.deepcopy(data)
+
+
+def _generate(topic, num_slides, api_key, model_name):
+    attempts = get_router().route(num_slides, model_name, GEMINI_TIMEOUT)
+    for retry in range(len(attempts)):
+        attempt = attempts[retry]
+        url, headers, payload = _build_request(topic, num_slides, api_key, attempt.model, attempt.max_output_tokens)
+        # Waits for a Gemini slot (raises Overloaded when the queue is full or times out)
+        with get_admission("gemini").acquire():
+            started = time.monotonic()
+            try:
+                with stage("gemini_call"):
+                    response = requests.post(url, headers=headers, json=payload, timeout=attempt.timeout)
+                    response.raise_for_status()
+                    response_data = response.json()
+            except Exception as e:
+                if _call_failed(attempts, retry, num_slides, started, e):
+                    continue
+                raise
+        data = _call_succeeded(attempts, retry, num_slides, started, response_data)
+        if data is not None:
+            _remember(topic, num_slides, model_name, data)
+            return data
+    raise ValueError("Gemini output exceeded the token budget on every attempt")
+
+
+async def agenerate_slide_content(topic, num_slides, api_key, model_name=None, client=None):
+    """
+    Async version of generate_slide_content; awaits the HTTP call instead of blocking the event loop.
+    """
+    cached = await gemini_cache.aget(_cache_key(topic, num_slides, model_name))
+    if cached is None:
+        cached = await asyncio.to_thread(_near_duplicate, topic, num_slides)
+    if cached is not None:
+        return cached
+    data = await gemini_flight.ado(_flight_key(topic, num_slides, api_key, model_name),
+                                   _agenerate, topic, num_slides, api_key, model_name, client)
+    return copy.deepcopy(data)
+
+
+async def _agenerate(topic, num_slides, api_key, model_name, client):
+    client = client or get_async_client()
+    # Routing and accounting read and write the SQLite call log, so they run on a thread
+    attempts = await asyncio.to_thread(get_router().route, num_slides, model_name, GEMINI_TIMEOUT)
+    for retry in range(len(attempts)):
+        attempt = attempts[retry]
+        url, headers, payload = _build_request(topic, num_slides, api_key, attempt.model, attempt.max_output_tokens)
+        async with get_admission("gemini").aacquire():
+            started = time.monotonic()
+            try:
+                with stage("gemini_call"):
+                    response = await client.post(url, headers=headers, json=payload, timeout=attempt.timeout)
+                    response.raise_for_status()
+                    response_data = response.json()
+            except Exception as e:
+                if await asyncio.to_thread(_call_failed, attempts, retry, num_slides, started, e):
+                    continue
+                raise
+        data = await asyncio.to_thread(_call_succeeded, attempts, retry, num_slides, started, response_data)
+        if data is not None:
+            await asyncio.to_thread(_remember, topic, num_slides, model_name, data)
+            return data
+    raise ValueError("Gemini output exceeded the token budget on every attempt")
@@ -0,0 +1,242 @@
+"""
+Gemini call accounting and model routing.
+
+Every generateContent attempt is recorded (model, tokens, latency, retry number,
+outcome) in a SQLite table for later analysis, and into rolling per-model stats
+that drive the routing policy: which model to call for a deck of a given size,
+with what output-token budget and timeout, and which faster model to fall back to.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+
+from slide_ai.config import (
+    get_gemini_models, get_gemini_slow_seconds, get_gemini_fast_max_slides, get_gemini_call_db,
+)
+from slide_ai.metrics import Counter
+
+# Output-token budget: per-slide estimate (raised by observed usage) plus the palette/fonts preamble
+DEFAULT_TOKENS_PER_SLIDE = 350
+PREAMBLE_TOKENS = 400
+BUDGET_MARGIN = 1.5
+MIN_OUTPUT_TOKENS = 1024
+MAX_OUTPUT_TOKENS = 8192
+# Rolling window per model used for routing decisions
+STATS_WINDOW = 50
+STATS_MAX_AGE = 15 * 60
+MIN_SAMPLES = 5
+MAX_ERROR_RATE = 0.5
+
+GEMINI_TOKENS = Counter("slide_ai_gemini_tokens", "Gemini tokens used.", ["model", "kind"])
+GEMINI_ATTEMPTS = Counter("slide_ai_gemini_attempts", "Gemini call attempts by outcome.", ["model", "outcome"])
+GEMINI_FALLBACKS = Counter("slide_ai_gemini_fallbacks", "Gemini calls retried on a fallback model.", ["model"])
+
+# One call attempt: model, timeout (seconds) and maxOutputTokens
+Attempt = namedtuple("Attempt", ["model", "timeout", "max_output_tokens"])
+
+
+class CallLog:
+    """
+    Append-only SQLite log of Gemini call attempts, shared by all worker processes.
+    Each thread keeps one connection open for its lifetime.
+    """
+    def __init__(self, path=None):
+        self.path = path or get_gemini_call_db()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS gemini_calls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, model TEXT NOT NULL,
+                    num_slides INTEGER, prompt_tokens INTEGER, output_tokens INTEGER,
+                    latency REAL NOT NULL, retry INTEGER NOT NULL, outcome TEXT NOT NULL, error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS gemini_calls_by_model ON gemini_calls (model, ts);
+            """)
+
+    def _connect(self):
+        # Used as `with conn:`, which commits but does not close
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+        return conn
+
+    def close(self):
+        """
+        Closes the calling thread's connection (others close when their thread exits).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    def record(self, row):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO gemini_calls (ts, model, num_slides, prompt_tokens, output_tokens, latency, retry, outcome, error)"
+                " VALUES (:ts, :model, :num_slides, :prompt_tokens, :output_tokens, :latency, :retry, :outcome, :error)",
+                row,
+            )
+
+    def recent(self, model, limit=STATS_WINDOW):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT ts, latency, outcome, num_slides, output_tokens FROM gemini_calls"
+                " WHERE model = ? ORDER BY ts DESC LIMIT ?",
+                (model, limit),
+            ).fetchall()
+        return rows[::-1]
+
+
+class ModelStats:
+    """
+    Rolling window of recent attempts for one model.
+    """
+    def __init__(self, rows=()):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=STATS_WINDOW)  # (ts, latency, ok, tokens_per_slide)
+        for ts, latency, outcome, num_slides, output_tokens in rows:
+            self.add(ts, latency, outcome == "ok", num_slides, output_tokens)
+
+    def add(self, ts, latency, ok, num_slides=None, output_tokens=None):
+        per_slide = output_tokens / num_slides if ok and output_tokens and num_slides else None
+        with self._lock:
+            self._samples.append((ts, latency, ok, per_slide))
+
+    def _recent(self):
+        cutoff = time.time() - STATS_MAX_AGE
+        with self._lock:
+            return [sample for sample in self._samples if sample[0] >= cutoff]
+
+    def summary(self):
+        samples = self._recent()
+        latencies = sorted(sample[1] for sample in samples if sample[2])
+        per_slide = sorted(sample[3] for sample in samples if sample[3])
+        return {
+            "samples": len(samples),
+            "error_rate": sum(not sample[2] for sample in samples) / len(samples) if samples else 0.0,
+            "p90_latency": _percentile(latencies, 0.9),
+            "p90_tokens_per_slide": _percentile(per_slide, 0.9),
+        }
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1)]
+
+
+class Router:
+    """
+    Routing policy. With no explicit model:
+    - small decks (num_slides <= SLIDE_AI_GEMINI_FAST_MAX_SLIDES, opt-in) go to the fast model;
+    - otherwise the primary model, unless its recent p90 latency exceeds
+      SLIDE_AI_GEMINI_SLOW_SECONDS or most recent attempts failed;
+    - the primary attempt is cut off at SLIDE_AI_GEMINI_SLOW_SECONDS and the
+      call falls back to the fast model with the full timeout.
+    """
+    def __init__(self, log=None):
+        self._log = log
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @property
+    def log(self):
+        if self._log is None:
+            try:
+                self._log = CallLog()
+            except (OSError, sqlite3.Error):
+                self._log = False  # accounting is best effort
+        return self._log or None
+
+    def stats(self, model):
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                # Seed from the shared log so a fresh worker starts with the fleet's history
+                rows = self.log.recent(model) if self.log else ()
+                stats = self._stats[model] = ModelStats(rows)
+            return stats
+
+    def healthy(self, model):
+        summary = self.stats(model).summary()
+        if summary["samples"] < MIN_SAMPLES:
+            return True
+        slow = summary["p90_latency"] is not None and summary["p90_latency"] > get_gemini_slow_seconds()
+        return not slow and summary["error_rate"] <= MAX_ERROR_RATE
+
+    def output_budget(self, model, num_slides):
+        observed = self.stats(model).summary()["p90_tokens_per_slide"] or 0
+        per_slide = max(DEFAULT_TOKENS_PER_SLIDE, observed)
+        budget = int((PREAMBLE_TOKENS + per_slide * num_slides) * BUDGET_MARGIN)
+        return min(MAX_OUTPUT_TOKENS, max(MIN_OUTPUT_TOKENS, budget))
+
+    def route(self, num_slides, model_name=None, timeout=120):
+        """
+        Returns the list of Attempts to make in order; later ones are retries.
+        """
+        num_slides = max(1, int(num_slides))
+        if model_name:
+            # Caller pinned a model: one retry on the same model
+            attempt = Attempt(model_name, timeout, self.output_budget(model_name, num_slides))
+            return [attempt, attempt]
+        primary, fast = get_gemini_models()
+        if primary == fast or num_slides <= get_gemini_fast_max_slides() or not self.healthy(primary):
+            attempt = Attempt(fast, timeout, self.output_budget(fast, num_slides))
+            return [attempt, attempt]
+        return [
+            Attempt(primary, min(timeout, get_gemini_slow_seconds()), self.output_budget(primary, num_slides)),
+            Attempt(fast, timeout, self.output_budget(fast, num_slides)),
+        ]
+
+    def record(self, model, num_slides, latency, retry, usage=None, error=None, outcome=None):
+        """
+        Records one attempt in the rolling stats, metrics and the persistent log.
+        Writes to SQLite, so async callers run it on a thread.
+        """
+        usage = usage or {}
+        prompt_tokens = usage.get("promptTokenCount")
+        output_tokens = usage.get("candidatesTokenCount")
+        outcome = outcome or ("ok" if error is None else "error")
+        now = time.time()
+        self.stats(model).add(now, latency, outcome == "ok", num_slides, output_tokens)
+        GEMINI_ATTEMPTS.inc(model=model, outcome=outcome)
+        if prompt_tokens:
+            GEMINI_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        if output_tokens:
+            GEMINI_TOKENS.inc(output_tokens, model=model, kind="output")
+        if self.log:
+            try:
+                self.log.record({
+                    "ts": now, "model": model, "num_slides": num_slides,
+                    "prompt_tokens": prompt_tokens, "output_tokens": output_tokens,
+                    "latency": latency, "retry": retry, "outcome": outcome,
+                    "error": error_summary(error) if error is not None else None,
+                })
+            except sqlite3.Error:
+                pass
+
+
+def error_summary(error):
+    """
+    Exception type plus HTTP status, e.g. "HTTPStatusError 429". Exception messages
+    are not stored: HTTP errors quote the request URL, which may carry credentials.
+    """
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return f"{type(error).__name__} {status_code}" if status_code else type(error).__name__
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = Router()
+        return _router
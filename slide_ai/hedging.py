@@ -0,0 +1,197 @@
+"""
+Hedged upstream calls: when a call has not answered by a latency percentile of
+recent calls of its kind, a second, identical attempt is started and whichever
+succeeds first is used. The other attempt is cancelled: an async attempt is
+cancelled outright (closing its connection); a thread attempt that has already
+started runs to completion in the background, and its result is discarded.
+
+Only the upstream request itself should be hedged. Callers take one admission
+slot around the whole hedged call, so the delay is learned from (and compared
+with) request latency alone. The slot is released when the call returns, so a
+thread attempt left running keeps its connection open outside the admission
+limit until it finishes or its request times out. The hedge budget bounds how
+many such attempts there are.
+
+A budget limits the extra load. Every call earns a fraction of a hedge
+(SLIDE_AI_UNSPLASH_HEDGE_BUDGET, 0.1 by default, so at most about one call in
+ten is duplicated), up to a small burst. A call that finds the budget empty
+just waits for its first attempt.
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, TimeoutError as FutureTimeout
+
+from slide_ai.config import (
+    get_unsplash_hedge_enabled, get_unsplash_hedge_percentile, get_unsplash_hedge_budget,
+    get_unsplash_hedge_max_delay,
+)
+from slide_ai.metrics import Counter, Gauge
+
+# Rolling window of attempt latencies the trigger percentile is taken from
+LATENCY_WINDOW = 200
+# Below this many samples the trigger is the maximum delay
+MIN_SAMPLES = 20
+# Hedging earlier than this only adds load: the duplicate could not beat the first attempt
+MIN_HEDGE_DELAY = 0.05
+# Hedges that can be spent at once after a quiet period
+BUDGET_BURST = 5
+
+HEDGE_EVENTS = Counter(
+    "slide_ai_hedge_events", "Hedged upstream calls: hedges started, won, and denied by the budget.",
+    ["operation", "event"],
+)
+HEDGE_DELAY = Gauge("slide_ai_hedge_delay_seconds", "Current delay before a call is hedged.", ["operation"])
+
+# Attempts of blocking calls run here so the caller can wait for whichever finishes first
+_attempt_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="slide-ai-attempt")
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1)]
+
+
+class HedgeBudget:
+    """
+    Token bucket: each call deposits `ratio` tokens (up to `burst`), each hedge takes one.
+    """
+    def __init__(self, ratio, burst=BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = float(burst)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class Hedger:
+    """
+    Hedges calls of one kind (e.g. "unsplash_search"), learning when to hedge
+    from the latencies of its own successful attempts.
+
+        search_hedger = Hedger("unsplash_search")
+        data = search_hedger.call(search_once, api_url, headers, params)
+
+    `ok(result)` decides whether a result counts as an answer (default: any
+    result that is not an exception); when neither attempt gives one, the
+    first attempt's outcome is returned or raised.
+    """
+    def __init__(self, operation, percentile=None, budget=None, max_delay=None):
+        self.operation = operation
+        self.percentile = get_unsplash_hedge_percentile() if percentile is None else percentile
+        self.max_delay = get_unsplash_hedge_max_delay() if max_delay is None else max_delay
+        self.budget = HedgeBudget(get_unsplash_hedge_budget() if budget is None else budget)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay(self):
+        """
+        Seconds to wait for the first attempt before hedging.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < MIN_SAMPLES:
+            delay = self.max_delay
+        else:
+            delay = min(self.max_delay, max(MIN_HEDGE_DELAY, _percentile(latencies, self.percentile)))
+        HEDGE_DELAY.set(delay, operation=self.operation)
+        return delay
+
+    def _hedge_allowed(self):
+        if self.budget.withdraw():
+            HEDGE_EVENTS.inc(operation=self.operation, event="hedged")
+            return True
+        HEDGE_EVENTS.inc(operation=self.operation, event="denied")
+        return False
+
+    def _timed(self, func, args, ok):
+        started = time.perf_counter()
+        result = func(*args)
+        if ok is None or ok(result):
+            self.observe(time.perf_counter() - started)
+        return result
+
+    def call(self, func, *args, ok=None):
+        """
+        Runs `func(*args)`, hedged. Attempts run on a thread pool and carry the
+        caller's context (admission priority).
+        """
+        if not get_unsplash_hedge_enabled():
+            return func(*args)
+        self.budget.deposit()
+        primary = _attempt_executor.submit(contextvars.copy_context().run, self._timed, func, args, ok)
+        try:
+            result = primary.result(timeout=self.delay())
+        except FutureTimeout:
+            pass
+        else:
+            return result
+        if not self._hedge_allowed():
+            return primary.result()
+        hedge = _attempt_executor.submit(contextvars.copy_context().run, self._timed, func, args, ok)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and (ok is None or ok(future.result())):
+                    for loser in pending:
+                        loser.cancel()  # only stops an attempt that has not started
+                    if future is hedge:
+                        HEDGE_EVENTS.inc(operation=self.operation, event="won")
+                    return future.result()
+        return primary.result()
+
+    async def acall(self, func, *args, ok=None):
+        """
+        Async version of call(); `func` is a coroutine function. The losing attempt is cancelled.
+        """
+        if not get_unsplash_hedge_enabled():
+            return await func(*args)
+        self.budget.deposit()
+        tasks = [asyncio.ensure_future(self._atimed(func, args, ok))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.delay())
+            if done or not self._hedge_allowed():
+                return await tasks[0]
+            tasks.append(asyncio.ensure_future(self._atimed(func, args, ok)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and (ok is None or ok(task.result())):
+                        if task is tasks[1]:
+                            HEDGE_EVENTS.inc(operation=self.operation, event="won")
+                        return task.result()
+            return tasks[0].result()
+        finally:
+            # The loser, or every attempt if the caller itself was cancelled
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # retrieved, so a failed loser is not logged as never awaited
+
+    async def _atimed(self, func, args, ok):
+        started = time.perf_counter()
+        result = await func(*args)
+        if ok is None or ok(result):
+            self.observe(time.perf_counter() - started)
+        return result
@@ -0,0 +1,145 @@
+"""
+Framework-neutral HTTP helpers: content-encoding negotiation, compression and strong ETags.
+"""
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+from slide_ai.config import get_compression_min_bytes
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # dynamic responses: well below the slow 11 used for static assets
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "image/svg+xml", "text/")
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def _parse_accept_encoding(header):
+    accepted = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Returns the best encoding both sides support ("br" preferred, then "gzip"), or None.
+    """
+    accepted = _parse_accept_encoding(accept_encoding)
+    best, best_q = None, 0.0
+    for encoding in supported_encodings():
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type):
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+def should_compress(content_type, size, content_encoding=None, min_bytes=None):
+    if content_encoding or not is_compressible(content_type):
+        return False
+    return size >= (get_compression_min_bytes() if min_bytes is None else min_bytes)
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def strong_etag(value):
+    """
+    Quoted strong ETag for a content hash (used as is) or raw bytes (hashed).
+    """
+    if isinstance(value, (bytes, bytearray)):
+        value = hashlib.sha256(value).hexdigest()[:32]
+    return f'"{value}"'
+
+
+def encoded_etag(etag, encoding):
+    """
+    ETag for a compressed representation; different bytes need a different strong tag.
+    """
+    if not etag or not encoding:
+        return etag
+    weak, tag = (etag[:2], etag[2:]) if etag.startswith("W/") else ("", etag)
+    return f'{weak}"{tag.strip(chr(34))}-{encoding}"'
+
+
+def _etag_base(tag):
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for encoding in ("br", "gzip"):
+        if tag.endswith(f'-{encoding}"'):
+            return tag[:-len(encoding) - 2] + '"'
+    return tag
+
+
+def etag_matches(if_none_match, etag):
+    """
+    If-None-Match uses weak comparison: W/ prefixes are ignored, as are the
+    encoding suffixes added by encoded_etag(); "*" matches anything.
+    """
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return _etag_base(etag) in {_etag_base(tag) for tag in if_none_match.split(",")}
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_byte_range(header, size):
+    """
+    Parses a Range header for a resource of `size` bytes. Returns (start, end)
+    with `end` inclusive, or None to send the whole resource (no header, a
+    non-byte unit, or several ranges, which we do not serve as multipart).
+    Raises RangeNotSatisfiable when the range lies outside the resource.
+    """
+    if not header or not header.strip().lower().startswith("bytes="):
+        return None
+    spec = header.split("=", 1)[1].strip()
+    if "," in spec:
+        return None
+    first, _, last = spec.partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
@@ -0,0 +1,121 @@
+"""
+Shared image decoding for every place that turns uploaded or downloaded bytes
+into pixels (background removal, equation extraction, previews, thumbnails and
+deck building).
+
+Decoding goes straight to the scale the caller needs: JPEGs are decoded with
+draft mode (the decoder's 1/2, 1/4 or 1/8 DCT scaling, so a 24-megapixel photo
+never exists at full size), other formats are shrunk with `reduce` before the
+final resample. Images whose decoded size would exceed the pixel budget are
+rejected before any pixel data is read. Decode time and memory are exported as
+`slide_ai_image_decode_*` metrics, labelled by purpose.
+"""
+import logging
+import time
+from io import BytesIO
+
+from slide_ai.config import get_image_max_pixels
+from slide_ai.logs import log_event
+from slide_ai.metrics import Counter, Histogram, stage
+
+IMAGE_DECODE_SECONDS = Histogram(
+    "slide_ai_image_decode_seconds", "Image decode (and downscale) time.", ["purpose"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+IMAGE_DECODE_BYTES = Histogram(
+    "slide_ai_image_decode_bytes", "Peak pixel memory of an image decode.", ["purpose"],
+    buckets=(2 ** 18, 2 ** 20, 2 ** 22, 2 ** 24, 2 ** 26, 2 ** 28, 2 ** 30),
+)
+IMAGE_DECODE_REJECTED = Counter(
+    "slide_ai_image_decode_rejected", "Images rejected for exceeding the pixel budget.", ["purpose"],
+)
+
+
+class ImageTooLarge(ValueError):
+    """
+    The image would decode to more pixels than the budget allows. `size` is
+    None when Pillow refused the image before its size was known.
+    """
+    def __init__(self, size, max_pixels):
+        self.size = size
+        self.max_pixels = max_pixels
+        dimensions = f"{size[0]}x{size[1]} pixels" if size else "too large to decode"
+        super().__init__(f"Image is {dimensions}; the limit is {max_pixels:,} pixels")
+
+
+def _pixel_bytes(img):
+    # Pillow stores multi-band pixels (RGB included) in 4 bytes
+    if len(img.getbands()) > 1 or img.mode in ("I", "F"):
+        return 4
+    return 2 if img.mode.startswith("I;16") else 1
+
+
+def _fit(size, max_size):
+    """
+    Size of `size` scaled down (never up) to fit in `max_size`, keeping aspect ratio.
+    """
+    width, height = size
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _rejected(purpose, size, max_pixels):
+    IMAGE_DECODE_REJECTED.inc(purpose=purpose)
+    width, height = size or (None, None)
+    log_event("image_rejected", level=logging.WARNING, purpose=purpose,
+              width=width, height=height, max_pixels=max_pixels)
+    raise ImageTooLarge(size, max_pixels)
+
+
+def decode_image(source, max_size=None, mode=None, purpose="image", max_pixels=None):
+    """
+    Decodes `source` (bytes, a file-like object or a path) into a loaded PIL image.
+
+    max_size: (width, height) box the result is shrunk to fit in, keeping aspect
+        ratio; None keeps the native size.
+    mode: convert to this mode (e.g. "RGB") if the image is in another one.
+    max_pixels: pixel budget (default SLIDE_AI_IMAGE_MAX_PIXELS), checked against
+        the size the decoder will actually produce; ImageTooLarge when exceeded.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    elif hasattr(source, "seek"):
+        source.seek(0)
+    from PIL import Image  # deferred so the servers can import this module without PIL
+
+    max_pixels = max_pixels or get_image_max_pixels()
+    started = time.perf_counter()
+    with stage("image_decode"):
+        try:
+            img = Image.open(source)  # reads the header only
+        except Image.DecompressionBombError:
+            # Pillow's own guard (far above our budget) trips before we see the size
+            _rejected(purpose, None, max_pixels)
+        native = img.size
+        target = _fit(native, max_size) if max_size else native
+        if img.format == "JPEG" and target != native:
+            # Decode at the smallest DCT scale still >= target
+            img.draft(mode if mode in ("RGB", "L") else None, target)
+        decoded = img.size
+        if decoded[0] * decoded[1] > max_pixels:
+            img.close()
+            _rejected(purpose, native, max_pixels)
+        img.load()
+        peak = decoded[0] * decoded[1] * _pixel_bytes(img)
+        if img.size != target:
+            if img.mode in ("P", "1"):
+                # Palette images would be resampled nearest-neighbour
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            factor = min(img.width // (2 * target[0]), img.height // (2 * target[1]))
+            if factor >= 2:
+                # Cheap box reduction to about twice the target, then a quality resample
+                img = img.reduce(factor)
+            img = img.resize(target, Image.LANCZOS)
+        if mode and img.mode != mode:
+            img = img.convert(mode)
+    elapsed = time.perf_counter() - started
+    IMAGE_DECODE_SECONDS.observe(elapsed, purpose=purpose)
+    IMAGE_DECODE_BYTES.observe(peak, purpose=purpose)
+    log_event("image_decoded", level=logging.DEBUG, purpose=purpose, native=native, decoded=decoded,
+              size=img.size, seconds=round(elapsed, 4), peak_bytes=peak)
+    return img
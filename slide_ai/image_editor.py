@@ -2,22 +2,23 @@
 Image editing utilities for Slide AI, e.g., rounded corners, resizing, etc.
 """
 from PIL import Image, ImageDraw
-import numpy as np
+from slide_ai.metrics import stage
 
 def add_rounded_corners(img: Image.Image, radius: int = 40) -> Image.Image:
     """
     Returns a copy of the image with rounded corners.
     """
-    # Ensure RGBA
-    img = img.convert("RGBA")
-    w, h = img.size
-    # Create rounded mask
-    mask = Image.new("L", (w, h), 0)
-    draw = ImageDraw.Draw(mask)
-    draw.rounded_rectangle([(0, 0), (w, h)], radius=radius, fill=255)
-    # Apply mask
-    img.putalpha(mask)
-    return img
+    with stage("image_round"):
+        # Ensure RGBA
+        img = img.convert("RGBA")
+        w, h = img.size
+        # Create rounded mask
+        mask = Image.new("L", (w, h), 0)
+        draw = ImageDraw.Draw(mask)
+        draw.rounded_rectangle([(0, 0), (w, h)], radius=radius, fill=255)
+        # Apply mask
+        img.putalpha(mask)
+        return img
 
 def pil_image_to_stream(img: Image.Image) -> bytes:
     """
@@ -25,6 +26,7 @@ def pil_image_to_stream(img: Image.Image) -> bytes:
     """
     from io import BytesIO
     output = BytesIO()
-    img.save(output, format="PNG")
+    with stage("image_encode"):
+        img.save(output, format="PNG")
     output.seek(0)
     return output
@@ -0,0 +1,301 @@
+"""
+Local image library: a folder of licensed images searchable through a prebuilt,
+memory-mapped inverted index of tags and keywords.
+
+Keywords come from each image's path (folder and file names) plus an optional
+`library.json` manifest in the library root:
+
+    {"nature/forest-01.jpg": {"tags": ["trees", "green"], "credit": "Jane Doe", "license": "CC0"}}
+
+Build (or rebuild) the index after changing the folder:
+
+    python -m slide_ai.image_library /srv/images
+"""
+import argparse
+import asyncio
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from slide_ai.config import get_image_library_dir, get_image_library_index
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+MANIFEST_NAME = "library.json"
+INDEX_MAGIC = b"SLIX"
+INDEX_VERSION = 1
+# magic, version, flags, term count, doc count, then offsets of the term table,
+# term strings, postings and doc table
+_HEADER = struct.Struct("<4sHHIIQQQQ")
+_TERM = struct.Struct("<IIII")  # string offset, string length, first posting, posting count
+_DOC = struct.Struct("<II")     # metadata offset, metadata length (JSON in the doc blob)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an and at by for from in of on or the to with img image photo dsc".split())
+
+
+def tokenize(text):
+    """
+    Lowercased index terms: words minus stopwords, plurals folded to the singular.
+    """
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in STOPWORDS or word.isdigit():
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def _image_size(path):
+    try:
+        from PIL import Image
+        with Image.open(path) as img:  # reads the header only
+            return img.size
+    except Exception:
+        return 0, 0
+
+
+def build_index(root=None, index_path=None):
+    """
+    Scans the library folder and writes its index atomically. Returns the number of images indexed.
+    """
+    root = os.path.abspath(root or get_image_library_dir())
+    index_path = index_path or get_image_library_index(root)
+    manifest = {}
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    docs, postings = [], {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            relpath = os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, "/")
+            info = manifest.get(relpath, {})
+            width, height = _image_size(os.path.join(dirpath, filename))
+            doc_id = len(docs)
+            docs.append({
+                "path": relpath, "width": width, "height": height,
+                "credit": info.get("credit"), "license": info.get("license"),
+            })
+            text = " ".join([os.path.splitext(relpath)[0].replace("/", " ")] + list(info.get("tags", [])))
+            for term in set(tokenize(text)):
+                postings.setdefault(term, []).append(doc_id)
+
+    terms = sorted(postings)
+    strings = b"".join(term.encode() for term in terms)
+    term_table, string_off, posting_off = bytearray(), 0, 0
+    for term in terms:
+        encoded = term.encode()
+        term_table += _TERM.pack(string_off, len(encoded), posting_off, len(postings[term]))
+        string_off += len(encoded)
+        posting_off += len(postings[term])
+    posting_blob = b"".join(struct.pack(f"<{len(postings[t])}I", *postings[t]) for t in terms)
+    doc_table, doc_blob = bytearray(), bytearray()
+    for doc in docs:
+        meta = json.dumps(doc, separators=(",", ":")).encode()
+        doc_table += _DOC.pack(len(doc_blob), len(meta))
+        doc_blob += meta
+
+    terms_off = _HEADER.size
+    strings_off = terms_off + len(term_table)
+    postings_off = strings_off + len(strings)
+    docs_off = postings_off + len(posting_blob)
+    header = _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, len(terms), len(docs),
+                          terms_off, strings_off, postings_off, docs_off)
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        for part in (header, term_table, strings, posting_blob, doc_table, doc_blob):
+            f.write(part)
+    os.replace(tmp_path, index_path)
+    return len(docs)
+
+
+class LibraryIndex:
+    """
+    Read-only view of an index file through mmap: opening it costs nothing and
+    the OS page cache shares it between worker processes. Term lookup is a
+    binary search over the fixed-width term table.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.n_terms, self.n_docs,
+         self._terms_off, self._strings_off, self._postings_off, self._docs_off) = _HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a version {INDEX_VERSION} image library index")
+        self._doc_blob_off = self._docs_off + self.n_docs * _DOC.size
+
+    def close(self):
+        self._mm.close()
+
+    def _term(self, i):
+        return _TERM.unpack_from(self._mm, self._terms_off + i * _TERM.size)
+
+    def postings(self, term):
+        """
+        Returns the doc IDs containing `term` (an already tokenized term).
+        """
+        key = term.encode()
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            string_off, length, first, count = self._term(mid)
+            start = self._strings_off + string_off
+            candidate = self._mm[start:start + length]
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                return struct.unpack_from(f"<{count}I", self._mm, self._postings_off + first * 4)
+        return ()
+
+    def doc(self, doc_id):
+        offset, length = _DOC.unpack_from(self._mm, self._docs_off + doc_id * _DOC.size)
+        start = self._doc_blob_off + offset
+        return json.loads(self._mm[start:start + length])
+
+    def search(self, query, limit=10, orientation=None):
+        """
+        Returns up to `limit` doc dicts ranked by summed IDF of the matched query
+        terms; among equally scored images, those matching `orientation` come first.
+        """
+        scores = {}
+        for term in set(tokenize(query)):
+            ids = self.postings(term)
+            if not ids:
+                continue
+            idf = math.log(1 + self.n_docs / len(ids))
+            for doc_id in ids:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf
+        if not scores:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if orientation:
+            # Only the top of the ranking needs its metadata decoded
+            head = [(score, self.doc(doc_id)) for doc_id, score in ranked[:limit * 4]]
+            head.sort(key=lambda item: (-item[0], not _matches_orientation(item[1], orientation)))
+            return [doc for _, doc in head[:limit]]
+        return [self.doc(doc_id) for doc_id, _ in ranked[:limit]]
+
+
+def _matches_orientation(doc, orientation):
+    width, height = doc.get("width") or 0, doc.get("height") or 0
+    if not width or not height:
+        return False
+    if orientation == "landscape":
+        return width > height
+    if orientation == "portrait":
+        return height > width
+    return orientation == "squarish" and 0.8 <= width / height <= 1.25
+
+
+class LocalLibraryProvider:
+    """
+    Image provider over a local library folder. Candidates use the same fields
+    as Unsplash ones; their image_url is a library: URL resolved under the root.
+    """
+    name = "library"
+    URL_PREFIX = "library:"
+
+    def __init__(self, root=None, index_path=None):
+        self.root = os.path.realpath(root or get_image_library_dir())
+        self.index_path = index_path or get_image_library_index(self.root)
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                if not os.path.exists(self.index_path):
+                    build_index(self.root, self.index_path)
+                self._index = LibraryIndex(self.index_path)
+            return self._index
+
+    def _candidate(self, doc):
+        return {
+            "id": doc["path"],
+            "image_url": self.URL_PREFIX + doc["path"],
+            "thumb_url": None,
+            "photographer_name": None,
+            "photographer_url_with_utm": None,
+            "credit": doc.get("credit"),
+            "license": doc.get("license"),
+            "provider": self.name,
+        }
+
+    def search(self, query, orientation="landscape", limit=10):
+        if not query:
+            return [], "No query provided for the image library."
+        docs = self.index.search(query, limit=limit, orientation=orientation)
+        if not docs:
+            return [], f"No library image found for '{query}'."
+        return [self._candidate(doc) for doc in docs], None
+
+    async def asearch(self, query, orientation="landscape", limit=10):
+        # Index lookups take microseconds; no need to leave the event loop
+        return self.search(query, orientation, limit)
+
+    def path_for(self, image_url):
+        """
+        Resolves a library: URL to a file path inside the root, or None.
+        """
+        if not image_url or not image_url.startswith(self.URL_PREFIX):
+            return None
+        path = os.path.realpath(os.path.join(self.root, image_url[len(self.URL_PREFIX):]))
+        if os.path.commonpath([path, self.root]) != self.root or not os.path.isfile(path):
+            return None
+        return path
+
+    def fetch(self, candidate, placement=None):
+        path = self.path_for(candidate.get("image_url"))
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return BytesIO(f.read())
+
+    async def afetch(self, candidate, placement=None):
+        # The library may be on a network mount; read it off the event loop
+        return await asyncio.to_thread(self.fetch, candidate, placement)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the local image library index")
+    parser.add_argument("root", nargs="?", help="library folder (default: SLIDE_AI_IMAGE_LIBRARY)")
+    parser.add_argument("--index", help="index file (default: SLIDE_AI_IMAGE_LIBRARY_INDEX, else in the artifact dir)")
+    parser.add_argument("--query", help="run a query against the index after building it")
+    args = parser.parse_args(argv)
+    root = args.root or get_image_library_dir()
+    if not root:
+        parser.error("no library folder given and SLIDE_AI_IMAGE_LIBRARY is not set")
+    start = time.perf_counter()
+    count = build_index(root, args.index)
+    print(f"Indexed {count} images in {time.perf_counter() - start:.2f}s")
+    if args.query:
+        provider = LocalLibraryProvider(root, args.index)
+        start = time.perf_counter()
+        candidates, error = provider.search(args.query)
+        elapsed = (time.perf_counter() - start) * 1e6
+        print(error or "\n".join(candidate["id"] for candidate in candidates))
+        print(f"Query took {elapsed:.0f}us")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Image providers for slides: Unsplash and the local image library, combined
+according to SLIDE_AI_IMAGE_LIBRARY_MODE (primary, fallback or hedge).
+
+A provider has search(query, orientation) -> (candidates, error_msg) and
+fetch(candidate, placement) -> BytesIO or None, plus async asearch/afetch.
+Candidates are dicts with id, image_url, thumb_url, photographer_name,
+photographer_url_with_utm and provider.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from slide_ai.config import get_image_library_dir, get_image_library_mode, get_image_hedge_delay
+from slide_ai.logs import log_event
+from slide_ai.metrics import Counter
+from slide_ai.unsplash_api import (
+    search_unsplash_candidates, asearch_unsplash_candidates,
+    download_image_to_stream, adownload_image_to_stream,
+)
+
+IMAGE_PROVIDER_SERVED = Counter("slide_ai_image_provider_served", "Slide images served, by provider.", ["provider"])
+IMAGE_PROVIDER_ERRORS = Counter("slide_ai_image_provider_errors", "Image provider searches or fetches that raised.", ["provider"])
+
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="slide-ai-hedge")
+# Abandoned hedge tasks keep running (their results warm the caches); hold references until done
+_background_tasks = set()
+
+
+class UnsplashProvider:
+    name = "unsplash"
+
+    def __init__(self, access_key, app_name_for_utm="SlideAI"):
+        self.access_key = access_key
+        self.app_name_for_utm = app_name_for_utm
+
+    def _tag(self, result):
+        candidates, error = result
+        # Copies: the candidate list may be shared with other callers
+        return [dict(candidate, provider=self.name) for candidate in candidates], error
+
+    def search(self, query, orientation="landscape"):
+        return self._tag(search_unsplash_candidates(query, self.access_key, orientation, self.app_name_for_utm))
+
+    async def asearch(self, query, orientation="landscape"):
+        return self._tag(await asearch_unsplash_candidates(query, self.access_key, orientation, self.app_name_for_utm))
+
+    def fetch(self, candidate, placement=None):
+        return download_image_to_stream(candidate["image_url"], placement)
+
+    async def afetch(self, candidate, placement=None):
+        return await adownload_image_to_stream(candidate["image_url"], placement=placement)
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_library():
+    """
+    Returns the process-wide local library provider, or None if SLIDE_AI_IMAGE_LIBRARY is unset.
+    """
+    global _library
+    root = get_image_library_dir()
+    if not root:
+        return None
+    with _library_lock:
+        if _library is None:
+            from slide_ai.image_library import LocalLibraryProvider
+            _library = LocalLibraryProvider(root)
+        return _library
+
+
+def _failed(provider, error):
+    # A broken library (missing or corrupt index, unreadable file) must not fail the deck
+    IMAGE_PROVIDER_ERRORS.inc(provider=provider.name)
+    log_event("image_provider_error", level=logging.WARNING, provider=provider.name, error=str(error))
+    return None, None, str(error)
+
+
+def _find(provider, query, placement, orientation):
+    try:
+        candidates, error = provider.search(query, orientation)
+        if not candidates:
+            return None, None, error
+        return candidates[0], provider.fetch(candidates[0], placement), None
+    except (OSError, ValueError) as e:
+        return _failed(provider, e)
+
+
+async def _afind(provider, query, placement, orientation):
+    try:
+        candidates, error = await provider.asearch(query, orientation)
+        if not candidates:
+            return None, None, error
+        return candidates[0], await provider.afetch(candidates[0], placement), None
+    except (OSError, ValueError) as e:
+        return _failed(provider, e)
+
+
+def _served(result):
+    if result[1] is not None:
+        IMAGE_PROVIDER_SERVED.inc(provider=result[0]["provider"])
+    return result
+
+
+def _providers(unsplash_key, mode):
+    unsplash = UnsplashProvider(unsplash_key)
+    library = get_library() if mode != "off" else None
+    if library is None:
+        return [unsplash]
+    return [library, unsplash] if mode == "primary" else [unsplash, library]
+
+
+def _first_success(results):
+    # The first result with an image, else the first with a candidate, else the first error
+    for result in results:
+        if result[1] is not None:
+            return result
+    return next((result for result in results if result[0] is not None), results[0])
+
+
+def find_image(query, unsplash_key, placement=None, orientation="landscape"):
+    """
+    Finds and downloads an image for a slide. Returns (candidate, image_stream,
+    error_msg); candidate is None when nothing matched, image_stream is None when
+    nothing could be downloaded.
+    """
+    mode = get_image_library_mode()
+    providers = _providers(unsplash_key, mode)
+    if mode == "hedge" and len(providers) == 2:
+        return _served(_hedged_find(providers[0], providers[1], query, placement, orientation))
+    results = []
+    for provider in providers:
+        results.append(_find(provider, query, placement, orientation))
+        if results[-1][1] is not None:
+            break
+    return _served(_first_success(results))
+
+
+def _hedged_find(unsplash, library, query, placement, orientation):
+    # Unsplash first; if it has not produced an image within the hedge delay, the
+    # library (microseconds) answers instead. Copy the context so the admission
+    # priority carries over to the worker thread.
+    context = contextvars.copy_context()
+    future = _hedge_executor.submit(context.run, _find, unsplash, query, placement, orientation)
+    try:
+        result = future.result(timeout=get_image_hedge_delay())
+        if result[1] is not None:
+            return result
+    except FutureTimeout:
+        result = None
+    local = _find(library, query, placement, orientation)
+    if local[1] is not None:
+        return local
+    return _first_success([result or future.result(), local])
+
+
+async def afind_image(query, unsplash_key, placement=None, orientation="landscape"):
+    """
+    Async version of find_image.
+    """
+    mode = get_image_library_mode()
+    providers = _providers(unsplash_key, mode)
+    if mode == "hedge" and len(providers) == 2:
+        return _served(await _ahedged_find(providers[0], providers[1], query, placement, orientation))
+    results = []
+    for provider in providers:
+        results.append(await _afind(provider, query, placement, orientation))
+        if results[-1][1] is not None:
+            break
+    return _served(_first_success(results))
+
+
+async def _ahedged_find(unsplash, library, query, placement, orientation):
+    task = asyncio.ensure_future(_afind(unsplash, query, placement, orientation))
+    done, _ = await asyncio.wait({task}, timeout=get_image_hedge_delay())
+    if done and task.result()[1] is not None:
+        return task.result()
+    local = await _afind(library, query, placement, orientation)
+    if local[1] is not None:
+        if not done:
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        return local
+    return _first_success([await task, local])
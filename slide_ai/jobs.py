@@ -0,0 +1,359 @@
+"""
+Background deck generation jobs with persisted progress events, partial results and cancellation.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from slide_ai.admission import priority, BATCH, Overloaded
+from slide_ai.async_http import close_async_client
+from slide_ai.config import get_job_db_path, get_job_workers, get_job_retention
+from slide_ai.gemini_api import agenerate_slide_content
+from slide_ai.pipeline import aattach_slide_preview
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED, INTERRUPTED = (
+    "queued", "running", "succeeded", "failed", "cancelled", "interrupted",
+)
+TERMINAL_STATES = {SUCCEEDED, FAILED, CANCELLED, INTERRUPTED}
+# A running job whose worker has not written anything for this long is reported
+# as interrupted (its process was restarted or died); longer than any single stage
+STALE_AFTER = 300
+SLIDE_CONCURRENCY = 4
+# Background jobs wait out admission rejections this many times before failing
+OVERLOAD_RETRIES = 5
+# How often a running job checks the store for a cancellation made in another process
+CANCEL_POLL_INTERVAL = 0.5
+# Finished and abandoned jobs older than the retention are deleted at most this often
+PRUNE_INTERVAL = 600
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    """
+    SQLite-backed job state shared by every worker process using the same file,
+    so status, events and partial slides survive a worker restart.
+    """
+    def __init__(self, path=None):
+        self.path = path or get_job_db_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL,
+                    colors TEXT, fonts TEXT, num_slides INTEGER, error TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL, updated REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_by_updated ON jobs (updated);
+                CREATE TABLE IF NOT EXISTS job_events (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL,
+                    data TEXT NOT NULL, ts REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS job_events_by_job ON job_events (job_id, seq);
+                CREATE TABLE IF NOT EXISTS job_slides (
+                    job_id TEXT NOT NULL, idx INTEGER NOT NULL, data TEXT NOT NULL,
+                    PRIMARY KEY (job_id, idx)
+                );
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, request_data):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, request, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(request_data), now, now),
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        for key in ("colors", "fonts"):
+            if key in fields:
+                fields[key] = json.dumps(fields[key])
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def add_event(self, job_id, **data):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT INTO job_events (job_id, data, ts) VALUES (?, ?, ?)", (job_id, json.dumps(data), now))
+            conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (now, job_id))
+
+    def events(self, job_id, after=0):
+        """
+        Returns [(seq, event_dict), ...] newer than `after`.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, data, ts FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+            ).fetchall()
+        return [(seq, dict(json.loads(data), ts=ts)) for seq, data, ts in rows]
+
+    def save_slide(self, job_id, idx, slide):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_slides (job_id, idx, data) VALUES (?, ?, ?)",
+                (job_id, idx, json.dumps(slide)),
+            )
+
+    def get(self, job_id):
+        """
+        Returns the job summary dict, or None for an unknown ID.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status, error, cancel_requested, num_slides, created, updated FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            done = conn.execute("SELECT COUNT(*) FROM job_slides WHERE job_id = ?", (job_id,)).fetchone()[0]
+        status, error, cancel_requested, num_slides, created, updated = row
+        if status in (QUEUED, RUNNING) and time.time() - updated > STALE_AFTER:
+            status = INTERRUPTED
+        return {
+            "job_id": job_id, "status": status, "error": error,
+            "cancel_requested": bool(cancel_requested),
+            "slides_total": num_slides, "slides_done": done,
+            "created": created, "updated": updated,
+        }
+
+    def result(self, job_id):
+        """
+        Returns whatever has been produced so far: colors, fonts and the finished
+        slides (None for slides still in progress).
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._connect() as conn:
+            colors, fonts = conn.execute("SELECT colors, fonts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            rows = conn.execute("SELECT idx, data FROM job_slides WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+        slides = [None] * (job["slides_total"] or 0)
+        for idx, data in rows:
+            slides[idx] = json.loads(data)
+        return {
+            "job_id": job_id, "status": job["status"], "complete": job["status"] == SUCCEEDED,
+            "colors": json.loads(colors) if colors else None,
+            "fonts": json.loads(fonts) if fonts else None,
+            "slides": slides,
+        }
+
+    def request_cancel(self, job_id):
+        with self._connect() as conn:
+            cur = conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        return cur.rowcount > 0
+
+    def prune(self, max_age=None):
+        """
+        Deletes jobs (with their events and slides) not updated for `max_age`
+        seconds (SLIDE_AI_JOB_RETENTION). Returns the number of jobs deleted.
+        """
+        cutoff = time.time() - (get_job_retention() if max_age is None else max_age)
+        with self._connect() as conn:
+            ids = [(row[0],) for row in conn.execute("SELECT id FROM jobs WHERE updated < ?", (cutoff,))]
+            conn.executemany("DELETE FROM job_events WHERE job_id = ?", ids)
+            conn.executemany("DELETE FROM job_slides WHERE job_id = ?", ids)
+            conn.executemany("DELETE FROM jobs WHERE id = ?", ids)
+        return len(ids)
+
+    def cancel_requested(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+
+class JobRunner:
+    """
+    Runs generation jobs on a thread pool in this process, each job on its own
+    event loop with the async Gemini and Unsplash clients, and records every
+    stage in the JobStore. Cancellation can be requested from any worker: it
+    cancels the job's task, which aborts the in-flight Gemini call and image
+    searches and downloads; slides that have not started are never fetched.
+    """
+    def __init__(self, store=None, max_workers=None):
+        self.store = store or JobStore()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or get_job_workers(), thread_name_prefix="slide-ai-job")
+        self._tasks = {}  # job_id -> (loop, task) of jobs running in this process
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def submit(self, topic, num_slides, gemini_key, unsplash_key):
+        if time.time() - self._last_prune > PRUNE_INTERVAL:
+            self._last_prune = time.time()
+            self.store.prune()
+        job_id = self.store.create({"topic": topic, "num_slides": num_slides})
+        self.executor.submit(self._run, job_id, topic, num_slides, gemini_key, unsplash_key)
+        return job_id
+
+    def cancel(self, job_id):
+        """
+        Requests cancellation. Returns False for an unknown job.
+        """
+        if not self.store.request_cancel(job_id):
+            return False
+        with self._lock:
+            running = self._tasks.get(job_id)
+        if running is not None:
+            loop, task = running
+            loop.call_soon_threadsafe(task.cancel)
+        # A job running in another process sees the flag through its watcher
+        return True
+
+    def _run(self, job_id, topic, num_slides, gemini_key, unsplash_key):
+        asyncio.run(self._arun(job_id, topic, num_slides, gemini_key, unsplash_key))
+
+    async def _arun(self, job_id, topic, num_slides, gemini_key, unsplash_key):
+        store = self.store
+        with self._lock:
+            self._tasks[job_id] = (asyncio.get_running_loop(), asyncio.current_task())
+        watcher = asyncio.ensure_future(self._watch_cancel(job_id, asyncio.current_task()))
+        try:
+            # Jobs queue behind interactive requests; child tasks inherit the priority
+            with priority(BATCH):
+                if store.cancel_requested(job_id):
+                    raise JobCancelled()
+                store.update(job_id, status=RUNNING)
+                store.add_event(job_id, stage="gemini", state="started")
+                data = await self._generate(job_id, topic, num_slides, gemini_key)
+                slides = [slide for slide in data.get("slides", []) if isinstance(slide, dict)]
+                store.update(job_id, colors=data.get("colors"), fonts=data.get("fonts"), num_slides=len(slides))
+                store.add_event(job_id, stage="gemini", state="done", slides=len(slides))
+                await self._run_slides(job_id, slides, unsplash_key, data.get("colors"))
+            store.update(job_id, status=SUCCEEDED)
+            store.add_event(job_id, stage="job", state="done")
+        except (JobCancelled, asyncio.CancelledError):
+            store.update(job_id, status=CANCELLED)
+            store.add_event(job_id, stage="job", state="cancelled")
+        except Exception as e:
+            store.update(job_id, status=FAILED, error=str(e))
+            store.add_event(job_id, stage="job", state="failed", error=str(e))
+        finally:
+            watcher.cancel()
+            with self._lock:
+                self._tasks.pop(job_id, None)
+            await close_async_client()  # the client belongs to this job's loop
+
+    async def _watch_cancel(self, job_id, task):
+        # Cancellation requested through another process only shows up in the store
+        while not await asyncio.to_thread(self.store.cancel_requested, job_id):
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+        task.cancel()
+
+    async def _generate(self, job_id, topic, num_slides, gemini_key):
+        # Background jobs retry when admission control rejects them
+        for attempt in range(OVERLOAD_RETRIES + 1):
+            try:
+                return await agenerate_slide_content(topic, num_slides, gemini_key)
+            except Overloaded as e:
+                if attempt == OVERLOAD_RETRIES:
+                    raise
+                self.store.add_event(job_id, stage="gemini", state="waiting", retry_after=e.retry_after)
+                await asyncio.sleep(e.retry_after)
+
+    async def _run_slides(self, job_id, slides, unsplash_key, colors):
+        semaphore = asyncio.Semaphore(SLIDE_CONCURRENCY)
+
+        async def run_slide(idx, slide):
+            async with semaphore:
+                self.store.add_event(job_id, stage="image", state="started", slide=idx)
+                await aattach_slide_preview(slide, unsplash_key, colors=colors)
+                self.store.save_slide(job_id, idx, slide)
+                self.store.add_event(job_id, stage="image", state="done", slide=idx,
+                                     error=slide.get("image_fetch_error"))
+
+        # Cancelling the job cancels gather, and with it every slide still searching or downloading
+        await asyncio.gather(*(run_slide(idx, slide) for idx, slide in enumerate(slides)))
+
+
+def parse_last_event_id(value, default=0):
+    """
+    Returns the SSE Last-Event-ID as an int; anything malformed means "from the start".
+    """
+    try:
+        return max(0, int(value)) if value not in (None, "") else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _sse_frames(store, job_id, last_seq):
+    """
+    Returns (frames, last_seq, finished) for one poll of the job's event log.
+    """
+    frames = []
+    for seq, event in store.events(job_id, after=last_seq):
+        last_seq = seq
+        frames.append(f"id: {seq}\nevent: {event.get('stage', 'message')}\ndata: {json.dumps(event)}\n\n")
+    job = store.get(job_id)
+    finished = job is None or job["status"] in TERMINAL_STATES
+    if finished:
+        status = job["status"] if job else "unknown"
+        frames.append(f"event: end\ndata: {json.dumps({'status': status})}\n\n")
+    return frames, last_seq, finished
+
+
+def iter_sse(store, job_id, last_event_id=0, poll_interval=0.5, keepalive=15):
+    """
+    Yields Server-Sent Events frames for a job until it reaches a terminal state.
+    Resumes after `last_event_id` so reconnecting clients do not miss events.
+    """
+    last_seq, last_sent = last_event_id, time.time()
+    while True:
+        frames, last_seq, finished = _sse_frames(store, job_id, last_seq)
+        if frames:
+            last_sent = time.time()
+            yield from frames
+        if finished:
+            return
+        if time.time() - last_sent > keepalive:
+            last_sent = time.time()
+            yield ": keepalive\n\n"
+        time.sleep(poll_interval)
+
+
+async def aiter_sse(store, job_id, last_event_id=0, poll_interval=0.5, keepalive=15):
+    """
+    Async version of iter_sse for ASGI streaming responses.
+    """
+    last_seq, last_sent = last_event_id, time.time()
+    while True:
+        frames, last_seq, finished = await asyncio.to_thread(_sse_frames, store, job_id, last_seq)
+        if frames:
+            last_sent = time.time()
+            for frame in frames:
+                yield frame
+        if finished:
+            return
+        if time.time() - last_sent > keepalive:
+            last_sent = time.time()
+            yield ": keepalive\n\n"
+        await asyncio.sleep(poll_interval)
+
+
+_default_runner = None
+_default_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """
+    Returns the process-wide JobRunner backed by the configured job database.
+    """
+    global _default_runner
+    with _default_runner_lock:
+        if _default_runner is None:
+            _default_runner = JobRunner()
+        return _default_runner
@@ -1,7 +1,33 @@
 """
 Defines slide layout options, alignments, background colors, and more for Slide AI.
 """
-from pptx.dml.color import RGBColor
+# Shared slide geometry (inches). Both the .pptx builder and the thumbnail
+# renderer read these so previews match the exported deck.
+SLIDE_WIDTH_IN = 13.333
+SLIDE_HEIGHT_IN = 7.5
+TITLE_BOX_IN = (0.5, 0.4, 12.333, 1.2)   # left, top, width, height
+BODY_BOX_IN = (0.5, 1.9, 6.2, 5.0)       # left, top, width, height
+IMAGE_BOX_IN = (7.0, 2.0, 5.5)           # left, top, width (height follows aspect)
+TITLE_FONT_PT = 32
+TITLE_SLIDE_FONT_PT = 48                 # opening and closing slides
+BODY_FONT_PT = 18
+ATTRIBUTION_FONT_PT = 8
+# Pixel densities images are fetched and embedded at: the exported deck (anything
+# above this is never shown) and the in-browser editor preview
+EXPORT_DPI = 200
+PREVIEW_DPI = 120
+# Thumbnail widths (pixels) the endpoints accept; the canvas grows with the square of the width
+MIN_THUMBNAIL_WIDTH = 16
+MAX_THUMBNAIL_WIDTH = 1280
+
+def image_attribution(slide_data):
+    """
+    Credit line shown under a slide's bullets: Unsplash's required wording, or the
+    library image's credit.
+    """
+    if slide_data.get("unsplash_photographer_name"):
+        return f"Photo by {slide_data['unsplash_photographer_name']} on Unsplash"
+    return slide_data.get("image_credit")
 
 # Example layout options
 def get_layout_options():
@@ -26,6 +52,8 @@ def apply_background_color(slide, rgb_tuple):
     """
     Sets the background color of a slide.
     """
+    from pptx.dml.color import RGBColor  # keeps the geometry constants importable without python-pptx
+
     fill = slide.background.fill
     fill.solid()
     fill.fore_color.rgb = RGBColor(*rgb_tuple)
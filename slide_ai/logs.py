@@ -0,0 +1,33 @@
+"""
+Structured (one JSON object per line) logging with sampling for verbose payload logs.
+"""
+import json
+import logging
+import random
+
+logger = logging.getLogger("slide_ai")
+
+PAYLOAD_PREVIEW_CHARS = 500
+
+
+def log_event(event, level=logging.INFO, sample_rate=1.0, **fields):
+    """
+    Logs `event` with `fields` as a JSON line. With sample_rate < 1 only that
+    fraction of calls is logged; the rate is included so counts can be scaled back up.
+    """
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+    if not logger.isEnabledFor(level):
+        return
+    record = {"event": event, **fields}
+    if sample_rate < 1.0:
+        record["sample_rate"] = sample_rate
+    logger.log(level, json.dumps(record, default=str))
+
+
+def preview(text, limit=PAYLOAD_PREVIEW_CHARS):
+    """
+    Truncates a payload for logging.
+    """
+    text = str(text)
+    return text if len(text) <= limit else text[:limit] + f"...[{len(text) - limit} more chars]"
@@ -4,8 +4,9 @@ Main entry point for Slide AI presentation generator.
 
 from slide_ai.config import get_gemini_api_key, get_unsplash_access_key
 from slide_ai.gemini_api import generate_slide_content
-from slide_ai.unsplash_api import fetch_unsplash_image, download_image_to_stream
-from slide_ai.pptx_builder import create_pptx_with_unsplash
+from slide_ai.image_providers import find_image
+from slide_ai.pipeline import apply_image_candidate
+from slide_ai.pptx_builder import build_deck_streaming
 
 
 def main():
@@ -20,27 +21,27 @@ def main():
         return
 
     print("\nGenerating slide content...")
-    
-    slides = generate_slide_content(topic, num_slides, gemini_key)
-    slide_deck_with_images = []
-    print(f"Fetching Unsplash images for {len(slides)} slides...")
-    for slide in slides:
-        unsplash_query = slide.get("unsplash_query")
-        image_url, photographer, photographer_url, error_msg = fetch_unsplash_image(unsplash_query, unsplash_key)
-        slide["unsplash_image_url"] = image_url
-        slide["unsplash_photographer_name"] = photographer
-        slide["unsplash_photographer_url_with_utm"] = photographer_url
-        slide["image_fetch_error"] = error_msg
-        slide["actual_image_stream"] = None
-        if image_url:
-            image_stream = download_image_to_stream(image_url)
-            if image_stream:
-                slide["actual_image_stream"] = image_stream
-        slide_deck_with_images.append(slide)
-
-    print("\nCreating PowerPoint file...")
-    pptx_file = create_pptx_with_unsplash(slide_deck_with_images, topic)
+    pptx_file = generate_deck(topic, num_slides, gemini_key, unsplash_key)
     print(f"\n🎉 Presentation saved as {pptx_file}")
 
+
+def generate_deck(topic, num_slides, gemini_key, unsplash_key, filename=None):
+    """
+    Runs the full pipeline (Gemini, Unsplash, streaming build) and returns the saved filename.
+    """
+    data = generate_slide_content(topic, num_slides, gemini_key)
+    slides = data["slides"]
+
+    def acquire_image(slide):
+        # Called by the builder for one slide at a time, right before insertion,
+        # so only a single downloaded image is held in memory at once.
+        candidate, image_stream, error_msg = find_image(slide.get("unsplash_query"), unsplash_key, "export")
+        apply_image_candidate(slide, candidate, error_msg)
+        return image_stream
+
+    print(f"Fetching Unsplash images and building {len(slides)} slides...")
+    return build_deck_streaming(slides, topic, acquire_image, filename=filename,
+                                colors=data.get("colors"), fonts=data.get("fonts"))
+
 if __name__ == "__main__":
     main()
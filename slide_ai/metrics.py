@@ -0,0 +1,214 @@
+"""
+Lightweight in-process metrics (counters, gauges, histograms) with Prometheus text exposition.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+_stage_listeners = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        # Exposed as <name>_total, as Prometheus expects for counters
+        super().__init__(f"{name}_total", documentation, labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append(("_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+                samples.append(("_sum", key, (), total))
+                samples.append(("_count", key, (), count))
+        return samples
+
+
+def render_prometheus():
+    """
+    Returns every registered metric in the Prometheus text exposition format.
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "slide_ai_stage_duration_seconds", "Time spent in each generation stage.", ["stage"],
+)
+STAGE_IN_FLIGHT = Gauge(
+    "slide_ai_stage_in_flight", "Stage executions currently in progress.", ["stage"],
+)
+STAGE_ERRORS = Counter(
+    "slide_ai_stage_errors", "Stage executions that raised.", ["stage"],
+)
+UPSTREAM_ERRORS = Counter(
+    "slide_ai_upstream_errors", "Failed upstream calls by upstream and reason (HTTP status or exception type).",
+    ["upstream", "reason"],
+)
+UPSTREAM_RATE_LIMITED = Counter(
+    "slide_ai_upstream_rate_limited", "Upstream calls rejected with HTTP 429.", ["upstream"],
+)
+CACHE_HITS = Counter("slide_ai_cache_hits", "Cache lookups that found an entry.", ["cache"])
+CACHE_MISSES = Counter("slide_ai_cache_misses", "Cache lookups that missed.", ["cache"])
+
+
+def add_stage_listener(listener):
+    """
+    Registers `listener(stage_name, seconds, error)`, called after every stage;
+    the hook for forwarding stage timings to a tracer.
+    """
+    _stage_listeners.append(listener)
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a block as one execution of `name`, tracking it as in flight meanwhile.
+
+        with stage("gemini_call"):
+            response = requests.post(...)
+    """
+    STAGE_IN_FLIGHT.inc(stage=name)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        STAGE_IN_FLIGHT.dec(stage=name)
+        for listener in _stage_listeners:
+            listener(name, elapsed, error)
+
+
+def record_upstream_error(upstream, error=None, status_code=None):
+    """
+    Counts a failed upstream call; HTTP 429s are also counted as rate limited.
+    """
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code == 429:
+        UPSTREAM_RATE_LIMITED.inc(upstream=upstream)
+    reason = str(status_code) if status_code else type(error).__name__ if error else "unknown"
+    UPSTREAM_ERRORS.inc(upstream=upstream, reason=reason)
+
+
+def record_cache(cache, hit):
+    (CACHE_HITS if hit else CACHE_MISSES).inc(cache=cache)
@@ -0,0 +1,199 @@
+"""
+Dominant colors of slide images, and slide background/text colors chosen so
+they neither clash with the image nor fall below WCAG contrast.
+
+The palette is k-means (NumPy, vectorized) over a 48px decode of the image;
+JPEGs decode at 1/8 scale, so extraction takes a few milliseconds and a cached
+palette (keyed by the image's hash) well under one.
+"""
+import hashlib
+import math
+import re
+
+from slide_ai.cache import get_cache
+from slide_ai.image_decode import decode_image
+
+PALETTE_SIZE = 5
+SAMPLE_PX = 48
+KMEANS_ITERATIONS = 8
+# WCAG 2.x AA for normal-size text
+MIN_CONTRAST = 4.5
+# Image colors covering less than this share of the image do not count as clashing
+DOMINANT_WEIGHT = 0.12
+# Redmean RGB distance below which a background reads as "the same color" as the image
+CLASH_DISTANCE = 120
+# Neutral fallbacks tried after the deck palette, light to dark
+NEUTRAL_BACKGROUNDS = ("FFFFFF", "F5F5F5", "2C3E50", "111111")
+
+DEFAULT_COLORS = {"background": "#FFFFFF", "text": "#222222", "accent": "#2C3E50"}
+_HEX_RE = re.compile(r"^#?([0-9a-fA-F]{6}|[0-9a-fA-F]{3})$")
+
+palette_cache = get_cache("palette")
+
+
+def normalize_hex(value, default=None):
+    """
+    Returns an uppercase RRGGBB string for '#RGB'/'#RRGGBB' input, else `default`.
+    """
+    match = _HEX_RE.match(value.strip()) if isinstance(value, str) else None
+    if not match:
+        return default
+    digits = match.group(1)
+    if len(digits) == 3:
+        digits = "".join(c * 2 for c in digits)
+    return digits.upper()
+
+
+def hex_to_rgb(value):
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def rgb_to_hex(rgb):
+    return "".join(f"{int(c):02X}" for c in rgb)
+
+
+def relative_luminance(rgb):
+    """
+    WCAG relative luminance of an (r, g, b) or RRGGBB color.
+    """
+    if isinstance(rgb, str):
+        rgb = hex_to_rgb(rgb)
+    channels = []
+    for c in rgb:
+        c = c / 255
+        channels.append(c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4)
+    r, g, b = channels
+    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+
+def contrast_ratio(a, b):
+    la, lb = relative_luminance(a), relative_luminance(b)
+    return (max(la, lb) + 0.05) / (min(la, lb) + 0.05)
+
+
+def readable_text(background, preferred=()):
+    """
+    Returns the first `preferred` color with at least MIN_CONTRAST against
+    `background`, else black or white, whichever contrasts more (always >= 4.5).
+    """
+    for color in preferred:
+        if color and contrast_ratio(color, background) >= MIN_CONTRAST:
+            return color
+    return max(("000000", "FFFFFF"), key=lambda color: contrast_ratio(color, background))
+
+
+def _distance(a, b):
+    # "Redmean" weighted RGB distance: cheap and close enough to perceptual for clash checks
+    (r1, g1, b1), (r2, g2, b2) = hex_to_rgb(a), hex_to_rgb(b)
+    mean_r = (r1 + r2) / 2
+    dr, dg, db = r1 - r2, g1 - g2, b1 - b2
+    return ((2 + mean_r / 256) * dr * dr + 4 * dg * dg + (2 + (255 - mean_r) / 256) * db * db) ** 0.5
+
+
+def kmeans_palette(pixels, k=PALETTE_SIZE, iterations=KMEANS_ITERATIONS):
+    """
+    Clusters an (n, 3) array of RGB pixels; returns [(RRGGBB, weight)] by weight.
+    Centers start at luminance quantiles, so the result is deterministic.
+    """
+    import numpy as np  # deferred so importing the module stays cheap
+
+    pixels = np.asarray(pixels, dtype=np.float32).reshape(-1, 3)
+    k = min(k, len(pixels))
+    luminance = pixels @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    order = np.argsort(luminance, kind="stable")
+    centers = pixels[order[((np.arange(k) + 0.5) * len(pixels) / k).astype(int)]].copy()
+    norms = (pixels ** 2).sum(axis=1)[:, None]
+    for _ in range(iterations):
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, as one small matrix product
+        distances = norms - 2 * pixels @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=pixels[:, c], minlength=k) for c in range(3)], axis=1)
+        moved = counts > 0  # empty clusters keep their center
+        new_centers = centers.copy()
+        new_centers[moved] = (sums[moved] / counts[moved, None]).astype(np.float32)
+        if np.abs(new_centers - centers).max() < 1.0:
+            centers = new_centers
+            break
+        centers = new_centers
+    counts = np.bincount(labels, minlength=k)
+    ranked = sorted(zip(counts.tolist(), centers.round().astype(int).tolist()), key=lambda item: -item[0])
+    return [(rgb_to_hex(center), count / len(pixels)) for count, center in ranked if count]
+
+
+def image_palette(data=None, image=None):
+    """
+    Returns the dominant colors of an image as [[RRGGBB, weight], ...], heaviest
+    first. `data` is the encoded image (bytes or a BytesIO); its palette is cached
+    by hash. A decoded PIL `image` (of the same data, if both are given) saves
+    decoding it again; on its own it is not cached.
+    """
+    import numpy as np
+
+    key = None
+    if data is not None:
+        if hasattr(data, "getbuffer"):
+            with data.getbuffer() as view:  # hash without copying; released before decoding
+                key = hashlib.blake2b(view, digest_size=16).hexdigest()
+        elif hasattr(data, "read"):
+            data.seek(0)
+            data = data.read()
+            key = hashlib.blake2b(data, digest_size=16).hexdigest()
+        else:
+            key = hashlib.blake2b(data, digest_size=16).hexdigest()
+        cached = palette_cache.get(key)
+        if cached is not None:
+            return cached
+    if image is None:
+        image = decode_image(data, max_size=(SAMPLE_PX, SAMPLE_PX), mode="RGB", purpose="palette")
+    else:
+        # Before reducing: palette ("P") and bilevel images cannot be box-reduced
+        image = image.convert("RGB")
+        factor = math.ceil(max(image.size) / SAMPLE_PX)
+        if factor > 1:
+            # Box-averages every source pixel in, like the decoder's DCT scaling
+            image = image.reduce(factor)
+    palette = [[color, round(weight, 4)] for color, weight in kmeans_palette(np.asarray(image))]
+    if key is not None:
+        palette_cache.set(key, palette)
+    return palette
+
+
+def _gemini_colors(colors):
+    colors = colors or {}
+    return tuple(normalize_hex(colors.get(key), normalize_hex(DEFAULT_COLORS[key]))
+                 for key in ("background", "text", "accent"))
+
+
+def deck_colors(colors):
+    """
+    Returns the deck's (background, text, accent) as RRGGBB from the Gemini
+    `colors` palette, with defaults for missing keys and the text color
+    replaced by black or white if it would not be readable on the background.
+    """
+    background, text, accent = _gemini_colors(colors)
+    return background, readable_text(background, (text,)), accent
+
+
+def choose_slide_colors(colors, palette):
+    """
+    Picks (background, text) RRGGBB colors for a slide showing an image with
+    `palette`. The deck background is kept unless it is close to one of the
+    image's dominant colors; then the first of the deck's text and accent colors
+    and a few neutrals that stands apart is used. Text is the first of the
+    deck's colors that meets MIN_CONTRAST on that background, else black or white.
+    """
+    deck_background, deck_text, _ = deck_colors(colors)
+    dominant = [color for color, weight in palette or () if weight >= DOMINANT_WEIGHT]
+    if not dominant:
+        return deck_background, deck_text
+
+    def clearance(candidate):
+        return min(_distance(candidate, color) for color in dominant)
+
+    if clearance(deck_background) >= CLASH_DISTANCE:
+        return deck_background, deck_text
+    background, text, accent = _gemini_colors(colors)
+    candidates = list(dict.fromkeys((text, accent) + NEUTRAL_BACKGROUNDS))
+    background = next((c for c in candidates if clearance(c) >= CLASH_DISTANCE), max(candidates, key=clearance))
+    return background, readable_text(background, (text, accent, deck_background))
@@ -0,0 +1,87 @@
+"""
+Per-slide image pipeline shared by the servers: image search, download and preview rendering.
+"""
+import base64
+
+from slide_ai.async_http import run_cpu
+from slide_ai.image_decode import decode_image, ImageTooLarge
+from slide_ai.image_editor import add_rounded_corners, pil_image_to_stream
+from slide_ai.layout import IMAGE_BOX_IN, PREVIEW_DPI
+from slide_ai.thumbnail import get_slide_thumbnail
+from slide_ai.image_providers import find_image, afind_image
+
+
+def apply_image_candidate(slide, candidate, error_msg):
+    # Library images keep the unsplash_* field names so clients need no changes
+    candidate = candidate or {}
+    slide["unsplash_image_url"] = candidate.get("image_url")
+    slide["unsplash_photographer_name"] = candidate.get("photographer_name")
+    slide["unsplash_photographer_url_with_utm"] = candidate.get("photographer_url_with_utm")
+    slide["image_provider"] = candidate.get("provider")
+    slide["image_credit"] = candidate.get("credit")
+    slide["image_fetch_error"] = error_msg
+    slide["img_b64"] = None
+
+
+def render_slide_preview(slide, image_stream, colors=None):
+    """
+    CPU-bound part of the preview: rounded PNG as a data URL plus a cached
+    thumbnail, drawn in the deck `colors`.
+    """
+    if image_stream:
+        max_px = round(IMAGE_BOX_IN[2] * PREVIEW_DPI)
+        try:
+            pil_img = decode_image(image_stream, max_size=(max_px, max_px * 4), purpose="preview")
+        except ImageTooLarge as e:
+            slide["image_fetch_error"] = str(e)
+            image_stream = None
+        else:
+            rounded_img = add_rounded_corners(pil_img, radius=60)
+            rounded_stream = pil_image_to_stream(rounded_img)
+            img_bytes = rounded_stream.getvalue()
+            slide["img_b64"] = f"data:image/png;base64,{base64.b64encode(img_bytes).decode()}"
+    thumb_key, _, _ = get_slide_thumbnail(slide, image_stream, colors=colors)
+    slide["thumbnail_url"] = f"/api/thumbnails/{thumb_key}"
+
+
+def attach_slide_preview(slide, unsplash_key, placement="preview", colors=None):
+    """
+    Finds (on Unsplash and/or in the local library), downloads and renders the
+    image for one slide, filling in the image fields, img_b64 and thumbnail_url.
+    Returns the downloaded stream (or None).
+    The image is fetched at the preview size; pass placement="export" when the
+    returned stream will also be embedded in a deck.
+    """
+    candidate, image_stream, error_msg = find_image(slide.get("unsplash_query"), unsplash_key, placement)
+    apply_image_candidate(slide, candidate, error_msg)
+    render_slide_preview(slide, image_stream, colors)
+    return image_stream
+
+
+async def aattach_slide_preview(slide, unsplash_key, placement="preview", colors=None):
+    """
+    Async version of attach_slide_preview: network calls are awaited and the PIL
+    work runs on the shared CPU executor, so many slides can progress at once.
+    """
+    candidate, image_stream, error_msg = await afind_image(slide.get("unsplash_query"), unsplash_key, placement)
+    apply_image_candidate(slide, candidate, error_msg)
+    await run_cpu(render_slide_preview, slide, image_stream, colors)
+    return image_stream
+
+
+def render_snapshot_previews(snapshot, indexes=None):
+    """
+    Renders the preview fields (img_b64, thumbnail_url) of a DeckSnapshot's
+    slides from the images stored in it; nothing is searched or downloaded.
+    Returns the slide dicts (all of them, or those at `indexes`).
+    """
+    slides = []
+    for index in range(len(snapshot)) if indexes is None else indexes:
+        slide = snapshot.slide(index)
+        image_stream = snapshot.slide_image(index)
+        slide["img_b64"] = None
+        render_slide_preview(slide, image_stream, snapshot.colors)
+        if image_stream is not None:
+            image_stream.close()
+        slides.append(slide)
+    return slides
@@ -1,104 +1,194 @@
 """
 Handles PowerPoint (.pptx) file creation.
 """
+import logging
+
 from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
-from PIL import Image
-from slide_ai.layout import apply_background_color, get_layout_options
+from pptx.util import Inches
+from pptx.enum.text import MSO_ANCHOR
+from slide_ai.layout import (
+    SLIDE_WIDTH_IN, SLIDE_HEIGHT_IN, TITLE_BOX_IN, BODY_BOX_IN, IMAGE_BOX_IN, EXPORT_DPI, image_attribution,
+    apply_background_color,
+)
+from slide_ai.config import get_pptx_optimize
+from slide_ai.image_decode import decode_image, ImageTooLarge
 from slide_ai.image_editor import add_rounded_corners, pil_image_to_stream
-import random
-
-def create_pptx_with_unsplash(slide_data_list, topic, app_name="SlideAI", filename=None):
-    prs = Presentation()
-    prs.slide_width = Inches(13.333)
-    prs.slide_height = Inches(7.5)
-    TITLE_SLIDE_LAYOUT = prs.slide_layouts[0]
-    CONTENT_LAYOUT = prs.slide_layouts[5]
-    layout_opts = get_layout_options()
-
-    # Title slide
-    slide = prs.slides.add_slide(TITLE_SLIDE_LAYOUT)
-    apply_background_color(slide, (255, 255, 255))  # White bg for title
-    title_shape = slide.shapes.title
-    if title_shape:
-        title_shape.text = topic
-        tf = title_shape.text_frame
-        tf.paragraphs[0].alignment = PP_ALIGN.CENTER
-        tf.paragraphs[0].font.bold = True
-        tf.paragraphs[0].font.size = Pt(48)
-        tf.vertical_anchor = MSO_ANCHOR.MIDDLE
-
-    # Content slides
+from slide_ai.logs import log_event
+from slide_ai.metrics import Counter, stage
+from slide_ai.palette import image_palette, choose_slide_colors, deck_colors, hex_to_rgb
+from slide_ai.pptx_optimizer import optimize_pptx
+from slide_ai.theme import apply_deck_theme, apply_slide_text_color
+
+PPTX_BYTES_SAVED = Counter("slide_ai_pptx_optimize_saved_bytes", "Bytes removed from built decks by the optimizer.")
+
+
+def _place(shape, box):
+    left, top, width, height = box
+    shape.left, shape.top = Inches(left), Inches(top)
+    shape.width, shape.height = Inches(width), Inches(height)
+
+def _default_filename(topic):
+    return f"{topic.replace(' ', '_').lower()}_presentation.pptx"
+
+
+class DeckBuilder:
+    """
+    Builds a deck one slide at a time so callers can stream slides (and their
+    images) through without holding the whole deck's source images in memory.
+    Colors and fonts are applied once to the slide master, so content slides
+    carry only their text.
+
+        builder = DeckBuilder(topic)
+        for slide_data in slides:
+            builder.add_slide(slide_data, image_stream)
+        builder.save(filename)
+    """
+    def __init__(self, topic, app_name="SlideAI", colors=None, fonts=None):
+        self.topic = topic
+        self.app_name = app_name
+        self.colors = colors
+        self.deck_colors = deck_colors(colors)
+        self.prs = Presentation()
+        self.prs.slide_width = Inches(SLIDE_WIDTH_IN)
+        self.prs.slide_height = Inches(SLIDE_HEIGHT_IN)
+        apply_deck_theme(self.prs, colors, fonts)
+        self.title_layout = self.prs.slide_layouts[0]
+        self.content_layout = self.prs.slide_layouts[1]  # Title and Content
+        self._add_title_slide(topic)
+
+    def _add_title_slide(self, text):
+        # Size, weight and centering come from the title layout (see apply_deck_theme)
+        slide = self.prs.slides.add_slide(self.title_layout)
+        if slide.shapes.title:
+            slide.shapes.title.text = text
+
+    def add_slide(self, slide_data, image_stream=None):
+        """
+        Adds one content slide. `image_stream` defaults to slide_data["actual_image_stream"];
+        it is decoded at no more than the placed resolution and inserted.
+        """
+        with stage("pptx_assemble"):
+            slide = self.prs.slides.add_slide(self.content_layout)
+            # Background, fonts, sizes and alignment all come from the master
+            title_shape = slide.shapes.title
+            if title_shape:
+                _place(title_shape, TITLE_BOX_IN)
+                title_shape.text = slide_data.get("title", "Untitled Slide")
+                title_shape.text_frame.vertical_anchor = MSO_ANCHOR.TOP
+            # Body
+            content = slide_data.get("content_points", [])
+            body_shape = slide.placeholders[1] if len(slide.placeholders) > 1 else None
+            if body_shape:
+                _place(body_shape, BODY_BOX_IN)
+                tf = body_shape.text_frame
+                tf.clear()
+                for i, point in enumerate(content):
+                    # clear() leaves one empty paragraph; reuse it for the first point
+                    p = tf.paragraphs[0] if i == 0 else tf.add_paragraph()
+                    p.text = point
+                # Attribution (level 1 is styled small and italic on the master)
+                attribution = image_attribution(slide_data)
+                if attribution:
+                    p = tf.add_paragraph()
+                    p.text = attribution
+                    p.level = 1
+            # Image
+            if image_stream is None:
+                image_stream = slide_data.get("actual_image_stream")
+            if image_stream:
+                palette = self._add_image(slide, image_stream)
+                if palette:
+                    self._apply_slide_colors(slide, palette)
+            return slide
+
+    def _apply_slide_colors(self, slide, palette):
+        # Slides keep the master's colors unless the deck background clashes with the image
+        background, text = choose_slide_colors(self.colors, palette)
+        if (background, text) == self.deck_colors[:2]:
+            return
+        apply_background_color(slide, hex_to_rgb(background))
+        # Once per placeholder, not on every run
+        apply_slide_text_color(slide, text)
+
+    def _add_image(self, slide, image_stream):
+        """
+        Inserts the image rounded at the placed resolution; returns its palette (None if skipped or unreadable).
+        """
+        left, top, width = IMAGE_BOX_IN
+        max_px = round(width * EXPORT_DPI)
+        try:
+            # Decode (and round) at no more than the placed resolution
+            pil_img = decode_image(image_stream, max_size=(max_px, max_px * 4), purpose="deck")
+        except ImageTooLarge:
+            return None  # the slide goes out without its image rather than failing the deck
+        try:
+            palette = image_palette(image_stream, image=pil_img)
+        except Exception as e:
+            # The image still goes in; the slide just keeps the deck's colors
+            log_event("image_palette_failed", level=logging.WARNING, mode=pil_img.mode, error=str(e))
+            palette = None
+        rounded_img = add_rounded_corners(pil_img, radius=60)
+        pil_img.close()
+        rounded_stream = pil_image_to_stream(rounded_img)
+        rounded_img.close()
+        # Place image on right half, vertically centered
+        slide.shapes.add_picture(rounded_stream, Inches(left), Inches(top), width=Inches(width))
+        # add_picture copied the bytes into the package; drop our buffer now
+        rounded_stream.close()
+        return palette
+
+    def save(self, filename=None):
+        """
+        Appends the closing slide and writes the deck. Returns the filename.
+        """
+        self._add_title_slide("Thank You")
+        if filename is None:
+            # Generate a default filename if none is provided
+            filename = _default_filename(self.topic)
+
+        # Ensure the filename has the .pptx extension
+        if not filename.lower().endswith('.pptx'):
+            filename += '.pptx'
+
+        with stage("pptx_save"):
+            self.prs.save(filename)
+        _optimize(filename)
+        return filename
+
+
+def _optimize(filename):
+    mode = get_pptx_optimize()
+    if mode == "off":
+        return
+    try:
+        with stage("pptx_optimize"):
+            report = optimize_pptx(filename, media=mode if mode in ("lossless", "lossy") else None)
+    except Exception as e:
+        # The saved deck is intact (the optimizer replaces it atomically); ship it as is
+        log_event("pptx_optimize_failed", level=logging.WARNING, filename=filename, error=str(e))
+        return
+    PPTX_BYTES_SAVED.inc(report["saved_bytes"])
+    log_event("pptx_optimized", filename=filename, **report)
+
+
+def build_deck_streaming(slides, topic, acquire_image=None, app_name="SlideAI", filename=None,
+                         colors=None, fonts=None):
+    """
+    Builds a deck from an iterable of slide dicts, acquiring each slide's image
+    with `acquire_image(slide_data)` only when that slide is inserted. At most one
+    source image is alive at a time, so peak memory does not grow with deck size.
+    """
+    builder = DeckBuilder(topic, app_name=app_name, colors=colors, fonts=fonts)
+    for slide_data in slides:
+        image_stream = acquire_image(slide_data) if acquire_image else None
+        builder.add_slide(slide_data, image_stream)
+        if image_stream is not None:
+            image_stream.close()
+    return builder.save(filename)
+
+
+def create_pptx_with_unsplash(slide_data_list, topic, app_name="SlideAI", filename=None, colors=None, fonts=None):
+    builder = DeckBuilder(topic, app_name=app_name, colors=colors, fonts=fonts)
     for slide_data in slide_data_list:
-        slide = prs.slides.add_slide(CONTENT_LAYOUT)
-        # Pick a random or cycling background color
-        bg_color = random.choice(layout_opts['background_colors'])
-        apply_background_color(slide, bg_color)
-        # Pick alignment randomly or by preference
-        alignment = random.choice(layout_opts['alignments'])
-        title_shape = slide.shapes.title
-        if title_shape:
-            title_shape.text = slide_data.get("title", "Untitled Slide")
-            tf = title_shape.text_frame
-            if alignment == "left":
-                tf.paragraphs[0].alignment = PP_ALIGN.LEFT
-            elif alignment == "center":
-                tf.paragraphs[0].alignment = PP_ALIGN.CENTER
-            elif alignment == "right":
-                tf.paragraphs[0].alignment = PP_ALIGN.RIGHT
-            tf.paragraphs[0].font.bold = True
-            tf.paragraphs[0].font.size = Pt(32)
-            tf.vertical_anchor = MSO_ANCHOR.TOP
-        # Body
-        content = slide_data.get("content_points", [])
-        body_shape = slide.placeholders[1] if len(slide.placeholders) > 1 else None
-        if body_shape:
-            tf = body_shape.text_frame
-            tf.clear()
-            for point in content:
-                p = tf.add_paragraph()
-                p.text = point
-                p.level = 0
-                p.font.size = Pt(18)
-            # Attribution
-            if slide_data.get("unsplash_photographer_name"):
-                p = tf.add_paragraph()
-                p.text = f"Photo by {slide_data['unsplash_photographer_name']} on Unsplash"
-                p.font.size = Pt(8)
-                p.font.italic = True
-        # Image
-        image_stream = slide_data.get("actual_image_stream")
-        if image_stream:
-            image_stream.seek(0)
-            pil_img = Image.open(image_stream)
-            rounded_img = add_rounded_corners(pil_img, radius=60)
-            rounded_stream = pil_image_to_stream(rounded_img)
-            # Place image on right half, vertically centered
-            left = Inches(7)
-            top = Inches(2)
-            width = Inches(5.5)
-            slide.shapes.add_picture(rounded_stream, left, top, width=width)
-
-    # Thank you slide
-    slide = prs.slides.add_slide(TITLE_SLIDE_LAYOUT)
-    apply_background_color(slide, (255, 255, 255))
-    title_shape = slide.shapes.title
-    if title_shape:
-        title_shape.text = "Thank You"
-        tf = title_shape.text_frame
-        tf.paragraphs[0].alignment = PP_ALIGN.CENTER
-        tf.paragraphs[0].font.bold = True
-        tf.paragraphs[0].font.size = Pt(54)
-        tf.vertical_anchor = MSO_ANCHOR.MIDDLE
-
-    if filename is None:
-        # Generate a default filename if none is provided
-        filename = f"{topic.replace(' ', '_').lower()}_presentation.pptx"
-    
-    # Ensure the filename has the .pptx extension
-    if not filename.lower().endswith('.pptx'):
-        filename += '.pptx'
-        
-    prs.save(filename)
-    return filename
+        builder.add_slide(slide_data)
+    return builder.save(filename)
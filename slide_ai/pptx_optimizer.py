@@ -0,0 +1,436 @@
+"""
+Post-processing optimizer for .pptx packages.
+
+Works on the package (zip + OPC relationships) directly, so it applies to any
+deck, not only ones built here:
+- slide layouts no slide uses are pruned, along with masters left without a used
+  layout and the printer settings part;
+- identical media parts are stored once (by SHA-256) and relationships repointed;
+- parts no longer reachable from the package root are dropped;
+- with media="lossless", PNG media is re-encoded at maximum compression; with
+  media="lossy", images are also downscaled to their placed size at `max_dpi`
+  and re-encoded as JPEG or a 256-color PNG when the result stays above
+  `min_psnr` dB. Either only replaces an image when the result is smaller.
+  Re-encoding costs seconds per large PNG; everything else takes milliseconds;
+- the zip is rewritten with XML at deflate level 9 and already-compressed media stored.
+
+    python -m slide_ai.pptx_optimizer deck.pptx [more.pptx ...] [--media lossy] [-o out.pptx]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import posixpath
+import re
+import sys
+import tempfile
+import time
+import zipfile
+from io import BytesIO
+from xml.etree import ElementTree as ET
+
+from slide_ai.layout import EXPORT_DPI
+
+CONTENT_TYPES = "[Content_Types].xml"
+ROOT_RELS = "_rels/.rels"
+EMU_PER_INCH = 914400
+DEFAULT_JPEG_QUALITY = 85
+DEFAULT_MIN_PSNR = 40.0
+# Only downscale when the image is meaningfully larger than its placement needs
+DOWNSCALE_SLACK = 1.1
+# Formats that are already compressed; deflating them again costs time for ~nothing
+STORED_EXTENSIONS = (".jpeg", ".jpg", ".png", ".gif", ".wdp", ".mp4", ".m4a", ".mp3", ".zip")
+MEDIA_CONTENT_TYPES = {".jpeg": "image/jpeg", ".png": "image/png"}
+MEDIA_LEVELS = (None, "lossless", "lossy")
+
+_PKG_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+
+def _rels_name(part):
+    directory, base = posixpath.split(part)
+    return posixpath.join(directory, "_rels", base + ".rels")
+
+
+def _source_part(rels_name):
+    directory, base = posixpath.split(rels_name)
+    return posixpath.join(posixpath.dirname(directory), base[:-len(".rels")])
+
+
+def _relative(source, target):
+    return posixpath.relpath(target, posixpath.dirname(source) or ".")
+
+
+class Package:
+    """
+    The parts of an OPC package, in zip order, with relationship helpers.
+    Edits to XML are targeted string substitutions so everything else in a part
+    (namespace prefixes, extension lists) is preserved byte for byte.
+    """
+    def __init__(self, data):
+        with zipfile.ZipFile(BytesIO(data)) as zf:
+            self.parts = {info.filename: zf.read(info) for info in zf.infolist() if not info.is_dir()}
+
+    def relationships(self, part):
+        """
+        Returns the relationships of `part` ("" for the package root) as dicts
+        with id, type (last path segment), target and the resolved target part.
+        """
+        rels_name = ROOT_RELS if not part else _rels_name(part)
+        data = self.parts.get(rels_name)
+        if data is None:
+            return []
+        rels = []
+        for el in ET.fromstring(data).iter(_PKG_RELS):
+            target = el.get("Target", "")
+            external = el.get("TargetMode") == "External"
+            if external:
+                resolved = None
+            elif target.startswith("/"):
+                resolved = target[1:]
+            else:
+                resolved = posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+            rels.append({"id": el.get("Id"), "type": el.get("Type", "").rsplit("/", 1)[-1],
+                         "target": target, "part": resolved})
+        return rels
+
+    def related(self, part, rel_type):
+        return [rel for rel in self.relationships(part) if rel["type"] == rel_type]
+
+    def _sub(self, name, pattern, repl):
+        data = self.parts[name].decode("utf-8")
+        self.parts[name] = re.sub(pattern, repl, data, count=1).encode("utf-8")
+
+    def drop_relationship(self, part, rel_id):
+        rels_name = ROOT_RELS if not part else _rels_name(part)
+        self._sub(rels_name, r'<Relationship\b[^>]*\bId="%s"[^>]*/>' % re.escape(rel_id), "")
+
+    def retarget(self, part, rel_id, new_part):
+        rels_name = ROOT_RELS if not part else _rels_name(part)
+        target = _relative(part, new_part) if part else new_part
+
+        def repl(match):
+            return re.sub(r'\bTarget="[^"]*"', f'Target="{target}"', match.group(0))
+
+        self._sub(rels_name, r'<Relationship\b[^>]*\bId="%s"[^>]*/>' % re.escape(rel_id), repl)
+
+    def drop_id_list_entry(self, part, tag, rel_id):
+        # e.g. <p:sldLayoutId id="2147483650" r:id="rId2"/> in a master's sldLayoutIdLst
+        self._sub(part, r'<(?:\w+:)?%s\b[^>]*\b\w+:id="%s"[^>]*/>' % (tag, re.escape(rel_id)), "")
+
+    def reachable(self):
+        seen, stack = set(), [""]
+        while stack:
+            part = stack.pop()
+            for rel in self.relationships(part):
+                if rel["part"] and rel["part"] not in seen and rel["part"] in self.parts:
+                    seen.add(rel["part"])
+                    stack.append(rel["part"])
+        return seen
+
+    def rename(self, old, new):
+        self.parts = {(new if name == old else name): data for name, data in self.parts.items()}
+        for part in list(self.parts):
+            for rel in self.relationships(part):
+                if rel["part"] == old:
+                    self.retarget(part, rel["id"], new)
+        self._sub(CONTENT_TYPES, r'<Override\b[^>]*\bPartName="/%s"[^>]*/>' % re.escape(old), "")
+        extension = posixpath.splitext(new)[1]
+        types = self.parts[CONTENT_TYPES].decode("utf-8")
+        if not re.search(r'<Default\b[^>]*\bExtension="%s"' % extension[1:], types, re.IGNORECASE):
+            types = types.replace(
+                "<Default ",
+                f'<Default Extension="{extension[1:]}" ContentType="{MEDIA_CONTENT_TYPES[extension]}"/><Default ', 1,
+            )
+            self.parts[CONTENT_TYPES] = types.encode("utf-8")
+
+    def drop_parts(self, names):
+        for name in names:
+            self.parts.pop(name, None)
+            self.parts.pop(_rels_name(name), None)
+            self._sub(CONTENT_TYPES, r'<Override\b[^>]*\bPartName="/%s"[^>]*/>' % re.escape(name), "")
+
+    def to_bytes(self):
+        out = BytesIO()
+        with zipfile.ZipFile(out, "w") as zf:
+            # [Content_Types].xml first, as Office writes it
+            names = sorted(self.parts, key=lambda name: name != CONTENT_TYPES)
+            for name in names:
+                if name.lower().endswith(STORED_EXTENSIONS):
+                    zf.writestr(name, self.parts[name], compress_type=zipfile.ZIP_STORED)
+                else:
+                    zf.writestr(name, self.parts[name], compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
+        return out.getvalue()
+
+
+def _prune_layouts(pkg, presentation):
+    """
+    Removes layouts no slide uses, then masters without any used layout (always
+    keeping one master with one layout). Returns (layouts_removed, masters_removed).
+    """
+    used = set()
+    for slide in pkg.related(presentation, "slide"):
+        used.update(rel["part"] for rel in pkg.related(slide["part"], "slideLayout"))
+    masters = pkg.related(presentation, "slideMaster")
+    layouts_removed = masters_removed = 0
+    for index, master in enumerate(masters):
+        layouts = pkg.related(master["part"], "slideLayout")
+        keep = [rel for rel in layouts if rel["part"] in used]
+        if not keep:
+            if used or index > 0:
+                # Slides use other masters (or, with no slides, the first master stays)
+                pkg.drop_id_list_entry(presentation, "sldMasterId", master["id"])
+                pkg.drop_relationship(presentation, master["id"])
+                masters_removed += 1
+                continue
+            keep = layouts[:1]  # a deck with no slides still needs one layout
+        for rel in layouts:
+            if rel not in keep:
+                pkg.drop_id_list_entry(master["part"], "sldLayoutId", rel["id"])
+                pkg.drop_relationship(master["part"], rel["id"])
+                layouts_removed += 1
+    # Printer settings only matter to the machine that last printed the deck
+    for rel in pkg.related(presentation, "printerSettings"):
+        pkg.drop_relationship(presentation, rel["id"])
+    return layouts_removed, masters_removed
+
+
+def _dedupe_media(pkg):
+    canonical, duplicates = {}, {}
+    for name in sorted(pkg.parts):
+        if name.startswith("ppt/media/"):
+            digest = hashlib.sha256(pkg.parts[name]).digest()
+            if digest in canonical:
+                duplicates[name] = canonical[digest]
+            else:
+                canonical[digest] = name
+    if duplicates:
+        for part in list(pkg.parts):
+            for rel in pkg.relationships(part):
+                if rel["part"] in duplicates:
+                    pkg.retarget(part, rel["id"], duplicates[rel["part"]])
+    return len(duplicates)
+
+
+def _placements(pkg):
+    """
+    Returns {media part: (max width EMU, max height EMU)} over every picture
+    that shows it; media shown cropped (srcRect) maps to None (never downscaled).
+    """
+    sizes = {}
+    for part, data in pkg.parts.items():
+        if not part.endswith(".xml") or not part.startswith("ppt/") or b"<p:pic" not in data:
+            continue
+        rels = {rel["id"]: rel["part"] for rel in pkg.relationships(part)}
+        for pic in ET.fromstring(data).iter(f"{_P}pic"):
+            blip = pic.find(f".//{_A}blip")
+            ext = pic.find(f".//{_A}xfrm/{_A}ext")
+            media = rels.get(blip.get(f"{_R}embed")) if blip is not None else None
+            if media is None:
+                continue
+            if ext is None or pic.find(f".//{_A}srcRect") is not None:
+                sizes[media] = None
+            elif media not in sizes or sizes[media] is not None:
+                width, height = int(ext.get("cx", 0)), int(ext.get("cy", 0))
+                previous = sizes.get(media) or (0, 0)
+                sizes[media] = (max(width, previous[0]), max(height, previous[1]))
+    return sizes
+
+
+def _psnr(a, b):
+    from PIL import ImageChops, ImageStat
+
+    mode = "RGBA" if "A" in a.getbands() else "RGB"
+    stat = ImageStat.Stat(ImageChops.difference(a.convert(mode), b.convert(mode)))
+    mse = sum(stat.sum2) / (len(stat.sum2) * a.width * a.height)
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def _encode(img, fmt, **params):
+    out = BytesIO()
+    img.save(out, fmt, **params)
+    return out.getvalue()
+
+
+def _recompress(data, box, lossy, quality, min_psnr):
+    """
+    Returns (bytes, extension) for the smallest acceptable encoding of an image,
+    or None when nothing beats the original.
+    """
+    from PIL import Image
+
+    with Image.open(BytesIO(data)) as img:
+        fmt = img.format
+        if fmt not in ("PNG", "JPEG"):
+            return None
+        if lossy and box and (img.width > box[0] * DOWNSCALE_SLACK or img.height > box[1] * DOWNSCALE_SLACK):
+            if fmt == "JPEG":
+                img.draft("RGB", box)
+            img = img.copy()
+            img.thumbnail(box, Image.LANCZOS)
+            resized = True
+        else:
+            img.load()
+            img = img.copy()
+            resized = False
+
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if has_alpha and img.convert("RGBA").getextrema()[3][0] == 255:
+        has_alpha = False  # alpha channel present but fully opaque
+    candidates = []
+    if fmt == "PNG" or resized:
+        candidates.append((_encode(img, "PNG", optimize=True), ".png"))
+    if lossy and not has_alpha:
+        jpeg = _encode(img.convert("RGB"), "JPEG", quality=quality, optimize=True)
+        if fmt == "JPEG" or _psnr(img, Image.open(BytesIO(jpeg))) >= min_psnr:
+            candidates.append((jpeg, ".jpeg"))
+    elif lossy and img.mode != "P":
+        quantized = img.convert("RGBA").quantize(256, method=Image.Quantize.FASTOCTREE)
+        if _psnr(img, quantized) >= min_psnr:
+            candidates.append((_encode(quantized, "PNG", optimize=True), ".png"))
+    if not candidates:
+        return None
+    best = min(candidates, key=lambda candidate: len(candidate[0]))
+    return best if len(best[0]) < len(data) else None
+
+
+def _recompress_media(pkg, lossy, quality, max_dpi, min_psnr):
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return 0  # structural optimizations still apply without Pillow
+    placements = _placements(pkg) if lossy else {}
+    count = 0
+    for name in [name for name in pkg.parts if name.startswith("ppt/media/")]:
+        if posixpath.splitext(name)[1].lower() not in (".png", ".jpeg", ".jpg"):
+            continue
+        size = placements.get(name)
+        box = (max(1, round(size[0] / EMU_PER_INCH * max_dpi)),
+               max(1, round(size[1] / EMU_PER_INCH * max_dpi))) if size else None
+        try:
+            result = _recompress(pkg.parts[name], box, lossy, quality, min_psnr)
+        except Exception:
+            continue  # leave images PIL cannot handle as they are
+        if result is None:
+            continue
+        data, extension = result
+        pkg.parts[name] = data
+        if posixpath.splitext(name)[1].lower() != extension and not (
+                extension == ".jpeg" and name.lower().endswith(".jpg")):
+            new_name = posixpath.splitext(name)[0] + extension
+            while new_name in pkg.parts:
+                new_name = posixpath.splitext(new_name)[0] + "_" + extension
+            pkg.rename(name, new_name)
+        count += 1
+    return count
+
+
+def optimize_pptx_bytes(data, media=None, quality=DEFAULT_JPEG_QUALITY, max_dpi=EXPORT_DPI,
+                        min_psnr=DEFAULT_MIN_PSNR):
+    """
+    Optimizes a .pptx held in memory; `media` is None (leave images alone),
+    "lossless" or "lossy". Returns (optimized bytes, report); the report has
+    input/output/saved bytes, seconds and what was removed or re-encoded.
+    """
+    if media not in MEDIA_LEVELS:
+        raise ValueError(f"media must be one of {MEDIA_LEVELS}, not {media!r}")
+    started = time.perf_counter()
+    pkg = Package(data)
+    presentation = next((rel["part"] for rel in pkg.relationships("") if rel["type"] == "officeDocument"), None)
+    layouts_removed = masters_removed = 0
+    if presentation in pkg.parts:
+        layouts_removed, masters_removed = _prune_layouts(pkg, presentation)
+    media_deduplicated = _dedupe_media(pkg)
+
+    reachable = pkg.reachable()
+    unreachable = [name for name in pkg.parts
+                   if name != CONTENT_TYPES and not name.endswith(".rels") and name not in reachable]
+    pkg.drop_parts(unreachable)
+    # Relationship parts whose source part is gone
+    pkg.drop_parts([name for name in list(pkg.parts) if name.endswith(".rels") and name != ROOT_RELS
+                    and _source_part(name) not in pkg.parts])
+    media_recompressed = 0
+    if media:
+        media_recompressed = _recompress_media(pkg, media == "lossy", quality, max_dpi, min_psnr)
+
+    output = pkg.to_bytes()
+    if len(output) >= len(data) and not (layouts_removed or masters_removed or media_deduplicated):
+        output = data  # nothing gained; keep the original bytes
+    report = {
+        "input_bytes": len(data),
+        "output_bytes": len(output),
+        "saved_bytes": len(data) - len(output),
+        "saved_ratio": round(1 - len(output) / len(data), 4) if data else 0.0,
+        "seconds": round(time.perf_counter() - started, 4),
+        "layouts_removed": layouts_removed,
+        "masters_removed": masters_removed,
+        "media_deduplicated": media_deduplicated,
+        "media_recompressed": media_recompressed,
+        "parts_removed": len(unreachable),
+    }
+    return output, report
+
+
+def optimize_pptx(src, dst=None, **options):
+    """
+    Optimizes the .pptx at `src`, writing to `dst` (default: in place, atomically).
+    Options are those of optimize_pptx_bytes. Returns the report.
+    """
+    started = time.perf_counter()
+    with open(src, "rb") as f:
+        data = f.read()
+    output, report = optimize_pptx_bytes(data, **options)
+    dst = dst or src
+    if output is not data or dst != src:
+        directory = os.path.dirname(os.path.abspath(dst))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(output)
+            os.replace(tmp_path, dst)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shrink .pptx files")
+    parser.add_argument("files", nargs="+", help=".pptx files (optimized in place unless -o is given)")
+    parser.add_argument("-o", "--output", help="output file (only with a single input)")
+    parser.add_argument("--media", choices=("none", "lossless", "lossy"), default="lossless",
+                        help="image re-encoding: none, lossless (default) or lossy (downscale and re-encode"
+                             " within the quality budget)")
+    parser.add_argument("--quality", type=int, default=DEFAULT_JPEG_QUALITY, help="JPEG quality in lossy mode")
+    parser.add_argument("--max-dpi", type=int, default=EXPORT_DPI, help="image resolution kept in lossy mode")
+    parser.add_argument("--min-psnr", type=float, default=DEFAULT_MIN_PSNR,
+                        help="lowest PSNR (dB) accepted for a lossy re-encode")
+    parser.add_argument("--json", action="store_true", help="print one JSON report per file")
+    args = parser.parse_args(argv)
+    if args.output and len(args.files) > 1:
+        parser.error("-o/--output needs exactly one input file")
+
+    total_in = total_out = 0
+    for path in args.files:
+        report = optimize_pptx(path, args.output, media=None if args.media == "none" else args.media, quality=args.quality,
+                               max_dpi=args.max_dpi, min_psnr=args.min_psnr)
+        total_in += report["input_bytes"]
+        total_out += report["output_bytes"]
+        if args.json:
+            print(json.dumps(dict(report, file=path)))
+        else:
+            print(f"{path}: {report['input_bytes']:,} -> {report['output_bytes']:,} bytes "
+                  f"(-{report['saved_ratio']:.1%}) in {report['seconds'] * 1000:.0f}ms; "
+                  f"{report['layouts_removed']} layouts, {report['masters_removed']} masters, "
+                  f"{report['media_deduplicated']} duplicate media removed, "
+                  f"{report['media_recompressed']} media re-encoded")
+    if len(args.files) > 1 and not args.json:
+        print(f"total: {total_in:,} -> {total_out:,} bytes, {total_in - total_out:,} saved")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
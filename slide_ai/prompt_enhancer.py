@@ -0,0 +1,126 @@
+"""
+Keyword-driven prompt enhancement shared by the Flask and FastAPI servers.
+"""
+import re
+import zlib
+from functools import lru_cache
+
+ENHANCE_CACHE_SIZE = 4096
+MAX_BATCH_PROMPTS = 1000
+
+# Checked in order: a prompt matching several categories gets the first one.
+# Each style is appended to the original prompt after ", ".
+CATEGORIES = [
+    ("art", ["art", "painting", "drawing", "artist", "portrait", "illustration", "sketch", "canvas"], [
+        "masterpiece, intricate details, professional lighting, vibrant colors, artistic composition, trending on ArtStation, award-winning, museum quality, hyperrealistic, 8K resolution",
+        "oil painting, masterpiece, vivid colors, detailed brushwork, professional lighting, gallery quality, artistic composition, trending on ArtStation",
+        "watercolor painting, delicate brushstrokes, vibrant palette, artistic composition, detailed, professional lighting, museum quality",
+    ]),
+    ("nature", ["nature", "landscape", "mountain", "ocean", "forest", "sky", "sunset", "beach", "river", "waterfall", "garden"], [
+        "breathtaking view, golden hour lighting, atmospheric, cinematic, detailed, National Geographic, professional photography, ultra-realistic, 8K resolution, perfect composition",
+        "stunning landscape photography, dramatic lighting, atmospheric, panoramic view, detailed, professional photography, ultra HD",
+        "aerial view, drone photography, beautiful scenery, perfect weather conditions, high detail, professional photography",
+    ]),
+    ("tech", ["tech", "technology", "futuristic", "robot", "digital", "cyber", "computer", "ai", "machine", "device"], [
+        "highly detailed, sci-fi, concept art, ultra-realistic, octane render, 8K resolution, intricate details, futuristic lighting, sleek design, hyper-detailed",
+        "cyberpunk aesthetic, neon lighting, futuristic design, highly detailed, concept art, ultra HD, ray tracing, glossy surfaces",
+        "technical illustration, blueprint style, detailed schematics, futuristic design, clean lines, professional rendering",
+    ]),
+    ("fantasy", ["fantasy", "magical", "dragon", "fairy", "wizard", "elf", "mythical", "enchanted", "medieval"], [
+        "fantasy art, magical atmosphere, detailed character design, mystical lighting, epic scene, professional illustration, trending on ArtStation",
+        "mythical scene, magical realism, detailed fantasy world, professional concept art, epic lighting, cinematic composition",
+        "enchanted realm, fantasy illustration, detailed character design, magical atmosphere, professional artwork, epic scale",
+    ]),
+    ("food", ["food", "cuisine", "dish", "meal", "restaurant", "cooking", "dessert", "chef", "gourmet"], [
+        "professional food photography, studio lighting, shallow depth of field, mouth-watering, high-end restaurant presentation, gourmet, 8K resolution",
+        "culinary masterpiece, professional food styling, perfect lighting, fresh ingredients, gourmet presentation, magazine quality photography",
+        "appetizing food photography, perfect composition, studio lighting, professional styling, cookbook quality, detailed textures",
+    ]),
+    ("architecture", ["building", "architecture", "structure", "skyscraper", "house", "interior", "design", "construction"], [
+        "architectural photography, perfect symmetry, golden hour lighting, detailed structure, professional photography, ultra HD, wide angle lens",
+        "architectural visualization, photorealistic rendering, perfect lighting, detailed textures, professional quality, ultra HD resolution",
+        "architectural design, detailed structure, professional photography, dramatic lighting, perfect composition, ultra-realistic",
+    ]),
+    ("space", ["space", "galaxy", "cosmic", "universe", "planet", "star", "nebula", "astronomy", "astronaut"], [
+        "cosmic scene, astronomy photography, nebula colors, star details, space exploration, ultra HD, breathtaking view, scientifically accurate",
+        "space art, cosmic scenery, stellar details, astronomical phenomenon, scientifically accurate, ultra HD, professional rendering",
+        "astrophotography, telescope imagery, detailed cosmic structures, space exploration, NASA quality, ultra HD resolution",
+    ]),
+    ("animal", ["animal", "wildlife", "pet", "dog", "cat", "bird", "fish", "lion", "tiger", "bear", "elephant"], [
+        "wildlife photography, National Geographic, perfect timing, natural habitat, detailed fur/feathers, professional photography, ultra HD, telephoto lens",
+        "animal portrait, studio lighting, detailed features, professional wildlife photography, perfect composition, ultra-realistic",
+        "animal in motion, action shot, perfect timing, natural environment, detailed, professional wildlife photography",
+    ]),
+]
+GENERAL_STYLES = [
+    "highly detailed, professional photography, cinematic, perfect lighting, 8K resolution, photorealistic, masterpiece quality, perfect composition",
+    "ultra-realistic, detailed textures, professional lighting, cinematic composition, 8K resolution, photorealistic rendering",
+    "studio photography, perfect lighting, detailed textures, professional quality, ultra HD resolution, photorealistic",
+]
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _keyword_priority(categories):
+    """
+    Maps each keyword to the index of the first category that lists it.
+    """
+    priority = {}
+    for index, (_, keywords, _) in enumerate(categories):
+        for keyword in keywords:
+            priority.setdefault(keyword.lower(), index)
+    return priority
+
+
+_KEYWORD_PRIORITY = _keyword_priority(CATEGORIES)
+
+
+def stable_hash(text):
+    """
+    Process-independent hash (unlike hash(), which is salted per interpreter).
+    """
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def classify_prompt(prompt):
+    """
+    Returns the name of the highest-priority category the prompt mentions, or
+    None. The prompt is split into words once and each word (or its singular,
+    for a trailing "s") is looked up in the keyword table, so "art" matches
+    "arts" but not "party".
+    """
+    best = len(CATEGORIES)
+    for word in _WORD_RE.findall(prompt.lower()):
+        index = _KEYWORD_PRIORITY.get(word)
+        if index is None and word.endswith("s"):
+            index = _KEYWORD_PRIORITY.get(word[:-1])
+        if index is not None and index < best:
+            best = index
+            if best == 0:
+                break
+    return CATEGORIES[best][0] if best < len(CATEGORIES) else None
+
+
+_STYLES = {name: styles for name, _, styles in CATEGORIES}
+
+
+@lru_cache(maxsize=ENHANCE_CACHE_SIZE)
+def enhance_prompt(prompt):
+    """
+    Returns the prompt with a style suffix chosen by category. The same prompt
+    always gets the same style, in every process.
+    """
+    styles = _STYLES.get(classify_prompt(prompt), GENERAL_STYLES)
+    return f"{prompt}, {styles[stable_hash(prompt) % len(styles)]}"
+
+
+def enhance_prompts(prompts):
+    """
+    Enhances a batch of prompts; repeats within and across batches hit the cache.
+    """
+    if len(prompts) > MAX_BATCH_PROMPTS:
+        raise ValueError(f"At most {MAX_BATCH_PROMPTS} prompts per batch")
+    if not all(isinstance(prompt, str) and prompt for prompt in prompts):
+        raise ValueError("Every prompt must be a non-empty string")
+    return [enhance_prompt(prompt) for prompt in prompts]
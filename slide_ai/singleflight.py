@@ -0,0 +1,95 @@
+"""
+Single-flight call coalescing: concurrent identical calls share one execution and its result.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, CancelledError
+
+from slide_ai.metrics import Counter
+
+COALESCED = Counter(
+    "slide_ai_singleflight_coalesced", "Calls that joined an identical call already in flight.", ["flight"],
+)
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers arriving while a call for
+    the same key is running wait for it and receive its result (or exception)
+    instead of starting their own.
+
+    Flights are concurrent.futures.Futures, so threads (do) and coroutines on
+    any event loop (ado) can join each other's flights. The result object is
+    shared by every caller: return immutable values, or copy before mutating.
+
+        gemini_flight = SingleFlight("gemini")
+        data = gemini_flight.do(("gemini", topic, num_slides), call_gemini, topic, num_slides)
+    """
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                COALESCED.inc(flight=self.name)
+                return future, False
+            future = self._flights[key] = Future()
+            return future, True
+
+    def _land(self, key, future):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def do(self, key, func, *args, **kwargs):
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return future.result()
+                except CancelledError:
+                    continue  # the leading caller was cancelled; start over
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                self._land(key, future)
+                future.set_exception(e)
+                raise
+            self._land(key, future)
+            future.set_result(result)
+            return result
+
+    async def ado(self, key, func, *args, **kwargs):
+        """
+        Async version of do(); `func` is a coroutine function.
+        """
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    # shield: a cancelled follower must not cancel the shared flight
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except asyncio.CancelledError:
+                    if future.cancelled():
+                        continue  # the leading caller was cancelled; start over
+                    raise
+            try:
+                result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                self._land(key, future)
+                future.cancel()
+                raise
+            except BaseException as e:
+                self._land(key, future)
+                future.set_exception(e)
+                raise
+            self._land(key, future)
+            future.set_result(result)
+            return result
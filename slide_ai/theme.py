@@ -0,0 +1,118 @@
+"""
+Applies a per-deck theme (color scheme, font scheme, text styles) to the slide master.
+"""
+from lxml import etree
+from pptx.enum.shapes import PP_PLACEHOLDER
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+from slide_ai.layout import TITLE_FONT_PT, TITLE_SLIDE_FONT_PT, BODY_FONT_PT, ATTRIBUTION_FONT_PT
+from slide_ai.palette import deck_colors
+
+_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+_NS = {"a": _A, "p": _P}
+
+
+def _set_scheme_color(clr_scheme, slot, rgb):
+    slot_el = clr_scheme.find(f"a:{slot}", _NS)
+    if slot_el is None:
+        return
+    for child in list(slot_el):
+        slot_el.remove(child)
+    etree.SubElement(slot_el, f"{{{_A}}}srgbClr", val=rgb)
+
+
+def _set_typeface(font_scheme, which, typeface):
+    latin = font_scheme.find(f"a:{which}/a:latin", _NS)
+    if latin is not None and typeface:
+        latin.set("typeface", typeface)
+
+
+def _level_props(style, level, **attrs):
+    """
+    Returns the <a:lvlNpPr> of a master text style, with <a:defRPr> set from `attrs`.
+    """
+    tag = f"{{{_A}}}lvl{level}pPr"
+    lvl = style.find(tag)
+    if lvl is None:
+        lvl = etree.SubElement(style, tag)
+    def_rpr = lvl.find(f"{{{_A}}}defRPr")
+    if def_rpr is None:
+        def_rpr = etree.SubElement(lvl, f"{{{_A}}}defRPr")
+    for key, value in attrs.items():
+        def_rpr.set(key, value)
+    return lvl
+
+
+def apply_deck_theme(prs, colors=None, fonts=None):
+    """
+    Writes the deck palette and fonts into the theme and the master text styles
+    once, so individual slides inherit them and carry only their text.
+    `colors` uses the Gemini keys (background, text, accent), `fonts` uses heading/body.
+    """
+    fonts = fonts or {}
+    background, text, accent = deck_colors(colors)
+
+    # Theme part: the master background and text reference bg1/tx1 (lt1/dk1)
+    master = prs.slide_master
+    theme_part = master.part.part_related_by(RT.THEME)
+    theme = etree.fromstring(theme_part.blob)
+    clr_scheme = theme.find(".//a:themeElements/a:clrScheme", _NS)
+    if clr_scheme is not None:
+        clr_scheme.set("name", "Slide AI")
+        _set_scheme_color(clr_scheme, "lt1", background)
+        _set_scheme_color(clr_scheme, "dk1", text)
+        _set_scheme_color(clr_scheme, "accent1", accent)
+        _set_scheme_color(clr_scheme, "hlink", accent)
+    font_scheme = theme.find(".//a:themeElements/a:fontScheme", _NS)
+    if font_scheme is not None:
+        font_scheme.set("name", "Slide AI")
+        _set_typeface(font_scheme, "majorFont", fonts.get("heading"))
+        _set_typeface(font_scheme, "minorFont", fonts.get("body"))
+    # The theme is loaded as a plain blob part; python-pptx has no setter for it
+    theme_part._blob = etree.tostring(theme, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    # Master text styles: sizes and weights that used to be set on every run
+    tx_styles = master._element.find("p:txStyles", _NS)
+    title_style = tx_styles.find("p:titleStyle", _NS)
+    _level_props(title_style, 1, sz=str(TITLE_FONT_PT * 100), b="1").set("algn", "l")
+    body_style = tx_styles.find("p:bodyStyle", _NS)
+    _level_props(body_style, 1, sz=str(BODY_FONT_PT * 100))
+    # Level 2 is used for the photo attribution line: small, italic, unbulleted
+    attribution = _level_props(body_style, 2, sz=str(ATTRIBUTION_FONT_PT * 100), i="1")
+    attribution.set("marL", "0")
+    attribution.set("indent", "0")
+    for bullet in attribution.findall("a:buChar", _NS) + attribution.findall("a:buNone", _NS):
+        attribution.remove(bullet)
+    # buNone must precede defRPr in CT_TextParagraphProperties
+    attribution.find("a:defRPr", _NS).addprevious(etree.Element(f"{{{_A}}}buNone"))
+
+    # Title layout (opening and closing slides): large, bold, centered both ways
+    for placeholder in prs.slide_layouts[0].placeholders:
+        if placeholder.placeholder_format.type in (PP_PLACEHOLDER.CENTER_TITLE, PP_PLACEHOLDER.TITLE):
+            tx_body = placeholder._element.find("p:txBody", _NS)
+            tx_body.find("a:bodyPr", _NS).set("anchor", "ctr")
+            _level_props(tx_body.find("a:lstStyle", _NS), 1, sz=str(TITLE_SLIDE_FONT_PT * 100), b="1").set("algn", "ctr")
+
+
+def apply_slide_text_color(slide, rgb):
+    """
+    Overrides the text color on one slide (RRGGBB) in each placeholder's list
+    style, for the paragraph levels it uses, so the runs stay unformatted.
+    """
+    for shape in slide.placeholders:
+        if not shape.has_text_frame:
+            continue
+        tx_body = shape._element.find("p:txBody", _NS)
+        lst_style = tx_body.find("a:lstStyle", _NS)
+        if lst_style is None:
+            lst_style = etree.Element(f"{{{_A}}}lstStyle")
+            tx_body.find("a:bodyPr", _NS).addnext(lst_style)
+        for level in sorted({paragraph.level + 1 for paragraph in shape.text_frame.paragraphs}):
+            def_rpr = _level_props(lst_style, level).find("a:defRPr", _NS)
+            for fill in def_rpr.findall("a:solidFill", _NS):
+                def_rpr.remove(fill)
+            # The fill comes first in CT_TextCharacterProperties
+            fill = etree.Element(f"{{{_A}}}solidFill")
+            etree.SubElement(fill, f"{{{_A}}}srgbClr", val=rgb)
+            def_rpr.insert(0, fill)
@@ -0,0 +1,187 @@
+"""
+Renders low-resolution slide thumbnails with PIL, using the same geometry as pptx_builder.
+"""
+import hashlib
+import json
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+from slide_ai.cache import Cache
+from slide_ai.image_decode import decode_image, ImageTooLarge
+from slide_ai.metrics import stage
+from slide_ai.palette import image_palette, choose_slide_colors, deck_colors, hex_to_rgb
+from slide_ai.layout import (
+    SLIDE_WIDTH_IN, SLIDE_HEIGHT_IN, TITLE_BOX_IN, BODY_BOX_IN, IMAGE_BOX_IN,
+    TITLE_FONT_PT, BODY_FONT_PT, ATTRIBUTION_FONT_PT, MIN_THUMBNAIL_WIDTH, MAX_THUMBNAIL_WIDTH,
+    image_attribution,
+)
+
+DEFAULT_THUMBNAIL_WIDTH = 320
+THUMBNAIL_FORMATS = {"PNG": "image/png", "WEBP": "image/webp"}
+
+
+class ThumbnailCache:
+    """
+    Rendered thumbnails keyed by content hash, kept in the shared cache so a
+    thumbnail rendered by one worker can be served by any other.
+    """
+    def __init__(self, cache=None):
+        self.cache = cache or Cache("thumbnail")
+
+    def get(self, key):
+        item = self.cache.get(key)
+        if item is None:
+            return None
+        mime_type, _, data = item.partition(b"\n")
+        return data, mime_type.decode()
+
+    def put(self, key, data, mime_type):
+        self.cache.set(key, mime_type.encode() + b"\n" + data)
+
+
+thumbnail_cache = ThumbnailCache()
+
+
+def thumbnail_key(slide_data, image_bytes=None, width=DEFAULT_THUMBNAIL_WIDTH, fmt="PNG", colors=None):
+    """
+    Returns a stable hash of everything that affects the rendered thumbnail.
+    The image is identified by its Unsplash URL when present, else by its bytes.
+    """
+    image_id = slide_data.get("unsplash_image_url")
+    if not image_id and image_bytes:
+        image_id = hashlib.sha256(image_bytes).hexdigest()
+    content = {
+        "title": slide_data.get("title", ""),
+        "content_points": slide_data.get("content_points", []),
+        "photographer": slide_data.get("unsplash_photographer_name"),
+        "credit": slide_data.get("image_credit"),
+        "colors": deck_colors(colors),
+        "image": image_id,
+        "width": width,
+        "format": fmt,
+    }
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def _font(size_px, bold=False):
+    name = "DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf"
+    try:
+        return ImageFont.truetype(name, size_px)
+    except OSError:
+        try:
+            return ImageFont.load_default(size=size_px)
+        except TypeError:  # Pillow < 10.1
+            return ImageFont.load_default()
+
+
+def _wrap(draw, text, font, max_width):
+    lines, current = [], ""
+    for word in str(text).split():
+        candidate = f"{current} {word}".strip()
+        if current and draw.textlength(candidate, font=font) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines
+
+
+def render_slide_thumbnail(slide_data, image=None, width=DEFAULT_THUMBNAIL_WIDTH, fmt="PNG", colors=None):
+    """
+    Draws a content slide (title, bullets, image on the right) at `width` pixels
+    and returns the encoded bytes. `image` is an optional PIL image or stream;
+    `colors` is the deck's Gemini palette, as given to the deck builder.
+    """
+    scale = width / SLIDE_WIDTH_IN  # pixels per inch
+    height = round(SLIDE_HEIGHT_IN * scale)
+
+    def px(inches):
+        return round(inches * scale)
+
+    def pt(points):
+        return max(6, round(points / 72 * scale))
+
+    # Decode the image first: its dominant colors decide the background, as in pptx_builder
+    img_w = px(IMAGE_BOX_IN[2])
+    palette = None
+    if image is not None:
+        stream = None
+        if not isinstance(image, Image.Image):
+            stream = image
+            try:
+                image = decode_image(stream, max_size=(img_w, img_w * 4), mode="RGB", purpose="thumbnail")
+            except ImageTooLarge:
+                image = None
+        if image is not None:
+            palette = image_palette(stream, image=image)
+    background, text_color = choose_slide_colors(colors, palette)
+    background, text_color = hex_to_rgb(background), hex_to_rgb(text_color)
+    canvas = Image.new("RGB", (width, height), background)
+    draw = ImageDraw.Draw(canvas)
+
+    # Title
+    left, top, box_w, box_h = TITLE_BOX_IN
+    font = _font(pt(TITLE_FONT_PT), bold=True)
+    y = px(top)
+    for line in _wrap(draw, slide_data.get("title", "Untitled Slide"), font, px(box_w))[:2]:
+        draw.text((px(left), y), line, font=font, fill=text_color)
+        y += pt(TITLE_FONT_PT) + 2
+
+    # Bullets
+    left, top, box_w, box_h = BODY_BOX_IN
+    font = _font(pt(BODY_FONT_PT))
+    line_h = pt(BODY_FONT_PT) + 2
+    bottom = px(top + box_h)
+    y = px(top)
+    bullet_w = draw.textlength("• ", font=font)
+    for point in slide_data.get("content_points", []):
+        for i, line in enumerate(_wrap(draw, point, font, px(box_w) - bullet_w)):
+            if y + line_h > bottom:
+                break
+            if i == 0:
+                draw.text((px(left), y), "•", font=font, fill=text_color)
+            draw.text((px(left) + bullet_w, y), line, font=font, fill=text_color)
+            y += line_h
+    attribution = image_attribution(slide_data)
+    if attribution and y + line_h <= bottom:
+        draw.text((px(left), y), attribution, font=_font(pt(ATTRIBUTION_FONT_PT)), fill=text_color)
+
+    # Image, placed exactly like pptx_builder: fixed width, height from aspect ratio
+    if image is not None:
+        left, top, _ = IMAGE_BOX_IN
+        img_h = max(1, round(img_w * image.height / image.width))
+        pic = image.convert("RGB")
+        if pic.size != (img_w, img_h):
+            pic = pic.resize((img_w, img_h), Image.BILINEAR)
+        mask = Image.new("L", pic.size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle([(0, 0), pic.size], radius=max(2, img_w // 20), fill=255)
+        canvas.paste(pic, (px(left), px(top)), mask)
+
+    out = BytesIO()
+    canvas.save(out, format=fmt, **({"quality": 80} if fmt == "WEBP" else {"optimize": True}))
+    return out.getvalue()
+
+
+def get_slide_thumbnail(slide_data, image_stream=None, width=DEFAULT_THUMBNAIL_WIDTH, fmt="PNG", cache=thumbnail_cache,
+                        colors=None):
+    """
+    Returns (key, bytes, mime_type) for a slide thumbnail, rendering it only on a cache miss.
+    """
+    fmt = fmt.upper()
+    if fmt not in THUMBNAIL_FORMATS:
+        raise ValueError(f"Unsupported thumbnail format: {fmt}")
+    if not MIN_THUMBNAIL_WIDTH <= width <= MAX_THUMBNAIL_WIDTH:
+        raise ValueError(f"Thumbnail width must be between {MIN_THUMBNAIL_WIDTH} and {MAX_THUMBNAIL_WIDTH} pixels")
+    image_bytes = image_stream.getvalue() if image_stream is not None and not slide_data.get("unsplash_image_url") else None
+    key = thumbnail_key(slide_data, image_bytes, width, fmt, colors)
+    cached = cache.get(key)
+    if cached is not None:
+        return key, cached[0], cached[1]
+    with stage("thumbnail_render"):
+        data = render_slide_thumbnail(slide_data, image_stream, width, fmt, colors)
+    cache.put(key, data, THUMBNAIL_FORMATS[fmt])
+    return key, data, THUMBNAIL_FORMATS[fmt]
@@ -0,0 +1,269 @@
+"""
+Near-duplicate topic cache: reuses a previously generated deck for a paraphrased topic.
+
+Topics are normalized to a set of words (stopwords dropped, plurals folded,
+common abbreviations expanded, so "AI in healthcare" and "Healthcare and
+artificial intelligence" normalize to the same set). A MinHash signature of
+that set is split into LSH bands stored in SQLite; a lookup fetches the topics
+sharing any band and verifies them by exact Jaccard similarity against
+SLIDE_AI_TOPIC_CACHE_THRESHOLD. Lookups touch a handful of indexed rows, so
+they stay sub-millisecond at 100k+ cached topics.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from slide_ai.config import (
+    get_topic_cache_enabled, get_topic_cache_path, get_topic_cache_threshold,
+    get_topic_cache_max_entries, get_topic_cache_adapt,
+)
+from slide_ai.metrics import Histogram, record_cache
+
+NUM_PERM = 64
+BANDS, ROWS = 16, 4  # BANDS * ROWS == NUM_PERM; pairs at Jaccard 0.8 collide in some band >99.9% of the time
+SEED = 0x5EED  # fixed so every process computes the same signatures
+EVICT_EVERY = 256
+
+TOPIC_CACHE_LOOKUP = Histogram(
+    "slide_ai_topic_cache_lookup_seconds", "Near-duplicate topic lookup time.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a an and are as at be by for from how in into is it its of on or the their to vs what why with
+    about introduction intro overview presentation deck slides guide basics
+""".split())
+ABBREVIATIONS = {
+    "ai": ("artificial", "intelligence"),
+    "ml": ("machine", "learning"),
+    "llm": ("large", "language", "model"),
+    "iot": ("internet", "thing"),
+    "vr": ("virtual", "reality"),
+    "ev": ("electric", "vehicle"),
+    "esg": ("environmental", "social", "governance"),
+}
+
+
+def normalize_topic(topic):
+    """
+    Returns the sorted, de-duplicated word set a topic is compared by.
+    """
+    words = set()
+    for word in _WORD_RE.findall(topic.lower()):
+        if word in STOPWORDS:
+            continue
+        if word in ABBREVIATIONS:
+            words.update(ABBREVIATIONS[word])
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return sorted(words)
+
+
+def jaccard(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHasher:
+    """
+    Vectorized MinHash over 64-bit multiply-xorshift hash functions (NumPy).
+    """
+    def __init__(self, num_perm=NUM_PERM, seed=SEED):
+        import numpy as np  # deferred so importing the module stays cheap
+
+        self.np = np
+        rng = np.random.default_rng(seed)
+        self.masks = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.mults = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+
+    def signature(self, words):
+        np = self.np
+        if not words:
+            return np.zeros(len(self.masks), dtype=np.uint32)
+        hashes = np.array([zlib.crc32(word.encode()) for word in words], dtype=np.uint64)
+        # (n_words, num_perm) matrix of hashes; min down each column. uint64 wraps on overflow.
+        mixed = (hashes[:, None] ^ self.masks[None, :]) * self.mults[None, :]
+        return (mixed >> np.uint64(32)).astype(np.uint32).min(axis=0)
+
+    @staticmethod
+    def bands(signature):
+        """
+        Returns one signed 64-bit key per LSH band (SQLite INTEGER range).
+        """
+        data = signature.tobytes()
+        width = ROWS * 4
+        return [
+            int.from_bytes(hashlib.blake2b(bytes([i]) + data[i * width:(i + 1) * width], digest_size=8).digest(),
+                           "little", signed=True)
+            for i in range(BANDS)
+        ]
+
+
+class TopicCache:
+    """
+    SQLite-backed near-duplicate index of generated decks, shared by all worker processes.
+
+        cache = TopicCache()
+        cache.add("AI in healthcare", 5, data)
+        cache.lookup("Healthcare and artificial intelligence", 5)  # -> (data, match)
+    """
+    def __init__(self, path=None, threshold=None, max_entries=None, adapt=None):
+        self.path = path or get_topic_cache_path()
+        self.threshold = get_topic_cache_threshold() if threshold is None else threshold
+        self.max_entries = max_entries or get_topic_cache_max_entries()
+        self.adapt = get_topic_cache_adapt() if adapt is None else adapt
+        self._hasher = None
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS topics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, words TEXT NOT NULL,
+                num_slides INTEGER NOT NULL, data BLOB NOT NULL, created REAL NOT NULL, used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS topics_by_used ON topics (used);
+            CREATE TABLE IF NOT EXISTS topic_bands (band INTEGER NOT NULL, topic_id INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS topic_bands_by_band ON topic_bands (band);
+            CREATE INDEX IF NOT EXISTS topic_bands_by_topic ON topic_bands (topic_id);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def hasher(self):
+        if self._hasher is None:
+            self._hasher = MinHasher()
+        return self._hasher
+
+    def _bands(self, words):
+        return self.hasher.bands(self.hasher.signature(words))
+
+    def add(self, topic, num_slides, data):
+        words = normalize_topic(topic)
+        if not words:
+            return
+        bands = self._bands(words)
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT INTO topics (topic, words, num_slides, data, created, used) VALUES (?, ?, ?, ?, ?, ?)",
+                (topic, " ".join(words), int(num_slides), zlib.compress(json.dumps(data).encode()), now, now),
+            )
+            conn.executemany("INSERT INTO topic_bands (band, topic_id) VALUES (?, ?)",
+                             [(band, cursor.lastrowid) for band in bands])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def lookup(self, topic, num_slides):
+        """
+        Returns (data, match) for the most similar cached deck at or above the
+        threshold that can serve `num_slides` slides, else None. `match` has the
+        cached topic, its similarity and slide count. With adaptation on, a larger
+        cached deck is trimmed to the requested size; otherwise sizes must match.
+        """
+        started = time.perf_counter()
+        try:
+            result = self._lookup(topic, int(num_slides))
+        finally:
+            TOPIC_CACHE_LOOKUP.observe(time.perf_counter() - started)
+        record_cache("topic", result is not None)
+        return result
+
+    def _lookup(self, topic, num_slides):
+        words = normalize_topic(topic)
+        if not words:
+            return None
+        bands = self._bands(words)
+        conn = self._conn()
+        rows = conn.execute(
+            f"SELECT DISTINCT t.id, t.topic, t.words, t.num_slides FROM topic_bands b JOIN topics t ON t.id = b.topic_id"
+            f" WHERE b.band IN ({','.join('?' * len(bands))})",
+            bands,
+        ).fetchall()
+        best = None
+        for topic_id, cached_topic, cached_words, cached_slides in rows:
+            if cached_slides < num_slides or (cached_slides != num_slides and not self.adapt):
+                continue
+            similarity = jaccard(words, cached_words.split())
+            if similarity < self.threshold:
+                continue
+            # Most similar first, then the closest deck size (least trimming)
+            rank = (similarity, -cached_slides)
+            if best is None or rank > best[0]:
+                best = (rank, topic_id, cached_topic, similarity, cached_slides)
+        if best is None:
+            return None
+        _, topic_id, cached_topic, similarity, cached_slides = best
+        row = conn.execute("SELECT data FROM topics WHERE id = ?", (topic_id,)).fetchone()
+        if row is None:
+            return None  # evicted by another process just now
+        conn.execute("UPDATE topics SET used = ? WHERE id = ?", (time.time(), topic_id))
+        data = json.loads(zlib.decompress(row[0]))
+        data["slides"] = data.get("slides", [])[:num_slides]
+        return data, {"topic": cached_topic, "similarity": similarity, "num_slides": cached_slides}
+
+    def evict(self):
+        """
+        Drops the least recently used topics beyond max_entries.
+        """
+        conn = self._conn()
+        count = conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [row[0] for row in conn.execute("SELECT id FROM topics ORDER BY used LIMIT ?", (excess,))]
+            conn.executemany("DELETE FROM topic_bands WHERE topic_id = ?", [(i,) for i in ids])
+            conn.executemany("DELETE FROM topics WHERE id = ?", [(i,) for i in ids])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            "entries": conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0],
+            "threshold": self.threshold,
+            "adapt": self.adapt,
+        }
+
+
+_topic_cache = None
+_topic_cache_lock = threading.Lock()
+
+
+def get_topic_cache():
+    """
+    Returns the process-wide topic cache, or None when SLIDE_AI_TOPIC_CACHE is off.
+    """
+    global _topic_cache
+    if not get_topic_cache_enabled():
+        return None
+    with _topic_cache_lock:
+        if _topic_cache is None:
+            _topic_cache = TopicCache()
+        return _topic_cache
@@ -3,46 +3,337 @@ Handles Unsplash image search and download.
 """
 
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
-def fetch_unsplash_image(query, access_key, orientation="landscape", app_name_for_utm="SlideAI"):
+from slide_ai.async_http import get_async_client
+from slide_ai.config import get_unsplash_api_base
+from slide_ai.layout import IMAGE_BOX_IN, EXPORT_DPI, PREVIEW_DPI
+from slide_ai.metrics import Counter, stage, record_upstream_error
+from slide_ai.singleflight import SingleFlight
+from slide_ai.admission import get_admission, Overloaded, priority, BATCH
+from slide_ai.cache import get_cache
+from slide_ai.hedging import Hedger
+
+SEARCH_TIMEOUT = 10
+DOWNLOAD_TIMEOUT = 15
+# One search request (one unit of API quota) returns this many candidates; 30 is Unsplash's maximum
+CANDIDATES_PER_SEARCH = 30
+ALTERNATIVES_PAGE_SIZE = 6
+# Images of the first few alternatives on a page are downloaded ahead of the user picking one
+PREFETCH_AHEAD = 3
+
+# Unsplash's image CDN resizes and re-encodes on request (w, h, fit, fm, q), so we
+# download each placement at the pixel size it is shown at instead of urls["regular"]
+DYNAMIC_IMAGE_HOSTS = ("images.unsplash.com", "plus.unsplash.com")
+IMAGE_VARIANTS = {
+    "preview": {"w": round(IMAGE_BOX_IN[2] * PREVIEW_DPI), "fit": "max", "fm": "jpg", "q": 75},
+    "export": {"w": round(IMAGE_BOX_IN[2] * EXPORT_DPI), "fit": "max", "fm": "jpg", "q": 85},
+}
+
+IMAGE_DOWNLOAD_BYTES = Counter(
+    "slide_ai_image_download_bytes", "Image bytes downloaded from upstream.", ["placement"],
+)
+
+# Concurrent identical searches / downloads (e.g. slides sharing a query) share one request
+search_flight = SingleFlight("unsplash_search")
+download_flight = SingleFlight("image_download")
+# Candidate lists and downloaded bytes, shared by all workers (failures are not cached)
+search_cache = get_cache("unsplash_search")
+image_cache = get_cache("image")
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="slide-ai-prefetch")
+
+# A search or download still running at the recent p95 is duplicated, within the hedge budget.
+# Admission is taken once around the whole hedged call (see _fetch), not per attempt.
+search_hedger = Hedger("unsplash_search")
+download_hedger = Hedger("image_download")
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def _search_request(query, access_key, orientation):
+    api_url = f"{get_unsplash_api_base()}/search/photos"
+    headers = {"Authorization": f"Client-ID {access_key}", "Accept-Version": "v1"}
+    params = {"query": query, "per_page": CANDIDATES_PER_SEARCH, "orientation": orientation}
+    return api_url, headers, params
+
+
+def _with_utm(url, app_name_for_utm):
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}utm_source={app_name_for_utm}&utm_medium=referral"
+
+
+def _parse_candidates(data, query, app_name_for_utm):
     """
-    Fetches an image URL and attribution from Unsplash based on a query.
-    Returns (image_url, photographer_name, photographer_url_with_utm, error_msg)
+    Returns (candidates, error_msg); each candidate is a dict with id, image_url,
+    thumb_url, photographer_name and photographer_url_with_utm.
     """
+    candidates = [
+        {
+            "id": info.get("id"),
+            "image_url": info["urls"]["regular"],
+            "thumb_url": info["urls"].get("thumb") or info["urls"].get("small"),
+            "photographer_name": info["user"]["name"],
+            "photographer_url_with_utm": _with_utm(info["user"]["links"]["html"], app_name_for_utm),
+        }
+        for info in data.get("results") or []
+    ]
+    if not candidates:
+        return [], f"No image found for '{query}'."
+    return candidates, None
+
+
+def _cache_key(query, orientation, app_name_for_utm):
+    return (normalize_query(query), orientation, app_name_for_utm)
+
+
+def _check_search_args(query, access_key):
     if not access_key:
-        return None, None, None, "Unsplash Access Key not available."
+        return "Unsplash Access Key not available."
     if not query:
-        return None, None, None, "No query provided for Unsplash."
-    api_url = "https://api.unsplash.com/search/photos"
-    headers = {"Authorization": f"Client-ID {access_key}", "Accept-Version": "v1"}
-    params = {"query": query, "per_page": 1, "orientation": orientation}
+        return "No query provided for Unsplash."
+    return None
+
+
+def search_unsplash_candidates(query, access_key, orientation="landscape", app_name_for_utm="SlideAI"):
+    """
+    Returns (candidates, error_msg) for a query, from the shared cache when the
+    same normalized query was searched before.
+    """
+    error = _check_search_args(query, access_key)
+    if error:
+        return [], error
+    key = _cache_key(query, orientation, app_name_for_utm)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached, None
+    return search_flight.do(key + (access_key,), _fetch, query, access_key, orientation, app_name_for_utm)
+
+
+def _search_once(api_url, headers, params):
+    with stage("unsplash_search"):
+        http_response = requests.get(api_url, headers=headers, params=params, timeout=SEARCH_TIMEOUT)
+        http_response.raise_for_status()
+        return http_response.json()
+
+
+def _fetch(query, access_key, orientation, app_name_for_utm):
+    api_url, headers, params = _search_request(query, access_key, orientation)
     try:
-        http_response = requests.get(api_url, headers=headers, params=params, timeout=10)
+        # One admission slot per call, held until the first attempt answers: only
+        # the HTTP request is hedged, so the hedge delay is not eaten by queueing.
+        # A losing attempt here is a blocking request that cannot be aborted; it
+        # keeps its connection, outside the admission limit, until it finishes or
+        # times out. The async paths cancel theirs.
+        with get_admission("unsplash").acquire():
+            data = search_hedger.call(_search_once, api_url, headers, params)
+        candidates, error = _parse_candidates(data, query, app_name_for_utm)
+    except Overloaded as e:
+        # A missing image is not worth failing the deck over
+        return [], str(e)
+    except Exception as e:
+        record_upstream_error("unsplash_search", e)
+        return [], str(e)
+    if candidates:
+        search_cache.set(_cache_key(query, orientation, app_name_for_utm), candidates)
+    return candidates, error
+
+
+async def asearch_unsplash_candidates(query, access_key, orientation="landscape", app_name_for_utm="SlideAI", client=None):
+    """
+    Async version of search_unsplash_candidates.
+    """
+    error = _check_search_args(query, access_key)
+    if error:
+        return [], error
+    key = _cache_key(query, orientation, app_name_for_utm)
+    cached = await search_cache.aget(key)
+    if cached is not None:
+        return cached, None
+    return await search_flight.ado(key + (access_key,), _afetch, query, access_key, orientation, app_name_for_utm, client)
+
+
+async def _asearch_once(client, api_url, headers, params):
+    with stage("unsplash_search"):
+        http_response = await client.get(api_url, headers=headers, params=params, timeout=SEARCH_TIMEOUT)
         http_response.raise_for_status()
-        data = http_response.json()
-        if data.get("results") and len(data["results"]) > 0:
-            image_info = data["results"][0]
-            image_url = image_info["urls"]["regular"]
-            photographer_name = image_info["user"]["name"]
-            base_photographer_url = image_info["user"]["links"]["html"]
-            if "?" in base_photographer_url:
-                photographer_url_with_utm = f"{base_photographer_url}&utm_source={app_name_for_utm}&utm_medium=referral"
-            else:
-                photographer_url_with_utm = f"{base_photographer_url}?utm_source={app_name_for_utm}&utm_medium=referral"
-            return image_url, photographer_name, photographer_url_with_utm, None
-        else:
-            return None, None, None, f"No image found for '{query}'."
+        return http_response.json()
+
+
+async def _afetch(query, access_key, orientation, app_name_for_utm, client):
+    api_url, headers, params = _search_request(query, access_key, orientation)
+    try:
+        client = client or get_async_client()
+        async with get_admission("unsplash").aacquire():
+            data = await search_hedger.acall(_asearch_once, client, api_url, headers, params)
+        candidates, error = _parse_candidates(data, query, app_name_for_utm)
+    except Overloaded as e:
+        return [], str(e)
     except Exception as e:
-        return None, None, None, str(e)
+        record_upstream_error("unsplash_search", e)
+        return [], str(e)
+    if candidates:
+        await search_cache.aset(_cache_key(query, orientation, app_name_for_utm), candidates)
+    return candidates, error
+
+
+def _first_candidate(result):
+    candidates, error = result
+    if not candidates:
+        return None, None, None, error
+    first = candidates[0]
+    return first["image_url"], first["photographer_name"], first["photographer_url_with_utm"], None
 
-def download_image_to_stream(image_url):
+
+def fetch_unsplash_image(query, access_key, orientation="landscape", app_name_for_utm="SlideAI"):
+    """
+    Fetches an image URL and attribution from Unsplash based on a query.
+    Returns (image_url, photographer_name, photographer_url_with_utm, error_msg)
+    """
+    return _first_candidate(search_unsplash_candidates(query, access_key, orientation, app_name_for_utm))
+
+
+async def afetch_unsplash_image(query, access_key, orientation="landscape", app_name_for_utm="SlideAI", client=None):
+    """
+    Async version of fetch_unsplash_image with the same return tuple.
+    """
+    return _first_candidate(await asearch_unsplash_candidates(query, access_key, orientation, app_name_for_utm, client))
+
+
+def _page(candidates, error, offset, limit):
+    total = len(candidates)
+    if not total:
+        return {"candidates": [], "offset": 0, "next_offset": None, "total": 0, "error": error}
+    offset = max(0, offset) % total
+    page = candidates[offset:offset + limit]
+    prefetch_images([candidate["image_url"] for candidate in page[:PREFETCH_AHEAD]])
+    # Wraps around, so "different image" keeps cycling through the same quota-free list
+    next_offset = offset + limit if offset + limit < total else 0
+    return {"candidates": page, "offset": offset, "next_offset": next_offset, "total": total, "error": None}
+
+
+def get_unsplash_alternatives(query, access_key, offset=0, limit=ALTERNATIVES_PAGE_SIZE,
+                              orientation="landscape", app_name_for_utm="SlideAI"):
+    """
+    Returns one page of alternative images for a query from the cached candidate
+    list (searching only if the query is not cached yet), and starts downloading
+    the first few in the background so swapping to one of them is instant.
+    """
+    candidates, error = search_unsplash_candidates(query, access_key, orientation, app_name_for_utm)
+    return _page(candidates, error, offset, limit)
+
+
+async def aget_unsplash_alternatives(query, access_key, offset=0, limit=ALTERNATIVES_PAGE_SIZE,
+                                     orientation="landscape", app_name_for_utm="SlideAI", client=None):
+    """
+    Async version of get_unsplash_alternatives.
+    """
+    candidates, error = await asearch_unsplash_candidates(query, access_key, orientation, app_name_for_utm, client)
+    return _page(candidates, error, offset, limit)
+
+
+def _prefetch(image_url, placement):
+    # Below interactive traffic in the Unsplash admission queue
+    with priority(BATCH):
+        download_image_to_stream(image_url, placement)
+
+
+def prefetch_images(image_urls, placement="preview"):
+    """
+    Downloads images into the shared image cache in the background.
+    """
+    for image_url in image_urls:
+        if image_url:
+            _prefetch_executor.submit(_prefetch, image_url, placement)
+
+
+def sized_image_url(image_url, placement=None):
+    """
+    Returns the URL of the variant of an Unsplash image sized for `placement`
+    ("preview" or "export"). Other URLs, and placement None, are returned unchanged.
+    """
+    variant = IMAGE_VARIANTS.get(placement)
+    if not image_url or variant is None:
+        return image_url
+    parts = urlsplit(image_url)
+    if parts.hostname not in DYNAMIC_IMAGE_HOSTS:
+        return image_url
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in variant]
+    query += [(k, str(v)) for k, v in variant.items()]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def download_image_to_stream(image_url, placement=None):
+    """
+    Downloads an image, as the variant sized for `placement` when the host
+    supports it. Variants are cached separately. Returns a BytesIO or None.
+    """
     if not image_url:
         return None
+    image_url = sized_image_url(image_url, placement)
+    # The flight shares immutable bytes; every caller gets its own stream over them
+    data = image_cache.get(image_url)
+    if data is None:
+        data = download_flight.do(image_url, _download, image_url, placement)
+    return BytesIO(data) if data is not None else None
+
+
+def _download_once(image_url):
+    with stage("image_download"):
+        response = requests.get(image_url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+
+
+def _download(image_url, placement):
     try:
-        response = requests.get(image_url, stream=True, timeout=15)
+        # One slot per call, as in _fetch (a losing attempt runs on outside it)
+        with get_admission("unsplash").acquire():
+            data = download_hedger.call(_download_once, image_url)
+        IMAGE_DOWNLOAD_BYTES.inc(len(data), placement=placement or "original")
+        image_cache.set(image_url, data)
+        return data
+    except Overloaded:
+        return None
+    except Exception as e:
+        record_upstream_error("image_download", e)
+        return None
+
+
+async def adownload_image_to_stream(image_url, client=None, placement=None):
+    """
+    Async version of download_image_to_stream; returns a BytesIO or None.
+    """
+    if not image_url:
+        return None
+    image_url = sized_image_url(image_url, placement)
+    data = await image_cache.aget(image_url)
+    if data is None:
+        data = await download_flight.ado(image_url, _adownload, image_url, client, placement)
+    return BytesIO(data) if data is not None else None
+
+
+async def _adownload_once(client, image_url):
+    with stage("image_download"):
+        response = await client.get(image_url, timeout=DOWNLOAD_TIMEOUT)
         response.raise_for_status()
-        image_stream = BytesIO(response.content)
-        return image_stream
-    except Exception:
+        return response.content
+
+
+async def _adownload(image_url, client, placement):
+    try:
+        client = client or get_async_client()
+        async with get_admission("unsplash").aacquire():
+            data = await download_hedger.acall(_adownload_once, client, image_url)
+        IMAGE_DOWNLOAD_BYTES.inc(len(data), placement=placement or "original")
+        await image_cache.aset(image_url, data)
+        return data
+    except Overloaded:
+        return None
+    except Exception as e:
+        record_upstream_error("image_download", e)
         return None
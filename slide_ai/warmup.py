@@ -0,0 +1,98 @@
+"""
+Lazily loaded heavy dependencies with optional background warm-up and readiness reporting.
+"""
+import threading
+import time
+
+from slide_ai.logs import log_event
+
+COLD, LOADING, READY, FAILED = "cold", "loading", "ready", "failed"
+
+_resources = {}
+_resources_lock = threading.Lock()
+
+
+class LazyResource:
+    """
+    Loads `loader()` on first use, once, and keeps the result. Endpoints call
+    get(); warm-up calls the same thing from a background thread, so a request
+    arriving mid-load simply waits for that load instead of starting another.
+
+        rembg_session = LazyResource("rembg", _load_rembg)
+        remove, session = rembg_session.get()
+    """
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self.state = COLD
+        self.error = None
+        self.load_seconds = None
+        with _resources_lock:
+            _resources[name] = self
+
+    def get(self):
+        if self.state == READY:
+            return self._value
+        with self._lock:
+            if self.state != READY:
+                self.state = LOADING
+                start = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    self.state, self.error = FAILED, str(e)
+                    log_event("resource_load_failed", name=self.name, error=str(e))
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                self.state, self.error = READY, None
+                log_event("resource_loaded", name=self.name, seconds=round(self.load_seconds, 3))
+        return self._value
+
+    def status(self):
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+
+_warmup = {"names": (), "thread": None}
+
+
+def start_warmup(names=None, delay=0.0):
+    """
+    Loads the named resources (all registered ones by default) on a daemon
+    thread after `delay` seconds, giving the server time to bind its port and
+    answer liveness probes first. Returns the thread.
+    """
+    with _resources_lock:
+        names = tuple(_resources) if names is None else tuple(name for name in names if name in _resources)
+    _warmup["names"] = names
+
+    def run():
+        if delay:
+            time.sleep(delay)
+        for name in names:
+            try:
+                _resources[name].get()
+            except Exception:
+                pass  # recorded on the resource and reported by readiness()
+
+    thread = threading.Thread(target=run, name="slide-ai-warmup", daemon=True)
+    _warmup["thread"] = thread
+    thread.start()
+    return thread
+
+
+def readiness():
+    """
+    Returns (ready, details). Ready once every resource selected for warm-up is
+    loaded; resources left for lazy loading on first use do not block readiness.
+    """
+    with _resources_lock:
+        resources = dict(_resources)
+    names = _warmup["names"]
+    ready = all(resources[name].state == READY for name in names)
+    return ready, {
+        "ready": ready,
+        "warmup": list(names),
+        "resources": {name: resource.status() for name, resource in resources.items()},
+    }
@@ -0,0 +1,45 @@
+"""
+Shared test setup: the project root on sys.path, artifacts in a temporary
+directory and the in-memory shared cache, so tests never touch the working tree.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("SLIDE_AI_CACHE_BACKEND", "memory")
+os.environ.setdefault("SLIDE_AI_ARTIFACT_DIR", tempfile.mkdtemp(prefix="slide-ai-tests-"))
+
+
+def run_python(code, timeout=120, **env):
+    """
+    Runs `code` in a fresh interpreter from the project root, with `env` added to
+    the environment, and returns its stdout (for measurements that must not
+    share a process: peak RSS, import state, hash seeds).
+    """
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                            timeout=timeout, env=dict(os.environ, PYTHONPATH=PROJECT_ROOT, **env))
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+@pytest.fixture
+def fake_upstreams(monkeypatch):
+    """
+    Local Gemini and Unsplash stand-ins (benchmarks.fake_upstreams) with the app
+    pointed at them. Latency dominates and images are small, so timings measure
+    how requests overlap rather than how fast this machine renders.
+    """
+    from benchmarks.fake_upstreams import FakeUpstreams, UpstreamConfig
+    config = UpstreamConfig(gemini_latency=0.5, search_latency=0.1, download_latency=0.1, jitter=0.0,
+                            image_width=320, image_height=240)
+    with FakeUpstreams(config) as fake:
+        for key, value in fake.env().items():
+            monkeypatch.setenv(key, value)
+        yield fake
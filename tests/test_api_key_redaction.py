@@ -0,0 +1,94 @@
+"""
+The Gemini key is sent in a header and failed generations answer with a generic
+error, so the key never reaches a client, a log line or the call log.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+SECRET_KEY = "secret-test-key-0123456789"
+
+
+@pytest.fixture
+def rejecting_gemini(monkeypatch, tmp_path):
+    """
+    A Gemini stand-in that rejects every call with 400, like an invalid key does;
+    yields the list of (path, x-goog-api-key header) it received.
+    """
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            seen.append((self.path, self.headers.get("x-goog-api-key")))
+            body = json.dumps({"error": {"code": 400, "message": "API key not valid."}}).encode()
+            self.send_response(400)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("GEMINI_API_BASE", f"http://127.0.0.1:{server.server_address[1]}/v1beta")
+    monkeypatch.setenv("GOOGLE_API_KEY", SECRET_KEY)
+    monkeypatch.setenv("UNSPLASH_ACCESS_KEY", "unused")
+    # A fresh router, so its call log holds only this test's attempts
+    from slide_ai import gemini_routing
+    monkeypatch.setenv("SLIDE_AI_GEMINI_CALL_DB", str(tmp_path / "gemini_calls.sqlite3"))
+    monkeypatch.setattr(gemini_routing, "_router", None)
+    try:
+        yield seen
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _assert_redacted(seen, body, caplog, capsys):
+    assert seen, "the fake Gemini was never called"
+    assert all(SECRET_KEY not in path and header == SECRET_KEY for path, header in seen), seen
+    assert SECRET_KEY not in body
+    assert SECRET_KEY not in caplog.text
+    captured = capsys.readouterr()
+    assert SECRET_KEY not in captured.out + captured.err
+    from slide_ai.gemini_routing import get_router
+    with sqlite3.connect(get_router().log.path) as conn:
+        errors = [row[0] for row in conn.execute("SELECT error FROM gemini_calls WHERE error IS NOT NULL")]
+    assert errors and all(SECRET_KEY not in error and error.endswith(" 400") for error in errors), errors
+
+
+def test_flask_generate_does_not_leak_the_key(rejecting_gemini, caplog, capsys):
+    from server.app import app
+    caplog.set_level(logging.DEBUG)
+    response = app.test_client().post("/api/generate", json={"topic": "flask key redaction", "num_slides": 3})
+    assert response.status_code == 500
+    assert "traceback" not in response.get_json()
+    _assert_redacted(rejecting_gemini, response.get_data(as_text=True), caplog, capsys)
+
+
+def test_fastapi_generate_does_not_leak_the_key(rejecting_gemini, caplog, capsys):
+    httpx = pytest.importorskip("httpx")
+    pytest.importorskip("fastapi")
+    from slide_ai.async_http import close_async_client
+    from webapp.main import app
+    caplog.set_level(logging.DEBUG)
+
+    async def generate():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            response = await client.post("/api/generate", json={"topic": "fastapi key redaction", "num_slides": 3})
+        await close_async_client()
+        return response
+
+    response = asyncio.run(generate())
+    assert response.status_code == 500
+    assert "traceback" not in response.json()
+    _assert_redacted(rejecting_gemini, response.text, caplog, capsys)
@@ -0,0 +1,73 @@
+"""
+The FastAPI app awaits Gemini and Unsplash and runs PIL work off the event loop,
+so concurrent generations overlap and the loop keeps answering while they run.
+Overlap is checked at the fake upstreams (requests served at once, requests
+made), not by timing the run.
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+httpx = pytest.importorskip("httpx")
+
+CONCURRENCY = 8
+SLIDES = 3
+# Longest acceptable stall of the event loop while requests are in flight: half
+# a fake Gemini call, so only a loop blocked on upstream or CPU work trips it
+MAX_LOOP_LAG = 0.25
+
+
+async def _generate(client, topic):
+    response = await client.post("/api/generate", json={"topic": topic, "num_slides": SLIDES})
+    assert response.status_code == 200, response.text
+    assert all(slide["thumbnail_url"] for slide in response.json()["slides"])
+
+
+async def _run_load(app, topics):
+    """
+    Runs one generation per topic concurrently; returns the worst loop lag.
+    """
+    from slide_ai.async_http import close_async_client
+    loop = asyncio.get_running_loop()
+    lags, done = [], asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = loop.time()
+            await asyncio.sleep(0.01)
+            lags.append(loop.time() - start - 0.01)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        watcher = asyncio.ensure_future(ticker())
+        await asyncio.gather(*(_generate(client, topic) for topic in topics))
+        done.set()
+        await watcher
+    await close_async_client()
+    return max(lags)
+
+
+def _requests(before, after, route):
+    return after.get(route, {}).get("requests", 0) - before.get(route, {}).get("requests", 0)
+
+
+def test_concurrent_generations_overlap_without_blocking_the_loop(fake_upstreams, monkeypatch):
+    from slide_ai.admission import get_admission
+    from webapp.main import app
+    # Distinct topics and no near-duplicate matching, so no cache short-circuits a request
+    monkeypatch.setenv("SLIDE_AI_TOPIC_CACHE", "0")
+    asyncio.run(_run_load(app, ["load warmup"]))
+    fake_upstreams.peak_in_flight(reset=True)
+    before = fake_upstreams.route_stats()
+    lag = asyncio.run(_run_load(app, [f"load topic {i}" for i in range(CONCURRENCY)]))
+    after, peaks = fake_upstreams.route_stats(), fake_upstreams.peak_in_flight()
+
+    # One Gemini call and one search per slide for every generation, none repeated
+    assert _requests(before, after, "gemini") == CONCURRENCY
+    assert _requests(before, after, "search") == CONCURRENCY * SLIDES
+    # Serialized requests would never have two upstream calls open at once; Gemini
+    # fills its admission limit and no more
+    assert peaks.get("gemini") == min(CONCURRENCY, get_admission("gemini").limit), peaks
+    assert peaks.get("search", 0) > 1 and peaks.get("download", 0) > 1, peaks
+    assert lag < MAX_LOOP_LAG, lag
@@ -0,0 +1,41 @@
+"""
+The Flask app imports without its heavy dependencies, answers liveness at once,
+and reports ready only after background warm-up has loaded them.
+"""
+import json
+
+import pytest
+
+from tests.conftest import run_python
+
+pytest.importorskip("flask")
+
+# Loaded by endpoints or warm-up, never by importing the app
+HEAVY_MODULES = ("PIL", "pptx", "lxml", "numpy", "rembg", "onnxruntime", "google.generativeai")
+# Generous: a cold import of Flask and the app's own modules takes well under a second
+MAX_IMPORT_SECONDS = 3.0
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import server.app as server
+import_seconds = time.perf_counter() - start
+loaded = [name for name in HEAVY if name in sys.modules]
+client = server.app.test_client()
+live = client.get("/healthz").status_code
+thread = server.start_warmup(["pipeline"])
+thread.join(60)
+ready = client.get("/readyz")
+print(json.dumps({"import_seconds": import_seconds, "loaded": loaded, "live": live,
+                  "ready": ready.status_code, "pipeline": ready.get_json()["resources"]["pipeline"]["state"],
+                  "loaded_after_warmup": [name for name in HEAVY if name in sys.modules]}))
+"""
+
+
+def test_import_defers_heavy_dependencies_until_warmup():
+    result = json.loads(run_python(CHILD.replace("HEAVY", repr(HEAVY_MODULES))).splitlines()[-1])
+    assert result["loaded"] == [], result
+    assert result["import_seconds"] < MAX_IMPORT_SECONDS, result
+    assert result["live"] == 200
+    assert (result["ready"], result["pipeline"]) == (200, "ready"), result
+    assert {"PIL", "pptx"} <= set(result["loaded_after_warmup"])
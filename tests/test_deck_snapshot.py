@@ -0,0 +1,76 @@
+"""
+Uploaded snapshots are checked before they are stored: a slide table that
+points outside the file or at a missing image is rejected with 400 up front,
+not stored and failed later when a preview or deck is rendered from it.
+"""
+import asyncio
+
+import pytest
+
+from slide_ai.deck_snapshot import _HEADER, _SLIDE, DeckSnapshot, import_snapshot, write_snapshot
+
+IMAGES = [b"first image bytes", b"second image bytes"]
+
+
+@pytest.fixture
+def snapshot_bytes(tmp_path):
+    slides = [{"title": f"Slide {i}", "content_points": ["point"]} for i in range(3)]
+    path = tmp_path / "deck.slds"
+    write_snapshot(str(path), slides, "Tampering", {"background": "#FFFFFF"}, {}, images=IMAGES + [None])
+    return path.read_bytes()
+
+
+def _set_slide_entry(data, index, offset=None, length=None, image_index=None):
+    slides_off = _HEADER.unpack_from(data, 0)[7]
+    entry = list(_SLIDE.unpack_from(data, slides_off + index * _SLIDE.size))
+    for i, value in enumerate((offset, length, image_index)):
+        if value is not None:
+            entry[i] = value
+    data = bytearray(data)
+    _SLIDE.pack_into(data, slides_off + index * _SLIDE.size, *entry)
+    return bytes(data)
+
+
+def test_valid_snapshot_is_imported(snapshot_bytes):
+    snapshot_id = import_snapshot(snapshot_bytes)
+    with DeckSnapshot(snapshot_bytes) as snapshot:
+        assert snapshot.id == snapshot_id
+        assert snapshot.slide_image(1).getvalue() == IMAGES[1]
+        assert snapshot.slide_image(2) is None
+
+
+@pytest.mark.parametrize("tamper", [
+    {"image_index": 5},                # a missing image
+    {"image_index": 1},                # another slide's image
+    {"offset": 1 << 40},               # a record outside the file
+    {"length": 1 << 30},
+])
+def test_tampered_slide_table_is_rejected(snapshot_bytes, tamper):
+    data = _set_slide_entry(snapshot_bytes, 0, **tamper)
+    with pytest.raises(ValueError):
+        import_snapshot(data)
+
+
+def test_reader_raises_value_error_for_a_missing_image(snapshot_bytes):
+    with DeckSnapshot(_set_slide_entry(snapshot_bytes, 0, image_index=5)) as snapshot:
+        with pytest.raises(ValueError, match="Corrupt deck snapshot"):
+            snapshot.slide_image(0)
+
+
+def test_tampered_upload_is_a_client_error(snapshot_bytes):
+    data = _set_slide_entry(snapshot_bytes, 0, image_index=5)
+    from server.app import app
+    response = app.test_client().post("/api/snapshots", data=data)
+    assert response.status_code == 400, response.get_data(as_text=True)
+
+    httpx = pytest.importorskip("httpx")
+    pytest.importorskip("fastapi")
+    from webapp.main import app as fastapi_app
+
+    async def upload():
+        transport = httpx.ASGITransport(app=fastapi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/snapshots", content=data)
+
+    response = asyncio.run(upload())
+    assert response.status_code == 400, response.text
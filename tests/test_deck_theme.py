@@ -0,0 +1,135 @@
+"""
+Colors, fonts and text styles live once in the deck's theme and slide master,
+so content slides carry only their text: smaller slide XML, and no slower to
+build, than formatting every run as the builder used to. Slides whose image
+clashes with the deck background override the color once per placeholder.
+"""
+import re
+import time
+import zipfile
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip("pptx")
+Image = pytest.importorskip("PIL.Image")
+
+from pptx import Presentation
+from pptx.dml.color import RGBColor
+from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
+from pptx.util import Pt
+
+from benchmarks.fake_upstreams import fake_deck
+from slide_ai.layout import apply_background_color
+from slide_ai.pptx_builder import DeckBuilder, create_pptx_with_unsplash
+
+SLIDES = 30
+# Per-run formatting does everything the themed build does and more; this only absorbs noise
+BUILD_TIME_MARGIN = 1.25
+
+
+def _slide_xml_bytes(path):
+    with zipfile.ZipFile(path) as z:
+        return {name: z.read(name) for name in z.namelist() if re.fullmatch(r"ppt/slides/slide\d+\.xml", name)}
+
+
+def _format_slide(slide, colors, fonts):
+    # What the builder did before the theme: background, alignment, font, size,
+    # weight and color set on every slide and paragraph
+    background = RGBColor.from_string(colors["background"].lstrip("#"))
+    text = RGBColor.from_string(colors["text"].lstrip("#"))
+    apply_background_color(slide, tuple(background))
+    for shape in slide.placeholders:
+        is_title = shape == slide.shapes.title
+        shape.text_frame.vertical_anchor = MSO_ANCHOR.TOP
+        for paragraph in shape.text_frame.paragraphs:
+            paragraph.alignment = PP_ALIGN.LEFT
+            for run in paragraph.runs:
+                run.font.name = fonts["heading" if is_title else "body"]
+                run.font.size = Pt(32 if is_title else 18)
+                run.font.bold = is_title
+                run.font.color.rgb = text
+
+
+def _format_runs(path, out_path, colors, fonts):
+    prs = Presentation(path)
+    for slide in prs.slides:
+        _format_slide(slide, colors, fonts)
+    prs.save(out_path)
+
+
+class _PerRunBuilder(DeckBuilder):
+    def __init__(self, topic, colors=None, fonts=None):
+        super().__init__(topic, colors=colors, fonts=fonts)
+        self.fonts = fonts
+
+    def add_slide(self, slide_data, image_stream=None):
+        slide = super().add_slide(slide_data, image_stream)
+        _format_slide(slide, self.colors, self.fonts)
+        return slide
+
+
+def _build_seconds(builder_cls, deck, path, repeat=3):
+    # Best of a few builds, so a busy machine does not decide the comparison
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        builder = builder_cls("Theme time", colors=deck["colors"], fonts=deck["fonts"])
+        for slide in deck["slides"]:
+            builder.add_slide(slide)
+        builder.save(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _white_png():
+    # The same color as the deck background, so every image slide overrides its colors
+    stream = BytesIO()
+    Image.new("RGB", (400, 300), (250, 250, 250)).save(stream, format="PNG")
+    stream.seek(0)
+    return stream
+
+
+def _assert_smaller_than_per_run(themed, per_run, deck):
+    _format_runs(themed, per_run, deck["colors"], deck["fonts"])
+    themed_xml, per_run_xml = _slide_xml_bytes(themed), _slide_xml_bytes(per_run)
+    assert len(themed_xml) == SLIDES + 2  # title and closing slides
+    themed_size, per_run_size = sum(map(len, themed_xml.values())), sum(map(len, per_run_xml.values()))
+    assert themed_size < 0.8 * per_run_size, (themed_size, per_run_size)
+    return themed_xml
+
+
+def test_themed_slides_are_smaller_than_per_run_formatting(tmp_path):
+    deck = fake_deck("Theme size", SLIDES)
+    themed = create_pptx_with_unsplash(deck["slides"], "Theme size", filename=str(tmp_path / "themed.pptx"),
+                                       colors=deck["colors"], fonts=deck["fonts"])
+    themed_xml = _assert_smaller_than_per_run(themed, str(tmp_path / "per_run.pptx"), deck)
+    # Nothing the master provides is repeated on the slides
+    for name, xml in themed_xml.items():
+        assert b"<p:bg>" not in xml, name
+        assert b"<a:latin" not in xml and b' sz="' not in xml, name
+
+
+def test_clashing_images_override_colors_per_placeholder(tmp_path):
+    deck = fake_deck("Theme clash", SLIDES)
+    for slide in deck["slides"]:
+        slide["actual_image_stream"] = _white_png()
+    themed = create_pptx_with_unsplash(deck["slides"], "Theme clash", filename=str(tmp_path / "themed.pptx"),
+                                       colors=deck["colors"], fonts=deck["fonts"])
+    themed_xml = _assert_smaller_than_per_run(themed, str(tmp_path / "per_run.pptx"), deck)
+    overridden = [name for name, xml in themed_xml.items() if b"<p:bg>" in xml]
+    assert len(overridden) == SLIDES, overridden
+    for name, xml in themed_xml.items():
+        # The slide's text color sits in each placeholder's list style, never on a run
+        assert not re.search(rb"<a:rPr[^>]*>\s*<a:solidFill", xml), name
+        assert b"<a:latin" not in xml and b' sz="' not in xml, name
+        if name in overridden:
+            assert re.search(rb"<a:lstStyle>\s*<a:lvl1pPr>\s*<a:defRPr>\s*<a:solidFill", xml), name
+
+
+def test_themed_build_is_no_slower_than_per_run_formatting(tmp_path):
+    deck = fake_deck("Theme time", SLIDES)
+    themed = _build_seconds(DeckBuilder, deck, str(tmp_path / "themed.pptx"))
+    per_run = _build_seconds(_PerRunBuilder, deck, str(tmp_path / "per_run.pptx"))
+    assert themed < per_run * BUILD_TIME_MARGIN, (themed, per_run)
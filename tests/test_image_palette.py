@@ -0,0 +1,46 @@
+"""
+Slide colors are picked from each image's palette; images in any mode (here a
+palette-mode PNG, as GIFs and optimized PNGs decode) get a palette and a slide.
+"""
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip("pptx")
+Image = pytest.importorskip("PIL.Image")
+
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+from benchmarks.fake_upstreams import fake_deck
+from slide_ai.image_decode import decode_image
+from slide_ai.palette import image_palette
+from slide_ai.pptx_builder import create_pptx_with_unsplash
+
+
+def _palette_png(width=400, height=300):
+    # Small enough to be placed without resampling, so it reaches the palette still in "P" mode
+    image = Image.new("RGB", (width, height), (20, 40, 200))
+    image.paste((240, 200, 30), (0, 0, width // 2, height))
+    stream = BytesIO()
+    image.quantize(colors=16).save(stream, format="PNG")
+    stream.seek(0)
+    return stream
+
+
+def test_palette_of_palette_mode_image():
+    stream = _palette_png()
+    image = decode_image(stream, max_size=(1000, 1000), purpose="test")
+    assert image.mode == "P"
+    palette = image_palette(stream, image=image)
+    assert {color for color, _ in palette[:2]} == {"1428C8", "F0C81E"}, palette
+
+
+def test_deck_with_palette_mode_image(tmp_path):
+    deck = fake_deck("Palette mode", 2)
+    for slide in deck["slides"]:
+        slide["actual_image_stream"] = _palette_png()
+    path = create_pptx_with_unsplash(deck["slides"], "Palette mode", filename=str(tmp_path / "deck.pptx"),
+                                     colors=deck["colors"], fonts=deck["fonts"])
+    pictures = [shape for slide in Presentation(path).slides for shape in slide.shapes if shape.shape_type == MSO_SHAPE_TYPE.PICTURE]
+    assert len(pictures) == 2
@@ -0,0 +1,69 @@
+"""
+Checks for slide_ai.prompt_enhancer over the synthetic corpus of
+benchmarks.prompt_bench: the matcher looks each word up once instead of
+scanning the prompt for every keyword, the LRU cache answers repeated prompts,
+and styles are the same in every process. Work is counted rather than timed,
+so a busy machine cannot fail these.
+"""
+from benchmarks.prompt_bench import make_corpus, uncached_enhance
+from slide_ai import prompt_enhancer
+from slide_ai.prompt_enhancer import CATEGORIES
+from tests.conftest import run_python
+
+CORPUS = make_corpus(20000, 2000)
+
+
+class _CountingDict(dict):
+    lookups = 0
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+
+def _legacy_keyword_scans(prompt):
+    # Substring scans of the whole prompt the old handler made before its first match
+    prompt_lower, scans = prompt.lower(), 0
+    for _, keywords, _ in CATEGORIES:
+        for keyword in keywords:
+            scans += 1
+            if keyword in prompt_lower:
+                return scans
+    return scans
+
+
+def test_matcher_looks_up_each_word_once(monkeypatch):
+    table = _CountingDict(prompt_enhancer._KEYWORD_PRIORITY)
+    monkeypatch.setattr(prompt_enhancer, "_KEYWORD_PRIORITY", table)
+    lookups = scans = 0
+    for prompt in sorted(set(CORPUS)):
+        before = table.lookups
+        prompt_enhancer.classify_prompt(prompt)
+        # At most the word and its singular, however many keywords there are
+        assert table.lookups - before <= 2 * len(prompt.split()), prompt
+        lookups += table.lookups - before
+        scans += _legacy_keyword_scans(prompt)
+    # Each lookup is one hash probe; each scan searched the whole prompt
+    assert lookups < scans / 2, (lookups, scans)
+
+
+def test_cache_answers_repeated_prompts():
+    prompt_enhancer.enhance_prompt.cache_clear()
+    for prompt in CORPUS:
+        prompt_enhancer.enhance_prompt(prompt)
+    info = prompt_enhancer.enhance_prompt.cache_info()
+    # The corpus repeats each distinct prompt about ten times; each is classified once
+    assert info.misses == len(set(CORPUS)) <= prompt_enhancer.ENHANCE_CACHE_SIZE
+    assert info.hits == len(CORPUS) - info.misses
+
+
+def test_batch_matches_single_prompts():
+    batch = CORPUS[:prompt_enhancer.MAX_BATCH_PROMPTS]
+    assert prompt_enhancer.enhance_prompts(batch) == [uncached_enhance(prompt) for prompt in batch]
+
+
+def test_styles_do_not_depend_on_the_hash_seed():
+    code = ("from benchmarks.prompt_bench import make_corpus\n"
+            "from slide_ai.prompt_enhancer import enhance_prompt\n"
+            "print('\\n'.join(enhance_prompt(p) for p in make_corpus(200, 200)))")
+    assert run_python(code, PYTHONHASHSEED="1") == run_python(code, PYTHONHASHSEED="2")
@@ -0,0 +1,49 @@
+"""
+build_deck_streaming holds one source image at a time, so peak memory does not
+grow with the number of slides.
+"""
+import json
+
+import pytest
+
+from tests.conftest import run_python
+
+pytest.importorskip("pptx")
+pytest.importorskip("PIL")
+
+# Builds a short deck, then a long one, in the same fresh process and reports
+# the peak RSS after each. Every slide gets its own copy of a large JPEG, as a
+# download would, so a builder that kept them alive would grow by one image per slide.
+CHILD = """
+import json, os, resource, sys, tempfile
+from io import BytesIO
+from PIL import Image
+from slide_ai.pptx_builder import build_deck_streaming
+
+def peak_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+buf = BytesIO()
+Image.effect_noise((2400, 1600), 64).convert("RGB").save(buf, "JPEG", quality=95)
+source = buf.getvalue()
+out = tempfile.mkdtemp()
+
+def build(n):
+    slides = [{"title": f"Slide {i}", "content_points": ["a", "b", "c"]} for i in range(n)]
+    build_deck_streaming(slides, "RSS", lambda slide: BytesIO(bytes(bytearray(source))),
+                         filename=os.path.join(out, f"deck_{n}.pptx"))
+
+build(3)
+short = peak_mb()
+build(SLIDES)
+print(json.dumps({"image_mb": len(source) / 2 ** 20, "short": short, "long": peak_mb()}))
+"""
+
+
+def test_peak_rss_does_not_grow_with_slide_count():
+    slides = 25
+    result = json.loads(run_python(CHILD.replace("SLIDES", str(slides)), timeout=300).splitlines()[-1])
+    growth = result["long"] - result["short"]
+    # Holding every source would add (slides - 3) images; allow a few for allocator slack
+    assert growth < 5 * result["image_mb"], result
@@ -2,14 +2,26 @@
 FastAPI API endpoints for AI Slide Generator (for React+Tailwind frontend).
 """
 from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel
-from slide_ai.config import get_gemini_api_key, get_unsplash_access_key
-from slide_ai.gemini_api import generate_slide_content
-from slide_ai.unsplash_api import fetch_unsplash_image, download_image_to_stream
+from fastapi.responses import JSONResponse, StreamingResponse, Response, FileResponse
+from pydantic import BaseModel, Field
+from slide_ai.config import get_gemini_api_key, get_unsplash_access_key, get_snapshot_max_upload_bytes
+from slide_ai.gemini_api import agenerate_slide_content
 from slide_ai.pptx_builder import create_pptx_with_unsplash
-from PIL import Image
-from slide_ai.image_editor import add_rounded_corners, pil_image_to_stream
+from slide_ai.pipeline import aattach_slide_preview, render_snapshot_previews
+from slide_ai.unsplash_api import aget_unsplash_alternatives, ALTERNATIVES_PAGE_SIZE, CANDIDATES_PER_SEARCH
+from slide_ai.thumbnail import get_slide_thumbnail, thumbnail_cache
+from slide_ai.layout import MIN_THUMBNAIL_WIDTH, MAX_THUMBNAIL_WIDTH
+from slide_ai.artifacts import get_artifact_store
+from slide_ai.deck_snapshot import save_snapshot, import_snapshot, open_snapshot, SNAPSHOT_MIME_TYPE
+from slide_ai.prompt_enhancer import enhance_prompt as enhance_prompt_text, enhance_prompts
+from slide_ai.async_http import run_cpu
+from slide_ai.jobs import get_job_runner, aiter_sse, parse_last_event_id
+from slide_ai.metrics import render_prometheus, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from slide_ai.warmup import readiness
+from slide_ai.http_cache import strong_etag, etag_matches
+from slide_ai.admission import Overloaded
+import asyncio
+import io
 import os
 import base64
 
@@ -35,6 +47,15 @@ class GeneratePPTXRequest(BaseModel):
 class EnhancePromptRequest(BaseModel):
     prompt: str
 
+class EnhancePromptBatchRequest(BaseModel):
+    prompts: list[str]
+
+class ThumbnailRequest(BaseModel):
+    slide: dict
+    width: int = Field(320, ge=MIN_THUMBNAIL_WIDTH, le=MAX_THUMBNAIL_WIDTH)
+    format: str = "PNG"
+    colors: dict | None = None
+
 import logging
 
 @router.post("/api/generate")
@@ -42,34 +63,126 @@ async def generate_slides(req: GenerateRequest):
     try:
         gemini_key = get_gemini_api_key()
         unsplash_key = get_unsplash_access_key()
-        data = generate_slide_content(req.topic, req.num_slides, gemini_key)
+        data = await agenerate_slide_content(req.topic, req.num_slides, gemini_key)
         slides = data["slides"]
-        # Attach images as base64 for preview
+        # Attach images as base64 for preview; all slides are fetched concurrently
         for slide in slides:
             if not isinstance(slide, dict):
                 logging.error(f"Slide is not a dict: {slide}")
-                continue
-            image_url, photographer, photographer_url, error_msg = fetch_unsplash_image(slide.get("unsplash_query"), unsplash_key)
-            slide["unsplash_image_url"] = image_url
-            slide["unsplash_photographer_name"] = photographer
-            slide["unsplash_photographer_url_with_utm"] = photographer_url
-            slide["image_fetch_error"] = error_msg
-            slide["img_b64"] = None
-            if image_url:
-                image_stream = download_image_to_stream(image_url)
-                if image_stream:
-                    pil_img = Image.open(image_stream)
-                    rounded_img = add_rounded_corners(pil_img, radius=60)
-                    rounded_stream = pil_image_to_stream(rounded_img)
-                    img_bytes = rounded_stream.getvalue()
-                    slide["img_b64"] = f"data:image/png;base64,{base64.b64encode(img_bytes).decode()}"
-        return JSONResponse({"colors": data["colors"], "fonts": data["fonts"], "slides": slides})
-    except Exception as e:
-        import traceback
-        tb = traceback.format_exc()
-        print(tb)
+        slides_with_images = [slide for slide in slides if isinstance(slide, dict)]
+        image_streams = await asyncio.gather(*(
+            aattach_slide_preview(slide, unsplash_key, colors=data["colors"]) for slide in slides_with_images
+        ))
+        # Keep what was generated and fetched, so the deck can be re-rendered without calling Gemini or Unsplash again
+        snapshot_id = await asyncio.to_thread(
+            save_snapshot, slides_with_images, req.topic, data["colors"], data["fonts"], image_streams
+        )
+        return JSONResponse({"colors": data["colors"], "fonts": data["fonts"], "slides": slides, "snapshot_id": snapshot_id})
+    except Overloaded:
+        raise  # answered with 503 + Retry-After by the app's exception handler
+    except Exception:
+        # Upstream errors stay in the server log; the client gets a generic message
         logging.exception("Error in /api/generate")
-        return JSONResponse({"error": str(e), "traceback": tb}, status_code=500)
+        return JSONResponse({"error": "Slide generation failed"}, status_code=500)
+
+@router.post("/api/jobs", status_code=202)
+async def create_job(req: GenerateRequest):
+    # Starts a background generation and returns immediately with the job ID
+    gemini_key = get_gemini_api_key()
+    if not gemini_key:
+        return JSONResponse({"error": "Gemini API key not configured"}, status_code=500)
+    job_id = await asyncio.to_thread(get_job_runner().submit, req.topic, req.num_slides, gemini_key, get_unsplash_access_key())
+    return JSONResponse({
+        "job_id": job_id,
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events",
+        "result_url": f"/api/jobs/{job_id}/result",
+    }, status_code=202)
+
+@router.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await asyncio.to_thread(get_job_runner().store.get, job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return JSONResponse(job)
+
+@router.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    runner = get_job_runner()
+    if not await asyncio.to_thread(runner.cancel, job_id):
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return JSONResponse(await asyncio.to_thread(runner.store.get, job_id))
+
+@router.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, after: int = 0):
+    store = get_job_runner().store
+    if await asyncio.to_thread(store.get, job_id) is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    last_event_id = parse_last_event_id(request.headers.get("last-event-id"), after)
+    return StreamingResponse(
+        aiter_sse(store, job_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/api/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    # Partial results: finished slides are returned while the rest are still null
+    result = await asyncio.to_thread(get_job_runner().store.result, job_id)
+    if result is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return JSONResponse(result)
+
+@router.post("/api/thumbnails")
+async def create_thumbnail(req: ThumbnailRequest):
+    try:
+        # Render (or reuse) a thumbnail for an edited slide; img_b64 is optional
+        image_stream = None
+        if req.slide.get("img_b64"):
+            image_stream = io.BytesIO(base64.b64decode(req.slide["img_b64"].split(",")[-1]))
+        thumb_key, _, _ = await run_cpu(get_slide_thumbnail, req.slide, image_stream, req.width, req.format,
+                                        thumbnail_cache, req.colors)
+        return JSONResponse({"thumbnail_key": thumb_key, "thumbnail_url": f"/api/thumbnails/{thumb_key}"})
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        logging.exception("Error in /api/thumbnails")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+@router.get("/api/thumbnails/{thumb_key}")
+async def get_thumbnail(thumb_key: str, request: Request):
+    cached = await asyncio.to_thread(thumbnail_cache.get, thumb_key)
+    if cached is None:
+        return JSONResponse({"error": "Thumbnail not found"}, status_code=404)
+    data, mime_type = cached
+    # Keys are content hashes, so the bytes behind a key never change
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": strong_etag(thumb_key)}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=mime_type, headers=headers)
+
+@router.get("/api/unsplash/alternatives")
+async def unsplash_alternatives(query: str, offset: int = 0, limit: int = ALTERNATIVES_PAGE_SIZE):
+    # Pages through the cached candidates for a query; only the first request for a query uses API quota
+    query = query.strip()
+    if not query:
+        return JSONResponse({"error": "No query provided"}, status_code=400)
+    limit = min(max(1, limit), CANDIDATES_PER_SEARCH)
+    page = await aget_unsplash_alternatives(query, get_unsplash_access_key(), offset, limit)
+    return dict(page, query=query)
+
+@router.get("/metrics")
+async def metrics():
+    return Response(content=render_prometheus(), media_type=METRICS_CONTENT_TYPE)
+
+@router.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    ready, details = readiness()
+    return JSONResponse(details, status_code=200 if ready else 503)
 
 @router.post("/api/enhance-prompt")
 async def enhance_prompt(req: EnhancePromptRequest):
@@ -83,103 +196,9 @@ async def enhance_prompt(req: EnhancePromptRequest):
                 content={"error": "API key not configured"}
             )
         
-        # Create a more creative and detailed enhanced version of the prompt
         original_prompt = req.prompt
         logging.info(f"Received prompt for enhancement: {original_prompt}")
-        
-        # Define different enhancement styles based on the prompt content
-        art_keywords = ['art', 'painting', 'drawing', 'artist', 'portrait', 'illustration', 'sketch', 'canvas']
-        nature_keywords = ['nature', 'landscape', 'mountain', 'ocean', 'forest', 'sky', 'sunset', 'beach', 'river', 'waterfall', 'garden']
-        tech_keywords = ['tech', 'technology', 'futuristic', 'robot', 'digital', 'cyber', 'computer', 'AI', 'machine', 'device']
-        fantasy_keywords = ['fantasy', 'magical', 'dragon', 'fairy', 'wizard', 'elf', 'mythical', 'enchanted', 'medieval']
-        food_keywords = ['food', 'cuisine', 'dish', 'meal', 'restaurant', 'cooking', 'dessert', 'chef', 'gourmet']
-        architecture_keywords = ['building', 'architecture', 'structure', 'skyscraper', 'house', 'interior', 'design', 'construction']
-        space_keywords = ['space', 'galaxy', 'planet', 'star', 'universe', 'cosmic', 'astronaut', 'nebula', 'astronomy']
-        animal_keywords = ['animal', 'wildlife', 'pet', 'dog', 'cat', 'bird', 'fish', 'lion', 'tiger', 'elephant']
-        
-        # Check if the prompt contains any of the keywords
-        prompt_lower = original_prompt.lower()
-        
-        if any(keyword in prompt_lower for keyword in art_keywords):
-            # Art-focused enhancement
-            styles = [
-                f"{original_prompt}, masterpiece, intricate details, professional lighting, vibrant colors, artistic composition, trending on ArtStation, award-winning, museum quality, hyperrealistic, 8K resolution",
-                f"{original_prompt}, oil painting, masterpiece, vivid colors, detailed brushwork, professional lighting, gallery quality, artistic composition, trending on ArtStation",
-                f"{original_prompt}, watercolor painting, delicate brushstrokes, vibrant palette, artistic composition, detailed, professional lighting, museum quality"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in nature_keywords):
-            # Nature-focused enhancement
-            styles = [
-                f"{original_prompt}, breathtaking view, golden hour lighting, atmospheric, cinematic, detailed, National Geographic, professional photography, ultra-realistic, 8K resolution, perfect composition",
-                f"{original_prompt}, stunning landscape photography, dramatic lighting, atmospheric, panoramic view, detailed, professional photography, ultra HD",
-                f"{original_prompt}, aerial view, drone photography, beautiful scenery, perfect weather conditions, high detail, professional photography"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in tech_keywords):
-            # Tech-focused enhancement
-            styles = [
-                f"{original_prompt}, highly detailed, sci-fi, concept art, ultra-realistic, octane render, 8K resolution, intricate details, futuristic lighting, sleek design, hyper-detailed",
-                f"{original_prompt}, cyberpunk aesthetic, neon lighting, futuristic design, highly detailed, concept art, ultra HD, ray tracing, glossy surfaces",
-                f"{original_prompt}, technical illustration, blueprint style, detailed schematics, futuristic design, clean lines, professional rendering"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in fantasy_keywords):
-            # Fantasy-focused enhancement
-            styles = [
-                f"{original_prompt}, fantasy art, magical atmosphere, detailed character design, mystical lighting, epic scene, professional illustration, trending on ArtStation",
-                f"{original_prompt}, mythical scene, magical realism, detailed fantasy world, professional concept art, epic lighting, cinematic composition",
-                f"{original_prompt}, enchanted realm, fantasy illustration, detailed character design, magical atmosphere, professional artwork, epic scale"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in food_keywords):
-            # Food-focused enhancement
-            styles = [
-                f"{original_prompt}, professional food photography, studio lighting, shallow depth of field, mouth-watering, high-end restaurant presentation, gourmet, 8K resolution",
-                f"{original_prompt}, culinary masterpiece, professional food styling, perfect lighting, fresh ingredients, gourmet presentation, magazine quality photography",
-                f"{original_prompt}, appetizing food photography, perfect composition, studio lighting, professional styling, cookbook quality, detailed textures"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in architecture_keywords):
-            # Architecture-focused enhancement
-            styles = [
-                f"{original_prompt}, architectural photography, perfect symmetry, golden hour lighting, detailed structure, professional photography, ultra HD, wide angle lens",
-                f"{original_prompt}, architectural visualization, photorealistic rendering, perfect lighting, detailed textures, professional quality, ultra HD resolution",
-                f"{original_prompt}, architectural design, detailed structure, professional photography, dramatic lighting, perfect composition, ultra-realistic"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in space_keywords):
-            # Space-focused enhancement
-            styles = [
-                f"{original_prompt}, cosmic scene, astronomy photography, nebula colors, star details, space exploration, ultra HD, breathtaking view, scientifically accurate",
-                f"{original_prompt}, space art, cosmic scenery, stellar details, astronomical phenomenon, scientifically accurate, ultra HD, professional rendering",
-                f"{original_prompt}, astrophotography, telescope imagery, detailed cosmic structures, space exploration, NASA quality, ultra HD resolution"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        elif any(keyword in prompt_lower for keyword in animal_keywords):
-            # Animal-focused enhancement
-            styles = [
-                f"{original_prompt}, wildlife photography, National Geographic, perfect timing, natural habitat, detailed fur/feathers, professional photography, ultra HD, telephoto lens",
-                f"{original_prompt}, animal portrait, studio lighting, detailed features, professional wildlife photography, perfect composition, ultra-realistic",
-                f"{original_prompt}, animal in motion, action shot, perfect timing, natural environment, detailed, professional wildlife photography"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
-            
-        else:
-            # General enhancement for other types of prompts
-            styles = [
-                f"{original_prompt}, highly detailed, professional photography, cinematic, perfect lighting, 8K resolution, photorealistic, masterpiece quality, perfect composition",
-                f"{original_prompt}, ultra-realistic, detailed textures, professional lighting, cinematic composition, 8K resolution, photorealistic rendering",
-                f"{original_prompt}, studio photography, perfect lighting, detailed textures, professional quality, ultra HD resolution, photorealistic"
-            ]
-            enhanced_prompt = styles[hash(original_prompt) % len(styles)]
+        enhanced_prompt = enhance_prompt_text(original_prompt)
         
         logging.info(f"Enhanced prompt: {enhanced_prompt}")
         
@@ -191,28 +210,132 @@ async def enhance_prompt(req: EnhancePromptRequest):
             content={"error": f"Failed to enhance prompt: {str(e)}"}
         )
 
+@router.post("/api/enhance-prompt/batch")
+async def enhance_prompt_batch(req: EnhancePromptBatchRequest):
+    if not req.prompts:
+        return JSONResponse({"error": "No prompts provided"}, status_code=400)
+    if not get_gemini_api_key():
+        return JSONResponse({"error": "API key not configured"}, status_code=500)
+    try:
+        return {"enhanced_prompts": enhance_prompts(req.prompts)}
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
 @router.post("/api/generate_pptx")
 async def generate_pptx(req: GeneratePPTXRequest):
     try:
-        # Accepts edited slides, colors, fonts, and topic
-        # Ensure the topic is valid for filename creation
-        safe_topic = req.topic.replace(' ', '_').lower()
-        if not safe_topic:
-            safe_topic = "slide_presentation"
-            
-        # Generate a unique filename with timestamp to avoid conflicts
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d-%H%M%S")
-        filename = f"{safe_topic}_{timestamp}.pptx"
-        
-        # Create the PowerPoint file
-        create_pptx_with_unsplash(req.slides, req.topic, filename=filename)  # Pass the filename explicitly
+        # Accepts edited slides, colors, fonts, and topic.
+        # Identical payloads resolve to the same stored artifact and are built once.
+        def build(path):
+            create_pptx_with_unsplash(req.slides, req.topic, filename=path, colors=req.colors, fonts=req.fonts)
+        # Building and saving the deck is CPU and disk work; keep it off the event loop
+        artifact_id, _, created = await asyncio.to_thread(
+            get_artifact_store().get_or_create, req.slides, req.topic, req.colors, req.fonts, build
+        )
         
-        # Return the filename for download
-        return JSONResponse({"pptx_file": filename})
+        # Return the artifact ID for download
+        return JSONResponse({
+            "pptx_file": artifact_id,
+            "artifact_id": artifact_id,
+            "download_url": f"/download/{artifact_id}",
+            "cached": not created,
+        })
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
         print(tb)
         logging.exception("Error in /api/generate_pptx")
         return JSONResponse({"error": str(e), "traceback": tb}, status_code=500)
+
+
+def _snapshot_urls(snapshot_id):
+    return {
+        "snapshot_id": snapshot_id,
+        "snapshot_url": f"/api/snapshots/{snapshot_id}",
+        "slides_url": f"/api/snapshots/{snapshot_id}/slides",
+        "pptx_url": f"/api/snapshots/{snapshot_id}/pptx",
+    }
+
+async def _read_body(request, max_bytes):
+    # The body, or None once it is known to exceed max_bytes; read in chunks so a
+    # chunked upload without a Content-Length is cut off at the limit too
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        return None
+    data = bytearray()
+    async for chunk in request.stream():
+        data += chunk
+        if len(data) > max_bytes:
+            return None
+    return bytes(data)
+
+@router.post("/api/snapshots", status_code=201)
+async def upload_snapshot(request: Request):
+    # Accepts a snapshot previously downloaded from /api/snapshots/{id} (raw body)
+    max_bytes = get_snapshot_max_upload_bytes()
+    data = await _read_body(request, max_bytes)
+    if data is None:
+        return JSONResponse({"error": f"Snapshot exceeds {max_bytes} bytes"}, status_code=413)
+    try:
+        snapshot_id = await asyncio.to_thread(import_snapshot, data)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse(_snapshot_urls(snapshot_id), status_code=201)
+
+@router.get("/api/snapshots/{snapshot_id}")
+async def download_snapshot(snapshot_id: str, request: Request):
+    path = await asyncio.to_thread(get_artifact_store().get_snapshot, snapshot_id)
+    if path is None:
+        return JSONResponse({"error": f"Snapshot {snapshot_id} not found"}, status_code=404)
+    # The ID is a hash of the content, so it doubles as a strong ETag
+    headers = {"ETag": strong_etag(snapshot_id), "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=SNAPSHOT_MIME_TYPE, filename=f"{snapshot_id}.slds", headers=headers)
+
+def _snapshot_previews(snapshot_id, indexes):
+    snapshot = open_snapshot(snapshot_id)
+    if snapshot is None:
+        return None
+    with snapshot:
+        slides = render_snapshot_previews(snapshot, indexes)
+        return {"topic": snapshot.topic, "colors": snapshot.colors, "fonts": snapshot.fonts,
+                "slides": slides, **_snapshot_urls(snapshot_id)}
+
+@router.get("/api/snapshots/{snapshot_id}/slides")
+async def snapshot_slides(snapshot_id: str, index: int | None = None):
+    # Previews and thumbnails rendered from the stored images; ?index=N for one slide
+    try:
+        result = await run_cpu(_snapshot_previews, snapshot_id, None if index is None else [index])
+    except (IndexError, ValueError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if result is None:
+        return JSONResponse({"error": f"Snapshot {snapshot_id} not found"}, status_code=404)
+    return JSONResponse(result)
+
+def _build_snapshot_pptx(snapshot_id):
+    snapshot = open_snapshot(snapshot_id)
+    if snapshot is None:
+        return None
+    with snapshot:
+        # Keyed by the snapshot's records, so the deck is stored under the snapshot ID and built once
+        return get_artifact_store().get_or_create(
+            snapshot.records(), snapshot.topic, snapshot.colors, snapshot.fonts,
+            build=lambda path: create_pptx_with_unsplash(snapshot.slides(), snapshot.topic, filename=path,
+                                                         colors=snapshot.colors, fonts=snapshot.fonts),
+        )
+
+@router.post("/api/snapshots/{snapshot_id}/pptx")
+async def snapshot_pptx(snapshot_id: str):
+    try:
+        result = await asyncio.to_thread(_build_snapshot_pptx, snapshot_id)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if result is None:
+        return JSONResponse({"error": f"Snapshot {snapshot_id} not found"}, status_code=404)
+    artifact_id, _, created = result
+    return JSONResponse({
+        "pptx_file": artifact_id,
+        "artifact_id": artifact_id,
+        "download_url": f"/download/{artifact_id}",
+        "cached": not created,
+    })
@@ -11,21 +11,26 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, StreamingResponse, Response, JSONResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, Response, JSONResponse, FileResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
 # Now we can import the slide_ai module
 from slide_ai.config import get_gemini_api_key, get_unsplash_access_key
-from slide_ai.gemini_api import generate_slide_content
-from slide_ai.unsplash_api import fetch_unsplash_image, download_image_to_stream
+from slide_ai.gemini_api import agenerate_slide_content
 from slide_ai.pptx_builder import create_pptx_with_unsplash
-from PIL import Image
-from slide_ai.image_editor import add_rounded_corners, pil_image_to_stream
+from slide_ai.pipeline import aattach_slide_preview
+from slide_ai.artifacts import get_artifact_store, safe_download_name, PPTX_MIME_TYPE
+from slide_ai.deck_snapshot import save_snapshot
+from slide_ai.async_http import close_async_client
+from slide_ai.http_cache import strong_etag, etag_matches, parse_byte_range, RangeNotSatisfiable
+from slide_ai.admission import Overloaded
+import asyncio
 import os
 
 from webapp.api import router as api_router
+from webapp.middleware import CompressionMiddleware
 
 app = FastAPI()
 
@@ -39,8 +44,23 @@ app.add_middleware(
     expose_headers=["Content-Type"],
     max_age=600  # Cache preflight requests for 10 minutes
 )
+app.add_middleware(CompressionMiddleware)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # Admission control rejected the work: tell the client when to come back
+    return JSONResponse(
+        {"error": str(exc), "retry_after": exc.retry_after},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 app.include_router(api_router)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_async_client()
+
 import os
 import json
 from pptx import Presentation
@@ -59,74 +79,92 @@ def index(request: Request):
 async def generate(request: Request, topic: str = Form(...), num_slides: int = Form(...)):
     gemini_key = get_gemini_api_key()
     unsplash_key = get_unsplash_access_key()
-    slides = generate_slide_content(topic, num_slides, gemini_key)
+    data = await agenerate_slide_content(topic, num_slides, gemini_key)
+    # fallback: slides that are not dicts are skipped
+    slides = [slide for slide in data["slides"] if isinstance(slide, dict)]
+    colors, fonts = data.get("colors", {}), data.get("fonts", {})
+    # Fetch and render every slide's image concurrently, at export size since the
+    # same streams are embedded in the deck below
+    image_streams = await asyncio.gather(*(aattach_slide_preview(slide, unsplash_key, "export", colors) for slide in slides))
     slide_previews = []
-    for slide in slides:
-        if isinstance(slide, dict):
-            unsplash_query = slide.get("unsplash_query")
-        else:
-            # fallback: treat slide as string, or skip
-            unsplash_query = None
-            continue
-        image_url, photographer, photographer_url, error_msg = fetch_unsplash_image(unsplash_query, unsplash_key)
-        slide["unsplash_image_url"] = image_url
-        slide["unsplash_photographer_name"] = photographer
-        slide["unsplash_photographer_url_with_utm"] = photographer_url
-        slide["image_fetch_error"] = error_msg
-        slide["actual_image_stream"] = None
-        if image_url:
-            image_stream = download_image_to_stream(image_url)
-            if image_stream:
-                pil_img = Image.open(image_stream)
-                rounded_img = add_rounded_corners(pil_img, radius=60)
-                rounded_stream = pil_image_to_stream(rounded_img)
-                slide["actual_image_stream"] = rounded_stream
-        # For preview, convert image stream to base64
-        img_b64 = None
-        if slide["actual_image_stream"]:
-            import base64
-            img_bytes = slide["actual_image_stream"].getvalue()
-            img_b64 = f"data:image/png;base64,{base64.b64encode(img_bytes).decode()}"
+    for slide, image_stream in zip(slides, image_streams):
+        slide["actual_image_stream"] = image_stream
         slide_previews.append({
             "title": slide["title"],
             "content_points": slide["content_points"],
             "speaker_notes": slide["speaker_notes"],
-            "img_b64": img_b64,
+            "img_b64": slide["img_b64"],
             "photographer": slide["unsplash_photographer_name"],
             "photographer_url": slide["unsplash_photographer_url_with_utm"]
         })
-    # Save pptx
-    pptx_filename = create_pptx_with_unsplash(slides, topic)
-    return templates.TemplateResponse("slide_preview.html", {"request": request, "slides": slide_previews, "pptx_file": pptx_filename})
-
-@app.get("/download/{pptx_file}")
-def download_pptx(pptx_file: str):
-    # Ensure the file exists
-    pptx_path = os.path.join(os.getcwd(), pptx_file)
-    if not os.path.exists(pptx_path):
-        return JSONResponse({"error": f"File {pptx_file} not found"}, status_code=404)
-    
-    # Force the file to have a .pptx extension if it doesn't already
-    download_filename = pptx_file
-    if not download_filename.lower().endswith('.pptx'):
-        download_filename += '.pptx'
-    
-    # Read the file into memory
-    with open(pptx_path, "rb") as file:
-        file_content = file.read()
-    
-    # Return the file with explicit headers to force PowerPoint download
+    # Save pptx off the event loop
+    def build(path):
+        create_pptx_with_unsplash(slides, topic, filename=path, colors=colors, fonts=fonts)
+    artifact_id, _, _ = await asyncio.to_thread(get_artifact_store().get_or_create, slides, topic, colors, fonts, build)
+    # Snapshot at export resolution, so /api/snapshots/{id}/pptx re-renders without fetching again
+    await asyncio.to_thread(save_snapshot, slides, topic, colors, fonts)
+    return templates.TemplateResponse("slide_preview.html", {"request": request, "slides": slide_previews, "pptx_file": artifact_id})
+
+FILE_CHUNK_SIZE = 256 * 1024
+
+def _iter_file_range(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def _file_response(request, path, download_name, etag):
+    """
+    Streams a stored file from disk instead of reading it into memory, with a
+    strong ETag (304 on If-None-Match) and single-range requests for resuming
+    interrupted downloads (206, or 416 when the range is outside the file).
+    """
     headers = {
-        "Content-Disposition": f'attachment; filename="{download_filename}"',
-        "Content-Type": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        "Access-Control-Expose-Headers": "Content-Disposition"
+        "ETag": etag,
+        # Revalidate on every use; an unchanged deck comes back as 304
+        "Cache-Control": "no-cache",
+        "Accept-Ranges": "bytes",
+        "Access-Control-Expose-Headers": "Content-Disposition, Content-Range",
     }
-    
-    return Response(
-        content=file_content,
-        media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        headers=headers
-    )
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    size = os.path.getsize(path)
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    # A Range with a stale If-Range validator gets the whole, current file
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_byte_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{size}"}))
+    if byte_range is None:
+        # FileResponse sets Content-Length from the file and uses the server's
+        # zero-copy send path when it offers one
+        return FileResponse(path, media_type=PPTX_MIME_TYPE, filename=download_name, headers=headers)
+    start, end = byte_range
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f'attachment; filename="{download_name}"',
+    })
+    return StreamingResponse(_iter_file_range(path, start, end), status_code=206, media_type=PPTX_MIME_TYPE, headers=headers)
+
+@app.get("/download/{artifact_id}")
+def download_pptx(artifact_id: str, request: Request):
+    # Downloads are addressed by artifact ID; a trailing .pptx is tolerated.
+    # The store only resolves well-formed IDs to files inside the artifact directory.
+    if artifact_id.lower().endswith('.pptx'):
+        artifact_id = artifact_id[:-5]
+    artifact = get_artifact_store().get(artifact_id)
+    if artifact is None:
+        return JSONResponse({"error": f"File {artifact_id} not found"}, status_code=404)
+    pptx_path, meta = artifact
+    return _file_response(request, pptx_path, meta["download_name"], strong_etag(meta["sha256"]))
 
 @app.post("/api/direct_download")
 async def direct_download(request: Request):
@@ -145,37 +183,19 @@ async def direct_download(request: Request):
         colors = data.get('colors', {})
         fonts = data.get('fonts', {})
         
-        # Generate a filename if not provided
+        # The client-supplied filename only names the download (sanitized); storage is by artifact ID
         filename = data.get('filename')
-        if not filename:
-            import datetime
-            timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-            safe_topic = topic.replace(' ', '_').lower()
-            filename = f"{safe_topic}_{timestamp}.pptx"
-        
-        # Ensure the filename has .pptx extension
-        if not filename.lower().endswith('.pptx'):
-            filename += '.pptx'
-        
-        # Create a PowerPoint presentation
-        from slide_ai.pptx_builder import create_pptx_with_unsplash
-        pptx_path = create_pptx_with_unsplash(slides, topic, filename=filename)
-        
-        # Read the file into memory
-        with open(pptx_path, "rb") as file:
-            file_content = file.read()
-        
-        # Return the file with explicit headers for PowerPoint download
-        headers = {
-            "Content-Disposition": f'attachment; filename="{filename}"',
-            "Content-Type": "application/vnd.openxmlformats-officedocument.presentationml.presentation"
-        }
+        filename = safe_download_name(os.path.splitext(os.path.basename(filename))[0] if filename else topic)
         
-        return Response(
-            content=file_content,
-            media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-            headers=headers
-        )
+        # Create (or reuse) the PowerPoint presentation off the event loop
+        def build(path):
+            create_pptx_with_unsplash(slides, topic, filename=path, colors=colors, fonts=fonts)
+        artifact_id, _, _ = await asyncio.to_thread(get_artifact_store().get_or_create, slides, topic, colors, fonts, build)
+        artifact = get_artifact_store().get(artifact_id)
+        if artifact is None:
+            return JSONResponse({"error": "Presentation was evicted before it could be sent"}, status_code=503)
+        pptx_path, meta = artifact
+        return _file_response(request, pptx_path, filename, strong_etag(meta["sha256"]))
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
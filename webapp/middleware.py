@@ -0,0 +1,61 @@
+"""
+ASGI middleware for the FastAPI app.
+"""
+from slide_ai.async_http import run_cpu
+from slide_ai.http_cache import negotiate_encoding, should_compress, is_compressible, compress, encoded_etag
+
+# Bodies at least this large are compressed on the CPU executor instead of the event loop
+OFFLOAD_BYTES = 64 * 1024
+
+
+class CompressionMiddleware:
+    """
+    Negotiated brotli/gzip for complete (non-streaming) JSON and text responses
+    above the size threshold. Streaming bodies such as SSE and file downloads
+    (including those sent by path through the pathsend/zerocopysend extensions)
+    are passed through untouched so they are never buffered.
+    """
+    def __init__(self, app, min_bytes=None):
+        self.app = app
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        encoding = negotiate_encoding(headers.get("accept-encoding"))
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # held back until we know whether the body is compressed
+                return
+            if start is None:
+                return await send(message)
+            if message["type"] != "http.response.body":
+                # e.g. http.response.pathsend / zerocopysend: no body to compress, send the start as is
+                response_start, start = start, None
+                await send(response_start)
+                return await send(message)
+            response_start, start = start, None
+            response_headers = [(k, v) for k, v in response_start["headers"]]
+            values = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in response_headers}
+            content_type = values.get("content-type")
+            body = message.get("body", b"")
+            if is_compressible(content_type) and "vary" not in values:
+                response_headers.append((b"vary", b"Accept-Encoding"))
+            if (encoding is None or message.get("more_body") or response_start["status"] != 200
+                    or not should_compress(content_type, len(body), values.get("content-encoding"), self.min_bytes)):
+                await send(dict(response_start, headers=response_headers))
+                return await send(message)
+            # Compressing a preview response (inline images) takes tens of milliseconds
+            body = await run_cpu(compress, body, encoding) if len(body) >= OFFLOAD_BYTES else compress(body, encoding)
+            response_headers = [(k, v) for k, v in response_headers if k.lower() not in (b"content-length", b"etag")]
+            response_headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode())]
+            if "etag" in values:
+                response_headers.append((b"etag", encoded_etag(values["etag"], encoding).encode("latin-1")))
+            await send(dict(response_start, headers=response_headers))
+            await send(dict(message, body=body))
+
+        await self.app(scope, receive, send_wrapper)